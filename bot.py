@@ -3,11 +3,21 @@ from discord.ext import commands
 from discord import app_commands
 import os
 import random
-from datetime import datetime, timedelta
-from database import Database
-from quests import get_random_quests, get_quest_by_id, QUEST_POOL
+import time
+from datetime import datetime
+from typing import Union
+from database import Database, AsyncDatabase
+from exchange_bridge import ExchangeBridge
+from ledger import LedgerMaintenance
+from metrics import EventFilterStats, LoopLagMonitor
+from progress_cache import ProgressCache
+from quest_rollover import DailyRollover
+from send_queue import SendQueue
+from server_status import StatusMonitor
+from services import CommandServices, ServiceError
+from trackers import IdSet, TokenBuckets, TrackerStore
+from quests import get_random_quests, get_quest_by_id, analyze_message, evaluate_quest, QUEST_POOL
 from dotenv import load_dotenv
-from mcstatus import JavaServer
 
 load_dotenv()
 
@@ -17,12 +27,27 @@ intents.members = True
 intents.reactions = True
 
 bot = commands.Bot(command_prefix='ast ', intents=intents, help_command=None)
-db = Database()
-
-user_mentions_tracker = {}
-user_message_times = {}
-user_channels_tracker = {}
-blackjack_games = {}
+db = AsyncDatabase(Database())
+loop_lag = LoopLagMonitor()
+event_filter = EventFilterStats()
+send_queue = SendQueue()
+progress_cache = ProgressCache(db)
+quest_rollover = DailyRollover(db, progress_cache, reset_hour=int(os.getenv('QUEST_RESET_HOUR', '0')))
+ledger = LedgerMaintenance(db, keep_days=int(os.getenv('LEDGER_KEEP_DAYS', '90')))
+exchange_bridge = ExchangeBridge(db, port=int(os.getenv('EXCHANGE_BRIDGE_PORT', '8765')), token=os.getenv('EXCHANGE_BRIDGE_TOKEN'))
+status_monitor = StatusMonitor(lambda: [(settings.server_ip, settings.server_port) for settings in db.server_settings.values() if settings.server_ip])
+
+# Per-user state that only matters for a while; quest sets live in progress_cache
+user_message_times = TokenBuckets(ttl=3600, max_entries=50000)
+blackjack_games = TrackerStore(ttl=600, max_entries=10000)
+# (guild_id, user_id) pairs already in guild_members; a miss only costs one INSERT OR IGNORE
+known_members = TrackerStore(ttl=3600, max_entries=50000)
+
+SECRET_QUEST_ID = 999
+# Messages per minute that earn XP and quest progress, and how many may come in a burst;
+# guilds can override both with `ast xplimit`
+XP_PER_MINUTE = int(os.getenv('XP_PER_MINUTE', '12'))
+XP_BURST = int(os.getenv('XP_BURST', '6'))
 
 
 def create_deck():
@@ -67,38 +92,49 @@ async def update_quest(user_id, username, quest_id, increment=1, channel=None):
     if not quest:
         return
     
-    quests, _ = db.get_daily_quests(user_id)
-    if quest_id not in quests:
-        return
-    
-    progress, completed = db.get_quest_progress(user_id, quest_id)
-    
-    if completed:
-        return
+    def evaluate(state):
+        if quest_id not in state['quests']:
+            return {}
+        
+        progress, completed = state['progress'].get(quest_id, (0, 0))
+        if completed:
+            return {}
+        
+        new_progress = progress + increment
+        if new_progress >= quest["target"]:
+            return {'updates': [(quest_id, new_progress, 1, quest["reward"])]}
+        return {'updates': [(quest_id, new_progress, 0, 0)]}
     
-    new_progress = progress + increment
+    _, updates = await progress_cache.apply(user_id, username, evaluate=evaluate)
     
-    if new_progress >= quest["target"]:
-        db.update_quest_progress(user_id, quest_id, new_progress, 1)
-        db.update_balance(user_id, quest["reward"])
+    if channel and any(completed for _, _, completed, _ in updates):
+        embed = discord.Embed(
+            title=f"🎉 Quest Completed!",
+            description=f"**{quest['emoji']} {quest['name']}**\n{quest['description']}",
+            color=discord.Color.gold()
+        )
+        embed.add_field(name="💰 Reward", value=f"+{quest['reward']} coins", inline=False)
+        embed.set_footer(text=f"Great job, {username}!")
         
-        if channel:
-            embed = discord.Embed(
-                title=f"🎉 Quest Completed!",
-                description=f"**{quest['emoji']} {quest['name']}**\n{quest['description']}",
-                color=discord.Color.gold()
-            )
-            embed.add_field(name="💰 Reward", value=f"+{quest['reward']} coins", inline=False)
-            embed.set_footer(text=f"Great job, {username}!")
-            
-            await channel.send(embed=embed)
-    else:
-        db.update_quest_progress(user_id, quest_id, new_progress, 0)
+        send_queue.notify(channel, user_id, embed)
 
 @bot.event
 async def on_ready():
     print(f'🤖 {bot.user} has connected to Discord!')
     print(f'📊 Bot is in {len(bot.guilds)} guilds')
+    loop_lag.start()
+    progress_cache.start()
+    quest_rollover.start()
+    ledger.start()
+    await db.load_server_settings()
+    status_monitor.start()
+    try:
+        await exchange_bridge.start()
+        print(f'✅ Exchange bridge listening on {exchange_bridge.host}:{exchange_bridge.port}')
+    except OSError as e:
+        print(f'❌ Failed to start exchange bridge: {e}')
+    for guild in bot.guilds:
+        await db.sync_guild_members(guild.id, [member.id for member in guild.members if not member.bot])
     try:
         synced = await bot.tree.sync()
         print(f'✅ Synced {len(synced)} slash commands')
@@ -108,18 +144,16 @@ async def on_ready():
 
 @bot.event
 async def on_member_join(member):
-    settings = db.get_server_settings(member.guild.id)
+    if not member.bot:
+        await db.add_guild_member(member.guild.id, member.id)
+        known_members[(member.guild.id, member.id)] = True
     
-    if not settings:
-        return
-    
-    welcome_channel_id = settings[4] if len(settings) > 4 else None
-    welcome_enabled = settings[6] if len(settings) > 6 else 1
+    settings = db.server_settings.get(member.guild.id)
     
-    if not welcome_channel_id or not welcome_enabled:
+    if not settings or not settings.welcome_channel_id or not settings.welcome_enabled:
         return
     
-    channel = member.guild.get_channel(welcome_channel_id)
+    channel = member.guild.get_channel(settings.welcome_channel_id)
     
     if not channel:
         return
@@ -145,7 +179,12 @@ async def on_member_join(member):
     embed.set_footer(text=f"Welcome to {member.guild.name}!", icon_url=member.guild.icon.url if member.guild.icon else None)
     embed.timestamp = datetime.now()
     
-    await channel.send(embed=embed)
+    send_queue.notify(channel, member.id, embed)
+
+@bot.event
+async def on_member_remove(member):
+    await db.remove_guild_member(member.guild.id, member.id)
+    known_members.pop((member.guild.id, member.id))
 
 @bot.event
 async def on_reaction_add(reaction, user):
@@ -154,77 +193,207 @@ async def on_reaction_add(reaction, user):
     
     user_id = user.id
     username = str(user)
-    db.get_user(user_id, username)
-    
-    quests, _ = db.get_daily_quests(user_id)
+    positive = str(reaction.emoji) in ["❤️", "👍", "💖", "💕", "💗"]
+    
+    def evaluate(state):
+        updates = []
+        for quest_id in state['quests']:
+            quest = get_quest_by_id(quest_id)
+            if not quest:
+                continue
+            
+            progress, completed = state['progress'].get(quest_id, (0, 0))
+            
+            if completed:
+                continue
+            
+            if quest["type"] == "reaction" or (quest["type"] == "positive_reaction" and positive):
+                new_progress = progress + 1
+                if new_progress >= quest["target"]:
+                    updates.append((quest_id, new_progress, 1, quest["reward"]))
+                else:
+                    updates.append((quest_id, new_progress, 0, 0))
+        return {'updates': updates}
+    
+    _, updates = await progress_cache.apply(user_id, username, evaluate=evaluate)
+    
+    for quest_id, _, completed, _ in updates:
+        if not completed:
+            continue
+        
+        quest = get_quest_by_id(quest_id)
+        channel = reaction.message.channel
+        embed = discord.Embed(
+            title=f"🎉 Quest Completed!",
+            description=f"**{quest['emoji']} {quest['name']}**\n{quest['description']}",
+            color=discord.Color.gold()
+        )
+        embed.add_field(name="💰 Reward", value=f"+{quest['reward']} coins", inline=False)
+        embed.set_footer(text=f"Great job, {username}!")
+        
+        send_queue.notify(channel, user_id, embed)
+
+def refresh_daily_quests(user_id, state):
+    """Hand out new daily quests if the user's have expired or were never assigned"""
+    changes = {'updates': []}
+    
+    # The rollover job reassigns active users in bulk; this catches anyone it skipped
+    if state['day'] < quest_rollover.current_day:
+        changes['reset'] = True
+        changes['new_quests'] = [q["id"] for q in get_random_quests(5)]
+        changes['day'] = quest_rollover.current_day
+        state['sets'] = {}
+    elif not state['quests']:
+        changes['new_quests'] = [q["id"] for q in get_random_quests(5)]
+        changes['day'] = quest_rollover.current_day
+    
+    return changes
+
+def track_quest_sets(quest, features, message, state, changes):
+    """Update the mention/channel sets behind set-based quests"""
+    sets = state['sets']
+    added = changes.setdefault('set_members', [])
+    
+    if quest["type"] == "mention" and message.mentions:
+        mentioned = sets.setdefault("mention", IdSet())
+        for mention in message.mentions:
+            if mentioned.add(mention.id):
+                added.append(("mention", mention.id))
+        features.mention_total = len(mentioned)
+    elif quest["type"] == "different_channels":
+        channels = sets.setdefault("different_channels", IdSet())
+        if channels.add(message.channel.id):
+            added.append(("different_channels", message.channel.id))
+        features.channel_total = len(channels)
+
+def evaluate_message_quests(message, content, state):
+    """Decide every quest change caused by a message, given the user's loaded state"""
+    changes = refresh_daily_quests(message.author.id, state)
+    quests = changes.get('new_quests', state['quests'])
+    progress_map = {} if changes.get('reset') else state['progress']
+    features = analyze_message(message.content, datetime.now().hour)
     
     for quest_id in quests:
         quest = get_quest_by_id(quest_id)
         if not quest:
             continue
         
-        progress, completed = db.get_quest_progress(user_id, quest_id)
+        progress, completed = progress_map.get(quest_id, (0, 0))
         
         if completed:
             continue
         
-        if quest["type"] == "reaction":
-            new_progress = progress + 1
-            if new_progress >= quest["target"]:
-                db.update_quest_progress(user_id, quest_id, new_progress, 1)
-                db.update_balance(user_id, quest["reward"])
-                
-                channel = reaction.message.channel
-                embed = discord.Embed(
-                    title=f"🎉 Quest Completed!",
-                    description=f"**{quest['emoji']} {quest['name']}**\n{quest['description']}",
-                    color=discord.Color.gold()
-                )
-                embed.add_field(name="💰 Reward", value=f"+{quest['reward']} coins", inline=False)
-                embed.set_footer(text=f"Great job, {username}!")
-                
-                await channel.send(embed=embed)
-            else:
-                db.update_quest_progress(user_id, quest_id, new_progress, 0)
-        elif quest["type"] == "positive_reaction" and str(reaction.emoji) in ["❤️", "👍", "💖", "💕", "💗"]:
-            new_progress = progress + 1
-            if new_progress >= quest["target"]:
-                db.update_quest_progress(user_id, quest_id, new_progress, 1)
-                db.update_balance(user_id, quest["reward"])
-                
-                channel = reaction.message.channel
-                embed = discord.Embed(
-                    title=f"🎉 Quest Completed!",
-                    description=f"**{quest['emoji']} {quest['name']}**\n{quest['description']}",
-                    color=discord.Color.gold()
-                )
-                embed.add_field(name="💰 Reward", value=f"+{quest['reward']} coins", inline=False)
-                embed.set_footer(text=f"Great job, {username}!")
-                
-                await channel.send(embed=embed)
+        if quest["type"] in ("mention", "different_channels"):
+            track_quest_sets(quest, features, message, state, changes)
+        
+        new_progress = evaluate_quest(quest, features, progress)
+        
+        if new_progress >= quest["target"]:
+            changes['updates'].append((quest_id, new_progress, 1, quest["reward"]))
+        elif new_progress != progress:
+            changes['updates'].append((quest_id, new_progress, 0, 0))
+    
+    # Secret Quest: CBD Counter (only you know about this!)
+    if "cbd" in content:
+        secret_progress, secret_completed = progress_map.get(SECRET_QUEST_ID, (0, 0))
+        
+        if not secret_completed:
+            secret_progress += 1
+            
+            if secret_progress >= 100:
+                changes['updates'].append((SECRET_QUEST_ID, secret_progress, 1, 1000000000))
             else:
-                db.update_quest_progress(user_id, quest_id, new_progress, 0)
+                changes['updates'].append((SECRET_QUEST_ID, secret_progress, 0, 0))
+    
+    return changes
+
+def ip_reply(guild_id, content):
+    """The server IP embed if a (lowercased) message asks for it and the IP is set up"""
+    if "ip" in content.split() or "server ip" in content or "what's the ip" in content or "whats the ip" in content:
+        settings = db.server_settings.get(guild_id)
+        if settings and settings.server_ip:
+            server_ip = settings.server_ip
+            server_port = settings.server_port if settings.server_port else "Default"
+            
+            embed = discord.Embed(
+                title="🎮 Minecraft Server Info",
+                description="Join our server with these details:",
+                color=discord.Color.green()
+            )
+            embed.add_field(name="🌐 Server IP", value=f"`{server_ip}`", inline=False)
+            embed.add_field(name="🔌 Port", value=f"`{server_port}`", inline=False)
+            embed.set_footer(text="See you in game!")
+            return embed
+    return None
+
+def counts_for_progress(message):
+    """Whether a guild message earns XP and quest progress under the guild's channel rules
+
+    Only reads the in-memory rule sets, so filtered messages never reach the database.
+    Threads follow their parent channel.
+    """
+    channel = message.channel
+    parent_id = getattr(channel, 'parent_id', None)
+    ignored = db.ignored_channels
+    if channel.id in ignored or parent_id in ignored:
+        return False
+    only = db.only_channels.get(message.guild.id)
+    return only is None or channel.id in only or parent_id in only
+
+def within_xp_rate(message):
+    """Spend one of the author's XP tokens; False once they're sending faster than the guild allows"""
+    settings = db.server_settings.get(message.guild.id)
+    per_minute = XP_PER_MINUTE if settings is None or settings.xp_per_minute is None else settings.xp_per_minute
+    if per_minute <= 0:
+        return True
+    burst = settings.xp_burst if settings and settings.xp_burst else XP_BURST
+    return user_message_times.allow(message.author.id, per_minute / 60, burst)
 
 @bot.event
 async def on_message(message):
     if message.author.bot:
         return
     
-    user_id = message.author.id
-    username = str(message.author)
+    # XP and quests are per server: DMs and filtered channels only run commands
+    if message.guild is None:
+        event_filter.skip('dm')
+        await bot.process_commands(message)
+        return
+    
     content = message.content.lower()
+    ip_embed = ip_reply(message.guild.id, content)
+    
+    # Spam past the guild's rate gets no XP or quest progress either
+    skip = 'channel' if not counts_for_progress(message) else 'rate' if not within_xp_rate(message) else None
+    if skip:
+        event_filter.skip(skip)
+        # An IP request is answered instead of running commands, as on the normal path
+        if ip_embed:
+            send_queue.notify(message.channel, message.author.id, ip_embed)
+        else:
+            await bot.process_commands(message)
+        return
     
-    db.get_user(user_id, username)
+    started = time.perf_counter()
+    user_id = message.author.id
+    username = str(message.author)
     
     # XP System: 1 XP per message + 1 XP per unique mention
     xp_gained = 1  # Base XP for sending a message
     if message.mentions:
         xp_gained += len(set(mention.id for mention in message.mentions))
     
-    xp_result = db.add_xp(user_id, xp_gained)
+    # IP requests only earn XP, not quest progress
+    evaluate = None if ip_embed else lambda state: evaluate_message_quests(message, content, state)
+    xp_result, quest_updates = await progress_cache.apply(user_id, username, xp_gained, evaluate)
+    
+    if (message.guild.id, user_id) not in known_members:
+        await db.add_guild_member(message.guild.id, user_id)
+        known_members[(message.guild.id, user_id)] = True
+    event_filter.record(time.perf_counter() - started)
     
     # Notify on level up
-    if xp_result and xp_result['leveled_up']:
+    if xp_result['leveled_up']:
         embed = discord.Embed(
             title="🎊 LEVEL UP! 🎊",
             description=f"**{message.author.display_name}** reached **Level {xp_result['new_level']}**!",
@@ -235,125 +404,27 @@ async def on_message(message):
         embed.set_thumbnail(url=message.author.display_avatar.url)
         embed.set_footer(text=f"Keep chatting to level up!")
         
-        await message.channel.send(embed=embed)
+        send_queue.notify(message.channel, user_id, embed)
     
-    # Auto-respond to IP requests
-    if "ip" in content.split() or "server ip" in content or "what's the ip" in content or "whats the ip" in content:
-        if message.guild:
-            settings = db.get_server_settings(message.guild.id)
-            if settings and settings[1]:  # Check if server_ip exists
-                server_ip = settings[1]
-                server_port = settings[2] if settings[2] else "Default"
-                
-                embed = discord.Embed(
-                    title="🎮 Minecraft Server Info",
-                    description="Join our server with these details:",
-                    color=discord.Color.green()
-                )
-                embed.add_field(name="🌐 Server IP", value=f"`{server_ip}`", inline=False)
-                embed.add_field(name="🔌 Port", value=f"`{server_port}`", inline=False)
-                embed.set_footer(text="See you in game!")
-                
-                await message.channel.send(embed=embed)
-                return
-    
-    quests, last_reset = db.get_daily_quests(user_id)
-    
-    if datetime.now() - last_reset > timedelta(days=1):
-        db.reset_quest_progress(user_id)
-        quests = [q["id"] for q in get_random_quests(5)]
-        db.set_daily_quests(user_id, quests)
-        
-        if user_id in user_mentions_tracker:
-            user_mentions_tracker[user_id] = set()
-        if user_id in user_channels_tracker:
-            user_channels_tracker[user_id] = set()
-    
-    if not quests:
-        quests = [q["id"] for q in get_random_quests(5)]
-        db.set_daily_quests(user_id, quests)
+    if ip_embed:
+        send_queue.notify(message.channel, user_id, ip_embed)
+        return
     
-    for quest_id in quests:
-        quest = get_quest_by_id(quest_id)
-        if not quest:
+    for quest_id, progress, completed, _ in quest_updates:
+        if not completed:
             continue
         
-        progress, completed = db.get_quest_progress(user_id, quest_id)
-        
-        if completed:
-            continue
-        
-        new_progress = progress
-        
-        if quest["type"] == "chat":
-            new_progress = progress + 1
-        elif quest["type"] == "greeting" and any(word in content for word in ["hi", "hello", "hey"]):
-            new_progress = progress + 1
-        elif quest["type"] == "mention" and message.mentions:
-            if user_id not in user_mentions_tracker:
-                user_mentions_tracker[user_id] = set()
-            for mention in message.mentions:
-                user_mentions_tracker[user_id].add(mention.id)
-            new_progress = len(user_mentions_tracker[user_id])
-        elif quest["type"] == "emoji":
-            emoji_count = sum(1 for char in message.content if char in "😀😁😂🤣😃😄😅😆😉😊😋😎😍😘🥰😗😙😚☺️🙂🤗🤩🤔🤨😐😑😶🙄😏😣😥😮🤐😯😪😫🥱😴😌😛😜😝🤤😒😓😔😕🙃🤑😲☹️🙁😖😞😟😤😢😭😦😧😨😩🤯😬😰😱🥵🥶😳🤪😵😡😠🤬😷🤒🤕🤢🤮🤧😇🤠🤡🤥🤫🤭🧐🤓")
-            new_progress = progress + emoji_count
-        elif quest["type"] == "question" and "?" in message.content:
-            new_progress = progress + 1
-        elif quest["type"] == "exclamation" and "!" in message.content:
-            new_progress = progress + 1
-        elif quest["type"] == "gg" and "gg" in content:
-            new_progress = progress + 1
-        elif quest["type"] == "laugh" and any(word in content for word in ["lol", "lmao", "haha", "hehe"]):
-            new_progress = progress + 1
-        elif quest["type"] == "long_message" and len(message.content) >= 100:
-            new_progress = progress + 1
-        elif quest["type"] == "thanks" and any(word in content for word in ["thanks", "thank you", "thx", "ty"]):
-            new_progress = progress + 1
-        elif quest["type"] == "welcome" and "welcome" in content:
-            new_progress = progress + 1
-        elif quest["type"] == "minecraft" and "minecraft" in content:
-            new_progress = progress + 1
-        elif quest["type"] == "build" and any(word in content for word in ["build", "building"]):
-            new_progress = progress + 1
-        elif quest["type"] == "mine" and any(word in content for word in ["mine", "mining"]):
-            new_progress = progress + 1
-        elif quest["type"] == "fight" and any(word in content for word in ["pvp", "fight", "fighting"]):
-            new_progress = progress + 1
-        elif quest["type"] == "trade" and any(word in content for word in ["trade", "trading"]):
-            new_progress = progress + 1
-        elif quest["type"] == "explore" and any(word in content for word in ["explore", "adventure"]):
-            new_progress = progress + 1
-        elif quest["type"] == "craft" and any(word in content for word in ["craft", "crafting"]):
-            new_progress = progress + 1
-        elif quest["type"] == "farm" and any(word in content for word in ["farm", "farming"]):
-            new_progress = progress + 1
-        elif quest["type"] == "early_bird":
-            hour = datetime.now().hour
-            if hour < 8:
-                new_progress = 1
-        elif quest["type"] == "night_owl":
-            hour = datetime.now().hour
-            if hour >= 22:
-                new_progress = 1
-        elif quest["type"] == "different_channels":
-            if user_id not in user_channels_tracker:
-                user_channels_tracker[user_id] = set()
-            user_channels_tracker[user_id].add(message.channel.id)
-            new_progress = len(user_channels_tracker[user_id])
-        elif quest["type"] == "positive" and any(word in content for word in ["awesome", "great", "nice", "good", "amazing", "fantastic", "wonderful", "excellent", "perfect", "lovely"]):
-            new_progress = progress + 1
-        elif quest["type"] == "links" and ("http://" in message.content or "https://" in message.content):
-            new_progress = progress + 1
-        elif quest["type"] == "short_message" and len(message.content) < 20:
-            new_progress = progress + 1
-        elif quest["type"] == "medium_message" and 50 <= len(message.content) < 100:
-            new_progress = progress + 1
-        
-        if new_progress >= quest["target"] and not completed:
-            db.update_quest_progress(user_id, quest_id, new_progress, 1)
-            db.update_balance(user_id, quest["reward"])
-            
+        if quest_id == SECRET_QUEST_ID:
+            embed = discord.Embed(
+                title=f"🎊 SECRET QUEST UNLOCKED! 🎊",
+                description=f"**🌿 The CBD Master**\nYou discovered and completed the secret quest!",
+                color=discord.Color.purple()
+            )
+            embed.add_field(name="💰 Secret Reward", value=f"+1,000,000,000 coins! (1 BILLION!)", inline=False)
+            embed.add_field(name="📊 Progress", value=f"You typed 'cbd' {progress} times!", inline=False)
+            embed.set_footer(text=f"Congratulations, {username}! You're one of the few who knows...")
+        else:
+            quest = get_quest_by_id(quest_id)
             embed = discord.Embed(
                 title=f"🎉 Quest Completed!",
                 description=f"**{quest['emoji']} {quest['name']}**\n{quest['description']}",
@@ -361,35 +432,8 @@ async def on_message(message):
             )
             embed.add_field(name="💰 Reward", value=f"+{quest['reward']} coins", inline=False)
             embed.set_footer(text=f"Great job, {username}!")
-            
-            await message.channel.send(embed=embed)
-        elif new_progress != progress:
-            db.update_quest_progress(user_id, quest_id, new_progress, 0)
-    
-    # Secret Quest: CBD Counter (only you know about this!)
-    if "cbd" in content:
-        secret_quest_id = 999
-        secret_progress, secret_completed = db.get_quest_progress(user_id, secret_quest_id)
         
-        if not secret_completed:
-            secret_progress += 1
-            
-            if secret_progress >= 100:
-                db.update_quest_progress(user_id, secret_quest_id, secret_progress, 1)
-                db.update_balance(user_id, 1000000000)
-                
-                embed = discord.Embed(
-                    title=f"🎊 SECRET QUEST UNLOCKED! 🎊",
-                    description=f"**🌿 The CBD Master**\nYou discovered and completed the secret quest!",
-                    color=discord.Color.purple()
-                )
-                embed.add_field(name="💰 Secret Reward", value=f"+1,000,000,000 coins! (1 BILLION!)", inline=False)
-                embed.add_field(name="📊 Progress", value=f"You typed 'cbd' {secret_progress} times!", inline=False)
-                embed.set_footer(text=f"Congratulations, {username}! You're one of the few who knows...")
-                
-                await message.channel.send(embed=embed)
-            else:
-                db.update_quest_progress(user_id, secret_quest_id, secret_progress, 0)
+        send_queue.notify(message.channel, user_id, embed)
     
     await bot.process_commands(message)
 
@@ -397,7 +441,7 @@ async def on_message(message):
 @commands.has_permissions(administrator=True)
 async def setup(ctx, server_ip: str, server_port: int):
     """🔧 Setup the Minecraft server IP and port (Admin only)"""
-    db.set_server_settings(ctx.guild.id, server_ip=server_ip, server_port=server_port)
+    await db.set_server_settings(ctx.guild.id, server_ip=server_ip, server_port=server_port)
     
     embed = discord.Embed(
         title="✅ Server Setup Complete!",
@@ -419,7 +463,7 @@ async def status_cmd(ctx, action: str = None):
     Usage: `ast status` — sets this channel as the console channel.
     """
     # If admin uses `ast status` we'll set this channel as console channel
-    db.set_server_settings(ctx.guild.id, console_channel_id=ctx.channel.id)
+    await db.set_server_settings(ctx.guild.id, console_channel_id=ctx.channel.id)
     embed = discord.Embed(
         title="✅ Console Channel Set",
         description=f"This channel will now receive console output: {ctx.channel.mention}",
@@ -436,7 +480,7 @@ async def welcome_cmd(ctx, action: str = None, channel: discord.TextChannel = No
         if channel is None:
             channel = ctx.channel
         
-        db.set_server_settings(ctx.guild.id, welcome_channel_id=channel.id)
+        await db.set_server_settings(ctx.guild.id, welcome_channel_id=channel.id)
         
         embed = discord.Embed(
             title="✅ Welcome Channel Configured!",
@@ -453,7 +497,7 @@ async def welcome_cmd(ctx, action: str = None, channel: discord.TextChannel = No
         await ctx.send(embed=embed)
     
     elif action.lower() == "on":
-        db.set_server_settings(ctx.guild.id, welcome_enabled=1)
+        await db.set_server_settings(ctx.guild.id, welcome_enabled=1)
         
         embed = discord.Embed(
             title="✅ Welcome System Enabled!",
@@ -465,7 +509,7 @@ async def welcome_cmd(ctx, action: str = None, channel: discord.TextChannel = No
         await ctx.send(embed=embed)
     
     elif action.lower() == "off":
-        db.set_server_settings(ctx.guild.id, welcome_enabled=0)
+        await db.set_server_settings(ctx.guild.id, welcome_enabled=0)
         
         embed = discord.Embed(
             title="⏸️ Welcome System Disabled",
@@ -477,17 +521,14 @@ async def welcome_cmd(ctx, action: str = None, channel: discord.TextChannel = No
         await ctx.send(embed=embed)
     
     elif action.lower() == "status":
-        settings = db.get_server_settings(ctx.guild.id)
+        settings = db.server_settings.get(ctx.guild.id)
         
         if not settings:
             await ctx.send("❌ Server not configured! Ask an admin to use `ast welcome #channel`")
             return
         
-        welcome_enabled = settings[6] if len(settings) > 6 else 1
-        welcome_channel_id = settings[4] if len(settings) > 4 else None
-        
-        status = "✅ Enabled" if welcome_enabled else "❌ Disabled"
-        channel_info = f"<#{welcome_channel_id}>" if welcome_channel_id else "Not configured"
+        status = "✅ Enabled" if settings.welcome_enabled else "❌ Disabled"
+        channel_info = f"<#{settings.welcome_channel_id}>" if settings.welcome_channel_id else "Not configured"
         
         embed = discord.Embed(
             title="👋 Welcome System Status",
@@ -504,7 +545,7 @@ async def welcome_cmd(ctx, action: str = None, channel: discord.TextChannel = No
 async def console_cmd(ctx, action: str = "status"):
     """📺 Manage console logging (Admin only)"""
     if action.lower() == "on":
-        db.set_server_settings(ctx.guild.id, console_enabled=1)
+        await db.set_server_settings(ctx.guild.id, console_enabled=1)
         
         embed = discord.Embed(
             title="✅ Console Logging Enabled!",
@@ -521,7 +562,7 @@ async def console_cmd(ctx, action: str = "status"):
         await ctx.send(embed=embed)
     
     elif action.lower() == "off":
-        db.set_server_settings(ctx.guild.id, console_enabled=0)
+        await db.set_server_settings(ctx.guild.id, console_enabled=0)
         
         embed = discord.Embed(
             title="⏸️ Console Logging Disabled",
@@ -533,17 +574,14 @@ async def console_cmd(ctx, action: str = "status"):
         await ctx.send(embed=embed)
     
     elif action.lower() == "status":
-        settings = db.get_server_settings(ctx.guild.id)
+        settings = db.server_settings.get(ctx.guild.id)
         
         if not settings:
             await ctx.send("❌ Server not configured! Ask an admin to use `ast status`")
             return
         
-        console_enabled = settings[5] if len(settings) > 5 else 1
-        console_channel_id = settings[3] if len(settings) > 3 else None
-        
-        status = "✅ Enabled" if console_enabled else "❌ Disabled"
-        channel_info = f"<#{console_channel_id}>" if console_channel_id else "Not configured"
+        status = "✅ Enabled" if settings.console_enabled else "❌ Disabled"
+        channel_info = f"<#{settings.console_channel_id}>" if settings.console_channel_id else "Not configured"
         
         embed = discord.Embed(
             title="📺 Console Logging Status",
@@ -555,215 +593,152 @@ async def console_cmd(ctx, action: str = "status"):
         
         await ctx.send(embed=embed)
 
-@bot.command(name='balance', aliases=['bal', 'money'])
-async def balance(ctx, member: discord.Member = None):
-    """💰 Check your balance or someone else's"""
-    if member is None:
-        member = ctx.author
+@bot.command(name='xpchannel', aliases=['xpchannels'])
+@commands.has_permissions(administrator=True)
+async def xpchannel_cmd(ctx, action: str = "status", channel: discord.TextChannel = None):
+    """🎯 Choose which channels earn XP and quest progress (Admin only)"""
+    action = action.lower()
+    if channel is None:
+        channel = ctx.channel
+    
+    if action in ("ignore", "only", "count"):
+        rule = None if action == "count" else action
+        await db.set_channel_rule(ctx.guild.id, channel.id, rule)
+        descriptions = {
+            "ignore": f"Messages in {channel.mention} no longer earn XP or quest progress",
+            "only": f"{channel.mention} now earns XP and quest progress (channels not marked `only` don't)",
+            "count": f"{channel.mention} is back to the server default"
+        }
+        embed = discord.Embed(
+            title="✅ XP Channels Updated!",
+            description=descriptions[action],
+            color=discord.Color.green()
+        )
+        embed.set_footer(text=f"Set by {ctx.author}")
+        
+        await ctx.send(embed=embed)
     
-    user_id = member.id
-    username = str(member)
-    db.get_user(user_id, username)
+    elif action == "reset":
+        await db.clear_channel_rules(ctx.guild.id)
+        
+        embed = discord.Embed(
+            title="✅ XP Channels Reset!",
+            description="Every channel earns XP and quest progress again",
+            color=discord.Color.green()
+        )
+        embed.set_footer(text=f"Reset by {ctx.author}")
+        
+        await ctx.send(embed=embed)
+    
+    elif action == "status":
+        rules = db.channel_rules.get(ctx.guild.id, {})
+        only = [f"<#{channel_id}>" for channel_id, rule in rules.items() if rule == "only"]
+        ignored = [f"<#{channel_id}>" for channel_id, rule in rules.items() if rule == "ignore"]
+        
+        embed = discord.Embed(
+            title="🎯 XP Channels",
+            description="Only the channels below earn XP and quest progress" if only else "Every channel earns XP and quest progress unless ignored",
+            color=discord.Color.blue()
+        )
+        if only:
+            embed.add_field(name="✅ Only", value=" ".join(only), inline=False)
+        embed.add_field(name="🚫 Ignored", value=" ".join(ignored) or "None", inline=False)
+        embed.set_footer(text=f"Requested by {ctx.author}")
+        
+        await ctx.send(embed=embed)
+    
+    else:
+        await ctx.send("❌ Use `ignore`, `only`, `count`, `reset` or `status`!")
+
+@bot.command(name='xplimit')
+@commands.has_permissions(administrator=True)
+async def xplimit_cmd(ctx, per_minute: str = "status", burst: int = None):
+    """⏱️ Limit how many messages a minute earn XP and quest progress (Admin only)"""
+    if per_minute.lower() == "status":
+        settings = db.server_settings.get(ctx.guild.id)
+        limit = XP_PER_MINUTE if settings is None or settings.xp_per_minute is None else settings.xp_per_minute
+        burst = settings.xp_burst if settings and settings.xp_burst else XP_BURST
+        
+        embed = discord.Embed(
+            title="⏱️ XP Rate Limit",
+            description=f"**{limit}** messages a minute earn XP, up to **{burst}** in a burst" if limit > 0 else "No limit: every message earns XP",
+            color=discord.Color.blue()
+        )
+        embed.add_field(name="🚫 Messages Limited", value=f"{user_message_times.limited:,} since the bot started (all servers)", inline=False)
+        embed.set_footer(text=f"Requested by {ctx.author}")
+        
+        await ctx.send(embed=embed)
+        return
     
-    await update_quest(user_id, username, 22, 1, ctx.channel)
+    if per_minute.lower() == "off":
+        limit = 0
+    else:
+        try:
+            limit = int(per_minute)
+        except ValueError:
+            await ctx.send("❌ Use a number of messages per minute, `off` or `status`!")
+            return
+    if limit < 0 or (burst is not None and burst < 1):
+        await ctx.send("❌ The limit can't be negative and the burst must be at least 1!")
+        return
     
-    user_balance = db.get_balance(user_id)
+    await db.set_server_settings(ctx.guild.id, xp_per_minute=limit, xp_burst=burst)
     
     embed = discord.Embed(
-        title=f"💰 {member.display_name}'s Balance",
-        description=f"**{user_balance:,}** coins",
-        color=discord.Color.gold()
+        title="✅ XP Rate Limit Updated!",
+        description=f"**{limit}** messages a minute now earn XP" + (f", up to **{burst}** in a burst" if burst else "") if limit else "Every message earns XP again",
+        color=discord.Color.green()
     )
-    embed.set_thumbnail(url=member.display_avatar.url)
-    embed.set_footer(text=f"Requested by {ctx.author}")
+    embed.set_footer(text=f"Set by {ctx.author}")
     
     await ctx.send(embed=embed)
 
+# Economy and quest commands live in services.py; both front ends just send the result
+services = CommandServices(db, progress_cache, quest_rollover, update_quest, refresh_daily_quests)
+
+async def send_result(ctx, result):
+    """Send a service result from a prefix command"""
+    try:
+        embed = await result
+    except ServiceError as e:
+        await send_queue.reply(ctx.channel, content=str(e))
+        return
+    await send_queue.reply(ctx.channel, embed=embed)
+
+async def respond_result(interaction, result):
+    """Send a service result from a slash command; refusals are only shown to the user"""
+    try:
+        embed = await result
+    except ServiceError as e:
+        await interaction.response.send_message(str(e), ephemeral=True)
+        return
+    await interaction.response.send_message(embed=embed)
+
+@bot.command(name='balance', aliases=['bal', 'money'])
+async def balance(ctx, member: discord.Member = None):
+    """💰 Check your balance or someone else's"""
+    await send_result(ctx, services.balance(member or ctx.author, ctx.author, ctx.channel))
+
 @bot.command(name='profile', aliases=['stats', 'me'])
 async def profile(ctx, member: discord.Member = None):
     """📊 View your profile or someone else's"""
-    if member is None:
-        member = ctx.author
-    
-    user_id = member.id
-    username = str(member)
-    user = db.get_user(user_id, username)
-    
-    balance = user[2]
-    total_earned = user[4]
-    total_spent = user[5]
-    level, xp = db.get_level_xp(user_id)
-    xp_needed = level * 100
-    
-    quests, _ = db.get_daily_quests(user_id)
-    completed_quests = sum(1 for q_id in quests if db.get_quest_progress(user_id, q_id)[1] == 1)
-    
-    embed = discord.Embed(
-        title=f"📊 {member.display_name}'s Profile",
-        description=f"⭐ Level {level} | {xp}/{xp_needed} XP",
-        color=discord.Color.blue()
-    )
-    embed.set_thumbnail(url=member.display_avatar.url)
-    embed.add_field(name="💰 Balance", value=f"{balance:,} coins", inline=True)
-    embed.add_field(name="📈 Total Earned", value=f"{total_earned:,} coins", inline=True)
-    embed.add_field(name="📉 Total Spent", value=f"{total_spent:,} coins", inline=True)
-    embed.add_field(name="✅ Quests Completed Today", value=f"{completed_quests}/5", inline=True)
-    embed.set_footer(text=f"Requested by {ctx.author}")
-    
-    await ctx.send(embed=embed)
+    await send_result(ctx, services.profile(member or ctx.author, ctx.author))
 
 @bot.command(name='leaderboard', aliases=['lb', 'top'])
-async def leaderboard(ctx):
-    """🏆 View the richest players"""
-    await update_quest(ctx.author.id, str(ctx.author), 23, 1, ctx.channel)
-    
-    top_users = db.get_leaderboard(10)
-    
-    if not top_users:
-        await ctx.send("❌ No users found in the leaderboard!")
-        return
-    
-    embed = discord.Embed(
-        title="🏆 Richest Players Leaderboard",
-        description="Top 10 wealthiest members",
-        color=discord.Color.gold()
-    )
-    
-    medals = ["🥇", "🥈", "🥉"]
-    
-    for idx, (user_id, username, balance) in enumerate(top_users):
-        medal = medals[idx] if idx < 3 else f"#{idx + 1}"
-        embed.add_field(
-            name=f"{medal} {username}",
-            value=f"💰 {balance:,} coins",
-            inline=False
-        )
-    
-    embed.set_footer(text=f"Requested by {ctx.author}")
-    
-    await ctx.send(embed=embed)
+async def leaderboard(ctx, sort: str = "balance"):
+    """🏆 View this server's top players by balance or level"""
+    guild_id = ctx.guild.id if ctx.guild else None
+    await send_result(ctx, services.leaderboard(ctx.author, guild_id, sort, ctx.channel))
 
 @bot.command(name='quests', aliases=['quest', 'daily'])
 async def quests(ctx):
     """📋 View your daily quests"""
-    user_id = ctx.author.id
-    username = str(ctx.author)
-    db.get_user(user_id, username)
-    
-    await update_quest(user_id, username, 24, 1, ctx.channel)
-    
-    quests, last_reset = db.get_daily_quests(user_id)
-    
-    if datetime.now() - last_reset > timedelta(days=1):
-        db.reset_quest_progress(user_id)
-        quests = [q["id"] for q in get_random_quests(5)]
-        db.set_daily_quests(user_id, quests)
-        
-        if user_id in user_mentions_tracker:
-            user_mentions_tracker[user_id] = set()
-        if user_id in user_channels_tracker:
-            user_channels_tracker[user_id] = set()
-    
-    if not quests:
-        quests = [q["id"] for q in get_random_quests(5)]
-        db.set_daily_quests(user_id, quests)
-    
-    embed = discord.Embed(
-        title="📋 Your Daily Quests",
-        description="Complete these to earn coins!",
-        color=discord.Color.blue()
-    )
-    
-    for quest_id in quests:
-        quest = get_quest_by_id(quest_id)
-        if not quest:
-            continue
-        
-        progress, completed = db.get_quest_progress(user_id, quest_id)
-        
-        status = "✅ Completed" if completed else f"📊 Progress: {progress}/{quest['target']}"
-        
-        embed.add_field(
-            name=f"{quest['emoji']} {quest['name']}",
-            value=f"{quest['description']}\n{status}\n💰 Reward: {quest['reward']} coins",
-            inline=False
-        )
-    
-    time_until_reset = timedelta(days=1) - (datetime.now() - last_reset)
-    hours, remainder = divmod(int(time_until_reset.total_seconds()), 3600)
-    minutes, _ = divmod(remainder, 60)
-    
-    embed.set_footer(text=f"Resets in {hours}h {minutes}m")
-    
-    await ctx.send(embed=embed)
+    await send_result(ctx, services.quests(ctx.author, ctx.channel))
 
 @bot.command(name='cf', aliases=['coinflip', 'flip'])
 async def coinflip(ctx, amount: str, choice: str):
     """🪙 Coinflip gambling - Double or nothing! Use 'all' to bet everything!"""
-    user_id = ctx.author.id
-    username = str(ctx.author)
-    db.get_user(user_id, username)
-    
-    choice = choice.lower()
-    if choice not in ['heads', 'head', 'h', 'tails', 'tail', 't']:
-        await ctx.send("❌ Please choose 'heads' or 'tails'!")
-        return
-    
-    user_balance = db.get_balance(user_id)
-    
-    # Handle "all" parameter
-    if amount.lower() == 'all':
-        amount = user_balance
-    else:
-        try:
-            amount = int(amount)
-        except ValueError:
-            await ctx.send("❌ Amount must be a number or 'all'!")
-            return
-    
-    if amount <= 0:
-        await ctx.send("❌ Amount must be positive!")
-        return
-    
-    if user_balance < amount:
-        await ctx.send(f"❌ You don't have enough coins! Your balance: {user_balance:,} coins")
-        return
-    
-    await update_quest(user_id, username, 16, 1, ctx.channel)
-    
-    result = random.choice(['heads', 'tails'])
-    user_choice_normalized = 'heads' if choice in ['heads', 'head', 'h'] else 'tails'
-    
-    won = result == user_choice_normalized
-    
-    if won:
-        db.update_balance(user_id, amount)
-        new_balance = db.get_balance(user_id)
-        
-        await update_quest(user_id, username, 18, 1, ctx.channel)
-        
-        embed = discord.Embed(
-            title="🎉 You Won!",
-            description=f"The coin landed on **{result}**!",
-            color=discord.Color.green()
-        )
-        embed.add_field(name="💰 Winnings", value=f"+{amount:,} coins", inline=True)
-        embed.add_field(name="💳 New Balance", value=f"{new_balance:,} coins", inline=True)
-    else:
-        db.update_balance(user_id, -amount)
-        new_balance = db.get_balance(user_id)
-        
-        embed = discord.Embed(
-            title="😢 You Lost!",
-            description=f"The coin landed on **{result}**!",
-            color=discord.Color.red()
-        )
-        embed.add_field(name="💸 Lost", value=f"-{amount:,} coins", inline=True)
-        embed.add_field(name="💳 New Balance", value=f"{new_balance:,} coins", inline=True)
-    
-    embed.set_footer(text=f"{ctx.author}")
-    
-    await ctx.send(embed=embed)
+    await send_result(ctx, services.coinflip(ctx.author, amount, choice, ctx.channel))
 
 @bot.command(name='gamble', aliases=['slots', 'slot'])
 async def gamble(ctx, amount: str):
@@ -773,68 +748,7 @@ async def gamble(ctx, amount: str):
     - 1/25  => x10
     Use 'all' to bet everything!
     """
-    user_id = ctx.author.id
-    username = str(ctx.author)
-    db.get_user(user_id, username)
-    
-    user_balance = db.get_balance(user_id)
-    
-    # Handle "all" parameter
-    if amount.lower() == 'all':
-        amount = user_balance
-    else:
-        try:
-            amount = int(amount)
-        except ValueError:
-            await ctx.send("❌ Amount must be a number or 'all'!")
-            return
-    
-    if amount <= 0:
-        await ctx.send("❌ Amount must be positive!")
-        return
-    
-    if user_balance < amount:
-        await ctx.send(f"❌ You don't have enough coins! Your balance: {user_balance:,} coins")
-        return
-    
-    await update_quest(user_id, username, 17, 1, ctx.channel)
-
-    r = random.random()
-    emojis = ["🍒", "🍋", "🍊", "🍇", "⭐", "💎", "7️⃣"]
-    slots = [random.choice(emojis) for _ in range(3)]
-
-    # Probabilities checked in order from rarest to most common
-    if r < 1/200:
-        winnings = amount * 100
-        db.update_balance(user_id, winnings)
-        new_balance = db.get_balance(user_id)
-        embed = discord.Embed(title="🎰 JACKPOT! 💰", description=f"{' '.join(['💎','💎','💎'])}\n\n**YOU HIT THE JACKPOT!**", color=discord.Color.gold())
-        embed.add_field(name="🎉 Winnings", value=f"+{winnings:,} coins (x100!)", inline=True)
-        embed.add_field(name="💳 New Balance", value=f"{new_balance:,} coins", inline=True)
-    elif r < 1/75:
-        winnings = amount * 50
-        db.update_balance(user_id, winnings)
-        new_balance = db.get_balance(user_id)
-        embed = discord.Embed(title="🎰 MASSIVE WIN! 💥", description=f"{' '.join(slots)}\n\nAmazing!", color=discord.Color.green())
-        embed.add_field(name="💰 Winnings", value=f"+{winnings:,} coins (x50!)", inline=True)
-        embed.add_field(name="💳 New Balance", value=f"{new_balance:,} coins", inline=True)
-    elif r < 1/25:
-        winnings = amount * 10
-        db.update_balance(user_id, winnings)
-        new_balance = db.get_balance(user_id)
-        embed = discord.Embed(title="🎰 Nice Win! 🎉", description=f"{' '.join(slots)}\n\nWell played!", color=discord.Color.blue())
-        embed.add_field(name="💰 Winnings", value=f"+{winnings:,} coins (x10!)", inline=True)
-        embed.add_field(name="💳 New Balance", value=f"{new_balance:,} coins", inline=True)
-    else:
-        db.update_balance(user_id, -amount)
-        new_balance = db.get_balance(user_id)
-        embed = discord.Embed(title="🎰 You Lost!", description=f"{' '.join(slots)}\n\nBetter luck next time!", color=discord.Color.red())
-        embed.add_field(name="💸 Lost", value=f"-{amount:,} coins", inline=True)
-        embed.add_field(name="💳 New Balance", value=f"{new_balance:,} coins", inline=True)
-    
-    embed.set_footer(text=f"{ctx.author}")
-    
-    await ctx.send(embed=embed)
+    await send_result(ctx, services.slots(ctx.author, amount, ctx.channel))
 
 
 @bot.command(name='blackjack', aliases=['bj'])
@@ -867,7 +781,7 @@ async def blackjack_hit(ctx):
     p_val = hand_value(player)
     if p_val > 21:
         await ctx.send(f"💥 Busted! Your hand: {' '.join(player)} ({p_val}). Game over.")
-        del blackjack_games[user_id]
+        blackjack_games.pop(user_id)
     else:
         await ctx.send(f"🃏 Your hand: {' '.join(player)} ({p_val}). Use `ast hit` or `ast stand`.")
 
@@ -907,7 +821,7 @@ async def blackjack_stand(ctx):
 
     embed = discord.Embed(title="🃏 Blackjack Result", description=f"Your hand: {' '.join(player)} ({p_val})\nDealer hand: {' '.join(dealer)} ({d_val})\n\n{msg}", color=discord.Color.blue())
     await ctx.send(embed=embed)
-    del blackjack_games[user_id]
+    blackjack_games.pop(user_id)
 
 @bot.command(name='help')
 async def help_command(ctx):
@@ -931,7 +845,7 @@ async def help_command(ctx):
         name="💰 Economy Commands",
         value=(f"`{prefix}balance [@user]` - Check balance\n"
                f"`{prefix}profile [@user]` - View profile\n"
-               f"`{prefix}leaderboard` - Top 10 richest\n"
+               f"`{prefix}leaderboard [balance|level]` - Top 10 players\n"
                f"`{prefix}exchange <amount>` - Exchange Discord coins for in-game (1000→1)"),
         inline=False
     )
@@ -960,7 +874,12 @@ async def help_command(ctx):
                    f"`{prefix}status` - Set this channel as console channel\n"
                    f"`{prefix}welcome [on/off/status] [#channel]` - Manage welcome system\n"
                    f"`{prefix}console on/off/status` - Toggle console logging\n"
-                   f"`{prefix}give @user <amount>` - Give coins to user"),
+                   f"`{prefix}xpchannel ignore|only|count [#channel]` - Choose where XP and quests count\n"
+                   f"`{prefix}xplimit <per minute|off> [burst]` - Limit XP from spam\n"
+                   f"`{prefix}give @user <amount>` - Give coins to user\n"
+                   f"`{prefix}bulkgive <amount> @role|@user...|@everyone` - Give coins to many users\n"
+                   f"`{prefix}bulktake <amount> @role|@user...|@everyone` - Take coins from many users\n"
+                   f"`{prefix}bulkreset <balance|xp|all> @role|@user...|@everyone` - Reset many users"),
             inline=False
         )
 
@@ -981,6 +900,16 @@ async def ping(ctx):
         description=f"Latency: **{round(bot.latency * 1000)}ms**",
         color=discord.Color.green()
     )
+    lag = loop_lag.stats()
+    embed.add_field(name="⏱️ Event Loop Lag", value=f"avg {lag['avg']:.1f}ms | p99 {lag['p99']:.1f}ms | max {lag['max']:.1f}ms", inline=False)
+    pending = progress_cache.window()
+    embed.add_field(name="💾 Unsaved Progress", value=f"{pending['dirty_rows']} rows from {pending['dirty_users']} users, oldest {pending['oldest_change_age']:.1f}s (flush every {pending['flush_interval']:.0f}s)", inline=False)
+    trackers = [user_message_times.stats(), blackjack_games.stats(), known_members.stats()]
+    embed.add_field(name="🧠 Trackers", value=f"{sum(t['entries'] for t in trackers):,} entries, ~{sum(t['bytes'] for t in trackers) / 1024:.0f} KiB ({sum(t['expired'] + t['evicted'] for t in trackers):,} expired/evicted)", inline=False)
+    filtered = event_filter.stats()
+    embed.add_field(name="🚦 Message Filter", value=f"{filtered['handled']:,} handled, {filtered['skipped']:,} skipped early (DMs, filtered channels, over the XP rate), ~{filtered['saved_ms'] / 1000:.1f}s of work saved", inline=False)
+    outbound = send_queue.stats()
+    embed.add_field(name="📨 Send Queue", value=f"{outbound['sent']:,} sent, {outbound['merged']:,} notifications merged, {outbound['throttled']:,} waits for channel limits, {outbound['queued']:,} queued", inline=False)
     await ctx.send(embed=embed)
 
 @bot.command(name='serverinfo', aliases=['server'])
@@ -988,13 +917,16 @@ async def serverinfo(ctx):
     """📊 View Minecraft server information"""
     await update_quest(ctx.author.id, str(ctx.author), 21, 1, ctx.channel)
     
-    settings = db.get_server_settings(ctx.guild.id)
+    settings = db.server_settings.get(ctx.guild.id)
     
     if not settings:
         await ctx.send("❌ Server not configured! Ask an admin to use `ast setup`")
         return
     
-    _, server_ip, server_port, console_channel_id, welcome_channel_id = settings
+    server_ip = settings.server_ip
+    server_port = settings.server_port
+    console_channel_id = settings.console_channel_id
+    welcome_channel_id = settings.welcome_channel_id
     
     embed = discord.Embed(
         title="⛏️ Minecraft Server Info",
@@ -1005,6 +937,10 @@ async def serverinfo(ctx):
         embed.add_field(name="🌐 Server IP", value=server_ip, inline=True)
     if server_port:
         embed.add_field(name="🔌 Port", value=server_port, inline=True)
+    status = status_monitor.get(server_ip, server_port) if server_ip else None
+    if status:
+        state = f"🟢 Online • {status.players_online}/{status.players_max} players" if status.online else "🔴 Offline"
+        embed.add_field(name="📡 Status", value=state, inline=False)
     if console_channel_id:
         channel = ctx.guild.get_channel(console_channel_id)
         if channel:
@@ -1022,64 +958,71 @@ async def serverinfo(ctx):
 @commands.has_permissions(administrator=True)
 async def give(ctx, member: discord.Member, amount: int):
     """💸 Give coins to a user (Admin only)"""
-    if amount <= 0:
-        await ctx.send("❌ Amount must be positive!")
-        return
-    
-    user_id = member.id
-    username = str(member)
-    db.get_user(user_id, username)
-    db.update_balance(user_id, amount)
-    
-    new_balance = db.get_balance(user_id)
-    
-    embed = discord.Embed(
-        title="✅ Coins Given!",
-        description=f"Gave **{amount:,}** coins to {member.mention}",
-        color=discord.Color.green()
-    )
-    embed.add_field(name="💳 New Balance", value=f"{new_balance:,} coins", inline=True)
-    embed.set_footer(text=f"Given by {ctx.author}")
-    
-    await ctx.send(embed=embed)
+    await send_result(ctx, services.grant(member, amount, ctx.author))
+
+
+def progress_reporter(ctx):
+    """on_progress callback for long admin jobs: posts one status message and edits it"""
+    message = None
+
+    async def report(done, total):
+        nonlocal message
+        text = f"⏳ Working... {done:,}/{total:,} members"
+        try:
+            if message is None:
+                message = await ctx.send(text)
+            else:
+                await message.edit(content=text)
+        except discord.HTTPException:
+            pass  # Progress is cosmetic; the job carries on
+
+    return report
+
+@bot.command(name='bulkgive')
+@commands.has_permissions(administrator=True)
+async def bulkgive(ctx, amount: int, *targets: Union[discord.Role, discord.Member]):
+    """💸 Give coins to every mentioned role and member, or @everyone (Admin only)"""
+    await send_result(ctx, services.bulk_grant(ctx.guild, targets, amount, ctx.author, progress_reporter(ctx)))
+
+@bot.command(name='bulktake')
+@commands.has_permissions(administrator=True)
+async def bulktake(ctx, amount: int, *targets: Union[discord.Role, discord.Member]):
+    """💸 Take coins from every mentioned role and member, or @everyone (Admin only)"""
+    await send_result(ctx, services.bulk_grant(ctx.guild, targets, amount, ctx.author, progress_reporter(ctx), take=True))
+
+@bot.command(name='bulkreset')
+@commands.has_permissions(administrator=True)
+async def bulkreset(ctx, what: str, *targets: Union[discord.Role, discord.Member]):
+    """♻️ Reset balance, xp or all for every mentioned role and member, or @everyone (Admin only)"""
+    await send_result(ctx, services.bulk_reset(ctx.guild, targets, what, ctx.author, progress_reporter(ctx)))
 
 
 @bot.command(name='exchange')
 async def exchange(ctx, amount: int):
     """🔁 Exchange Discord coins for in-game money (1000 Discord = 1 Minecraft)
 
-    Example: `ast exchange 1000` will deduct 1000 Discord coins and request 1 in-game coin via console channel.
+    Example: `ast exchange 1000` will deduct 1000 Discord coins and queue 1 in-game coin for the server to pay out.
     """
     user_id = ctx.author.id
     username = str(ctx.author)
-    db.get_user(user_id, username)
+    await db.get_user(user_id, username)
 
     if amount <= 0:
         await ctx.send("❌ Amount must be positive!")
         return
 
-    user_balance = db.get_balance(user_id)
-    if user_balance < amount:
-        await ctx.send(f"❌ You don't have enough coins! Your balance: {user_balance:,} coins")
-        return
-
     mc_amount = amount // 1000
     if mc_amount <= 0:
         await ctx.send("❌ Minimum exchange rate is 1000 Discord coins = 1 Minecraft coin.")
         return
 
-    # Deduct discord coins
-    db.update_balance(user_id, -amount)
-
-    # Notify via console channel if configured
-    settings = db.get_server_settings(ctx.guild.id)
-    console_channel_id = settings[3] if settings and len(settings) > 3 else None
-
-    if console_channel_id:
-        channel = ctx.guild.get_channel(console_channel_id)
-        if channel:
-            # Send a clear exchange message that admins / server-side bridge can act on
-            await channel.send(f"[EXCHANGE] {username} (<@{user_id}>) exchanged {amount:,} coins for {mc_amount} in-game coin(s)")
+    # Deduct discord coins and queue the payout for the exchange bridge together;
+    # the message id makes a re-processed command a no-op
+    guild_id = ctx.guild.id if ctx.guild else None
+    if await db.queue_exchange(f'discord-{ctx.message.id}', user_id, username, guild_id, amount, mc_amount) is None:
+        balance = await db.get_balance(user_id)
+        await ctx.send(f"❌ You don't have enough coins! Your balance: {balance:,} coins")
+        return
 
     embed = discord.Embed(
         title="🔁 Exchange Complete",
@@ -1130,320 +1073,48 @@ async def slash_help(interaction: discord.Interaction):
 @bot.tree.command(name="balance", description="Check your balance or someone else's")
 async def slash_balance(interaction: discord.Interaction, member: discord.Member = None):
     """Check your balance or someone else's"""
-    if member is None:
-        member = interaction.user
-    
-    user_id = member.id
-    username = str(member)
-    db.get_user(user_id, username)
-    
-    await update_quest(user_id, username, 22, 1, interaction.channel)
-    
-    user_balance = db.get_balance(user_id)
-    
-    embed = discord.Embed(
-        title=f"💰 {member.display_name}'s Balance",
-        description=f"**{user_balance:,}** coins",
-        color=discord.Color.gold()
-    )
-    embed.set_thumbnail(url=member.display_avatar.url)
-    embed.set_footer(text=f"Requested by {interaction.user}")
-    
-    await interaction.response.send_message(embed=embed)
+    await respond_result(interaction, services.balance(member or interaction.user, interaction.user, interaction.channel))
 
 @bot.tree.command(name="profile", description="View your profile or someone else's")
 async def slash_profile(interaction: discord.Interaction, member: discord.Member = None):
     """View your profile or someone else's"""
-    if member is None:
-        member = interaction.user
-    
-    user_id = member.id
-    username = str(member)
-    user = db.get_user(user_id, username)
-    
-    balance = user[2]
-    total_earned = user[4]
-    total_spent = user[5]
-    level, xp = db.get_level_xp(user_id)
-    xp_needed = level * 100
-    
-    quests, _ = db.get_daily_quests(user_id)
-    completed_quests = sum(1 for q_id in quests if db.get_quest_progress(user_id, q_id)[1] == 1)
-    
-    embed = discord.Embed(
-        title=f"📊 {member.display_name}'s Profile",
-        description=f"⭐ Level {level} | {xp}/{xp_needed} XP",
-        color=discord.Color.blue()
-    )
-    embed.set_thumbnail(url=member.display_avatar.url)
-    embed.add_field(name="💰 Balance", value=f"{balance:,} coins", inline=True)
-    embed.add_field(name="📈 Total Earned", value=f"{total_earned:,} coins", inline=True)
-    embed.add_field(name="📉 Total Spent", value=f"{total_spent:,} coins", inline=True)
-    embed.add_field(name="✅ Quests Completed Today", value=f"{completed_quests}/5", inline=True)
-    embed.set_footer(text=f"Requested by {interaction.user}")
-    
-    await interaction.response.send_message(embed=embed)
-
-@bot.tree.command(name="leaderboard", description="View the richest players")
-async def slash_leaderboard(interaction: discord.Interaction):
-    """View the richest players"""
-    await update_quest(interaction.user.id, str(interaction.user), 23, 1, interaction.channel)
-    
-    top_users = db.get_leaderboard(10)
-    
-    if not top_users:
-        await interaction.response.send_message("❌ No users found in the leaderboard!")
-        return
-    
-    embed = discord.Embed(
-        title="🏆 Richest Players Leaderboard",
-        description="Top 10 wealthiest members",
-        color=discord.Color.gold()
-    )
-    
-    medals = ["🥇", "🥈", "🥉"]
-    
-    for idx, (user_id, username, balance) in enumerate(top_users):
-        medal = medals[idx] if idx < 3 else f"#{idx + 1}"
-        embed.add_field(
-            name=f"{medal} {username}",
-            value=f"💰 {balance:,} coins",
-            inline=False
-        )
-    
-    embed.set_footer(text=f"Requested by {interaction.user}")
-    
-    await interaction.response.send_message(embed=embed)
+    await respond_result(interaction, services.profile(member or interaction.user, interaction.user))
+
+@bot.tree.command(name="leaderboard", description="View this server's top players")
+@app_commands.choices(sort=[
+    app_commands.Choice(name="Balance", value="balance"),
+    app_commands.Choice(name="Level", value="level")
+])
+async def slash_leaderboard(interaction: discord.Interaction, sort: str = "balance"):
+    """View this server's top players by balance or level"""
+    guild_id = interaction.guild.id if interaction.guild else None
+    await respond_result(interaction, services.leaderboard(interaction.user, guild_id, sort, interaction.channel))
 
 @bot.tree.command(name="quests", description="View your daily quests")
 async def slash_quests(interaction: discord.Interaction):
     """View your daily quests"""
-    user_id = interaction.user.id
-    username = str(interaction.user)
-    db.get_user(user_id, username)
-    
-    await update_quest(user_id, username, 24, 1, interaction.channel)
-    
-    quests, last_reset = db.get_daily_quests(user_id)
-    
-    if datetime.now() - last_reset > timedelta(days=1):
-        db.reset_quest_progress(user_id)
-        quests = [q["id"] for q in get_random_quests(5)]
-        db.set_daily_quests(user_id, quests)
-        
-        if user_id in user_mentions_tracker:
-            user_mentions_tracker[user_id] = set()
-        if user_id in user_channels_tracker:
-            user_channels_tracker[user_id] = set()
-    
-    if not quests:
-        quests = [q["id"] for q in get_random_quests(5)]
-        db.set_daily_quests(user_id, quests)
-    
-    embed = discord.Embed(
-        title="📋 Your Daily Quests",
-        description="Complete these to earn coins!",
-        color=discord.Color.blue()
-    )
-    
-    for quest_id in quests:
-        quest = get_quest_by_id(quest_id)
-        if not quest:
-            continue
-        
-        progress, completed = db.get_quest_progress(user_id, quest_id)
-        
-        status = "✅ Completed" if completed else f"📊 Progress: {progress}/{quest['target']}"
-        
-        embed.add_field(
-            name=f"{quest['emoji']} {quest['name']}",
-            value=f"{quest['description']}\n{status}\n💰 Reward: {quest['reward']} coins",
-            inline=False
-        )
-    
-    time_until_reset = timedelta(days=1) - (datetime.now() - last_reset)
-    hours, remainder = divmod(int(time_until_reset.total_seconds()), 3600)
-    minutes, _ = divmod(remainder, 60)
-    
-    embed.set_footer(text=f"Resets in {hours}h {minutes}m")
-    
-    await interaction.response.send_message(embed=embed)
+    await respond_result(interaction, services.quests(interaction.user, interaction.channel))
 
 @bot.tree.command(name="coinflip", description="Flip a coin and gamble! Use 'all' to bet everything")
 async def slash_coinflip(interaction: discord.Interaction, amount: str, choice: str):
     """Coinflip gambling"""
-    user_id = interaction.user.id
-    username = str(interaction.user)
-    db.get_user(user_id, username)
-    
-    choice = choice.lower()
-    if choice not in ['heads', 'head', 'h', 'tails', 'tail', 't']:
-        await interaction.response.send_message("❌ Please choose 'heads' or 'tails'!", ephemeral=True)
-        return
-    
-    user_balance = db.get_balance(user_id)
-    
-    if amount.lower() == 'all':
-        bet_amount = user_balance
-    else:
-        try:
-            bet_amount = int(amount)
-        except ValueError:
-            await interaction.response.send_message("❌ Amount must be a number or 'all'!", ephemeral=True)
-            return
-    
-    if bet_amount <= 0:
-        await interaction.response.send_message("❌ Amount must be positive!", ephemeral=True)
-        return
-    
-    if user_balance < bet_amount:
-        await interaction.response.send_message(f"❌ You don't have enough coins! Your balance: {user_balance:,} coins", ephemeral=True)
-        return
-    
-    await update_quest(user_id, username, 16, 1, interaction.channel)
-    
-    result = random.choice(['heads', 'tails'])
-    user_choice_normalized = 'heads' if choice in ['heads', 'head', 'h'] else 'tails'
-    
-    won = result == user_choice_normalized
-    
-    if won:
-        db.update_balance(user_id, bet_amount)
-        new_balance = db.get_balance(user_id)
-        await update_quest(user_id, username, 18, 1, interaction.channel)
-        
-        embed = discord.Embed(
-            title="🎉 You Won!",
-            description=f"The coin landed on **{result}**!",
-            color=discord.Color.green()
-        )
-        embed.add_field(name="💰 Winnings", value=f"+{bet_amount:,} coins", inline=True)
-        embed.add_field(name="💳 New Balance", value=f"{new_balance:,} coins", inline=True)
-    else:
-        db.update_balance(user_id, -bet_amount)
-        new_balance = db.get_balance(user_id)
-        
-        embed = discord.Embed(
-            title="😢 You Lost!",
-            description=f"The coin landed on **{result}**!",
-            color=discord.Color.red()
-        )
-        embed.add_field(name="💸 Lost", value=f"-{bet_amount:,} coins", inline=True)
-        embed.add_field(name="💳 New Balance", value=f"{new_balance:,} coins", inline=True)
-    
-    embed.set_footer(text=f"{interaction.user}")
-    await interaction.response.send_message(embed=embed)
+    await respond_result(interaction, services.coinflip(interaction.user, amount, choice, interaction.channel))
 
 @bot.tree.command(name="slots", description="Play the slot machine! Use 'all' to bet everything")
 async def slash_slots(interaction: discord.Interaction, amount: str):
     """Slot machine gambling"""
-    user_id = interaction.user.id
-    username = str(interaction.user)
-    db.get_user(user_id, username)
-    
-    user_balance = db.get_balance(user_id)
-    
-    if amount.lower() == 'all':
-        bet_amount = user_balance
-    else:
-        try:
-            bet_amount = int(amount)
-        except ValueError:
-            await interaction.response.send_message("❌ Amount must be a number or 'all'!", ephemeral=True)
-            return
-    
-    if bet_amount <= 0:
-        await interaction.response.send_message("❌ Amount must be positive!", ephemeral=True)
-        return
-    
-    if user_balance < bet_amount:
-        await interaction.response.send_message(f"❌ You don't have enough coins! Your balance: {user_balance:,} coins", ephemeral=True)
-        return
-    
-    await update_quest(user_id, username, 17, 1, interaction.channel)
-
-    r = random.random()
-    emojis = ["🍒", "🍋", "🍊", "🍇", "⭐", "💎", "7️⃣"]
-    slots = [random.choice(emojis) for _ in range(3)]
-
-    if r < 1/200:
-        winnings = bet_amount * 100
-        db.update_balance(user_id, winnings)
-        new_balance = db.get_balance(user_id)
-        embed = discord.Embed(title="🎰 JACKPOT! 💰", description=f"{' '.join(['💎','💎','💎'])}\n\n**YOU HIT THE JACKPOT!**", color=discord.Color.gold())
-        embed.add_field(name="🎉 Winnings", value=f"+{winnings:,} coins (x100!)", inline=True)
-        embed.add_field(name="💳 New Balance", value=f"{new_balance:,} coins", inline=True)
-    elif r < 1/75:
-        winnings = bet_amount * 50
-        db.update_balance(user_id, winnings)
-        new_balance = db.get_balance(user_id)
-        embed = discord.Embed(title="🎰 MASSIVE WIN! 💥", description=f"{' '.join(slots)}\n\nAmazing!", color=discord.Color.green())
-        embed.add_field(name="💰 Winnings", value=f"+{winnings:,} coins (x50!)", inline=True)
-        embed.add_field(name="💳 New Balance", value=f"{new_balance:,} coins", inline=True)
-    elif r < 1/25:
-        winnings = bet_amount * 10
-        db.update_balance(user_id, winnings)
-        new_balance = db.get_balance(user_id)
-        embed = discord.Embed(title="🎰 Nice Win! 🎉", description=f"{' '.join(slots)}\n\nWell played!", color=discord.Color.blue())
-        embed.add_field(name="💰 Winnings", value=f"+{winnings:,} coins (x10!)", inline=True)
-        embed.add_field(name="💳 New Balance", value=f"{new_balance:,} coins", inline=True)
-    else:
-        db.update_balance(user_id, -bet_amount)
-        new_balance = db.get_balance(user_id)
-        embed = discord.Embed(title="🎰 You Lost!", description=f"{' '.join(slots)}\n\nBetter luck next time!", color=discord.Color.red())
-        embed.add_field(name="💸 Lost", value=f"-{bet_amount:,} coins", inline=True)
-        embed.add_field(name="💳 New Balance", value=f"{new_balance:,} coins", inline=True)
-    
-    embed.set_footer(text=f"{interaction.user}")
-    await interaction.response.send_message(embed=embed)
+    await respond_result(interaction, services.slots(interaction.user, amount, interaction.channel))
 
 @bot.tree.command(name="give", description="Give coins to another player")
 async def slash_give(interaction: discord.Interaction, member: discord.Member, amount: int):
     """Transfer coins to another player"""
-    if amount <= 0:
-        await interaction.response.send_message("❌ Amount must be positive!", ephemeral=True)
-        return
-    
-    sender_id = interaction.user.id
-    sender_name = str(interaction.user)
-    receiver_id = member.id
-    receiver_name = str(member)
-    
-    if sender_id == receiver_id:
-        await interaction.response.send_message("❌ You can't give coins to yourself!", ephemeral=True)
-        return
-    
-    db.get_user(sender_id, sender_name)
-    db.get_user(receiver_id, receiver_name)
-    
-    sender_balance = db.get_balance(sender_id)
-    
-    if sender_balance < amount:
-        await interaction.response.send_message(f"❌ You don't have enough coins! Your balance: {sender_balance:,} coins", ephemeral=True)
-        return
-    
-    db.update_balance(sender_id, -amount)
-    db.update_balance(receiver_id, amount)
-    
-    sender_new_balance = db.get_balance(sender_id)
-    receiver_new_balance = db.get_balance(receiver_id)
-    
-    embed = discord.Embed(
-        title="✅ Money Transferred!",
-        description=f"{interaction.user.mention} gave **{amount:,}** coins to {member.mention}",
-        color=discord.Color.green()
-    )
-    embed.add_field(name=f"💳 {interaction.user.display_name}'s Balance", value=f"{sender_new_balance:,} coins", inline=True)
-    embed.add_field(name=f"💳 {member.display_name}'s Balance", value=f"{receiver_new_balance:,} coins", inline=True)
-    embed.set_footer(text=f"Transfer by {interaction.user}")
-    
-    await interaction.response.send_message(embed=embed)
+    await respond_result(interaction, services.transfer(interaction.user, member, amount))
 
 @bot.tree.command(name="setup", description="Setup the Minecraft server IP and port")
 @app_commands.checks.has_permissions(administrator=True)
 async def slash_setup(interaction: discord.Interaction, server_ip: str, server_port: int):
     """Setup Minecraft server"""
-    db.set_server_settings(interaction.guild.id, server_ip=server_ip, server_port=server_port)
+    await db.set_server_settings(interaction.guild.id, server_ip=server_ip, server_port=server_port)
     
     embed = discord.Embed(
         title="✅ Server Setup Complete!",
@@ -1460,48 +1131,55 @@ async def slash_setup(interaction: discord.Interaction, server_ip: str, server_p
 @bot.tree.command(name="checkserver", description="Check if the Minecraft server is online")
 async def slash_checkserver(interaction: discord.Interaction):
     """Check Minecraft server status"""
-    settings = db.get_server_settings(interaction.guild.id)
+    settings = db.server_settings.get(interaction.guild.id)
     
-    if not settings or not settings[1]:
+    if not settings or not settings.server_ip:
         await interaction.response.send_message("❌ Server IP not configured! Use `/setup` first.", ephemeral=True)
         return
     
-    server_ip = settings[1]
-    server_port = settings[2] if settings[2] else 25565
+    server_ip = settings.server_ip
+    server_port = settings.server_port if settings.server_port else 25565
     
-    await interaction.response.defer()
+    # The monitor keeps this fresh in the background; only ping here if it has never seen the server
+    status = status_monitor.get(server_ip, server_port)
+    if status is None:
+        await interaction.response.defer()
+        status = await status_monitor.refresh(server_ip, server_port)
+        send = interaction.followup.send
+    else:
+        send = interaction.response.send_message
     
-    try:
-        server = JavaServer.lookup(f"{server_ip}:{server_port}")
-        status = await server.async_status()
-        
+    checked = f"Checked {max(0, int(datetime.now().timestamp() - status.checked_at))}s ago"
+    
+    if status.online:
         embed = discord.Embed(
             title="🟢 Server Online!",
             description=f"**{server_ip}:{server_port}**",
             color=discord.Color.green()
         )
-        embed.add_field(name="👥 Players Online", value=f"{status.players.online}/{status.players.max}", inline=True)
+        embed.add_field(name="👥 Players Online", value=f"{status.players_online}/{status.players_max}", inline=True)
         embed.add_field(name="📊 Latency", value=f"{status.latency:.0f}ms", inline=True)
-        embed.add_field(name="🎮 Version", value=status.version.name, inline=True)
-        
-        if status.players.sample:
-            player_names = [player.name for player in status.players.sample[:10]]
-            embed.add_field(name="🎯 Players", value="\n".join(player_names), inline=False)
-        
-        embed.set_footer(text=f"Requested by {interaction.user}")
+        embed.add_field(name="🎮 Version", value=status.version, inline=True)
         
-        await interaction.followup.send(embed=embed)
+        if status.players:
+            embed.add_field(name="🎯 Players", value="\n".join(status.players[:10]), inline=False)
         
-    except Exception as e:
+        history = [(players, latency) for _, players, latency in status_monitor.history(server_ip, server_port) if latency is not None]
+        if len(history) > 1:
+            peak = max(players for players, _ in history)
+            avg_latency = sum(latency for _, latency in history) / len(history)
+            embed.add_field(name="📈 Recently", value=f"Peak {peak} players • Avg {avg_latency:.0f}ms", inline=False)
+    else:
         embed = discord.Embed(
             title="🔴 Server Offline",
             description=f"**{server_ip}:{server_port}**\n\nThe server appears to be offline or unreachable.",
             color=discord.Color.red()
         )
-        embed.add_field(name="❌ Error", value=str(e)[:100], inline=False)
-        embed.set_footer(text=f"Requested by {interaction.user}")
-        
-        await interaction.followup.send(embed=embed)
+        embed.add_field(name="❌ Error", value=status.error, inline=False)
+    
+    embed.set_footer(text=f"Requested by {interaction.user} • {checked}")
+    
+    await send(embed=embed)
 
 @bot.event
 async def on_command_error(ctx, error):
@@ -1539,4 +1217,9 @@ if __name__ == '__main__':
         exit(1)
     
     print('🚀 Starting bot...')
-    bot.run(token)
+    try:
+        bot.run(token)
+    finally:
+        progress_cache.flush_sync()
+        db.database.flush_transactions()
+        db.close()
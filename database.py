@@ -1,153 +1,520 @@
+import asyncio
+import functools
 import sqlite3
-import json
-from datetime import datetime, timedelta
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass, astuple, replace
+from datetime import datetime
 import random
+import time
+
+from leaderboard import Rankings
+from leveling import level_up
+from migrations import migrate
+from quests import pack_quest_ids, unpack_quest_ids
+
+@dataclass(slots=True)
+class ServerSettings:
+    """One guild's row of server_settings"""
+    guild_id: int
+    server_ip: str = None
+    server_port: int = None
+    console_channel_id: int = None
+    welcome_channel_id: int = None
+    console_enabled: int = 1
+    welcome_enabled: int = 1
+    xp_per_minute: int = None
+    xp_burst: int = None
 
 class Database:
+    # Connection tuning applied once when a connection is opened
+    CACHE_SIZE_KB = 16384
+    MMAP_SIZE = 256 * 1024 * 1024
+    BUSY_TIMEOUT = 5.0
+    # Ledger rows queued before record_transaction() writes them itself
+    LEDGER_BATCH_SIZE = 1000
+    # SQLite integers are signed 64-bit; rollup totals saturate here instead of failing the batch
+    MAX_INTEGER = 2**63 - 1
+    # get_profile() results are reused this long unless a write drops them first
+    PROFILE_TTL = 10.0
+    PROFILE_CACHE_SIZE = 10000
+    # Users per UPDATE in bulk_adjust()/bulk_reset()
+    BULK_CHUNK = 5000
+    # Rows read or merged per load_rankings_step() call
+    RANKINGS_CHUNK = 10000
+    
     def __init__(self, db_name='minecraft_bot.db'):
         self.db_name = db_name
+        self._local = threading.local()
+        self._connections = []
+        self._connections_lock = threading.Lock()
+        self.rankings = Rankings()
+        # guild_id -> ServerSettings, filled by load_server_settings()
+        self.server_settings = {}
+        self.server_settings_loaded = False
+        # guild_id -> {channel_id: 'ignore' | 'only'}, indexed into the two lookups below
+        self.channel_rules = {}
+        self.ignored_channels = set()
+        self.only_channels = {}
+        # (ts, user_id, kind, amount, wager) rows waiting for flush_transactions()
+        self.pending_transactions = []
+        # user_id -> (expires, profile) for get_profile()
+        self.profiles = {}
         self.init_db()
+        self.load_server_settings()
+        self.load_channel_rules()
     
     def get_connection(self):
-        return sqlite3.connect(self.db_name)
+        """Return this thread's long-lived connection, opening it on first use"""
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._open_connection()
+            self._local.conn = conn
+            with self._connections_lock:
+                self._connections.append(conn)
+        return conn
+    
+    def _open_connection(self):
+        # check_same_thread is off only so close() can shut every thread's connection down
+        conn = sqlite3.connect(self.db_name, timeout=self.BUSY_TIMEOUT, check_same_thread=False)
+        conn.execute('PRAGMA journal_mode = WAL')
+        conn.execute('PRAGMA synchronous = NORMAL')
+        conn.execute(f'PRAGMA cache_size = -{self.CACHE_SIZE_KB}')
+        conn.execute(f'PRAGMA mmap_size = {self.MMAP_SIZE}')
+        conn.execute('PRAGMA temp_store = MEMORY')
+        return conn
+    
+    def close(self):
+        """Commit and close every pooled connection (call on shutdown)"""
+        with self._connections_lock:
+            connections, self._connections = self._connections, []
+        for conn in connections:
+            try:
+                conn.commit()
+                conn.close()
+            except sqlite3.ProgrammingError:
+                pass
+        self._local = threading.local()
     
     def init_db(self):
+        """Apply any pending schema migrations (see migrations.py)"""
+        for version, description in migrate(self.get_connection()):
+            print(f'✅ Applied schema migration {version}: {description}')
+    
+    def get_user(self, user_id, username):
         conn = self.get_connection()
         cursor = conn.cursor()
         
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS users (
-                user_id INTEGER PRIMARY KEY,
-                username TEXT,
-                balance INTEGER DEFAULT 0,
-                daily_quests TEXT,
-                last_quest_reset TEXT,
-                total_earned INTEGER DEFAULT 0,
-                total_spent INTEGER DEFAULT 0,
-                level INTEGER DEFAULT 1,
-                xp INTEGER DEFAULT 0
-            )
-        ''')
+        cursor.execute('SELECT * FROM users WHERE user_id = ?', (user_id,))
+        user = cursor.fetchone()
         
+        if not user:
+            cursor.execute('INSERT INTO users (user_id, username, balance) VALUES (?, ?, 0)', (user_id, username))
+            conn.commit()
+            self.rankings.add_member(None, (user_id, username, 0, 1, 0))
+            cursor.execute('SELECT * FROM users WHERE user_id = ?', (user_id,))
+            user = cursor.fetchone()
+        
+        return user
+    
+    def update_balance(self, user_id, amount, kind='adjust'):
+        """Add `amount` (may be negative) to a balance; returns the new balance"""
+        return self._change_balance(user_id, None, amount, kind)
+    
+    def get_balance(self, user_id):
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('SELECT balance FROM users WHERE user_id = ?', (user_id,))
+        result = cursor.fetchone()
+        return result[0] if result else 0
+    
+    def _apply_if_covered(self, cursor, user_id, required, amount):
+        """Add `amount` to a balance that is at least `required` (None: any balance)
+        
+        Returns the new balance, or None if no row matched.
+        """
+        earned, spent = (amount, 0) if amount > 0 else (0, -amount)
         cursor.execute('''
-            CREATE TABLE IF NOT EXISTS server_settings (
-                guild_id INTEGER PRIMARY KEY,
-                server_ip TEXT,
-                server_port INTEGER,
-                console_channel_id INTEGER,
-                welcome_channel_id INTEGER,
-                console_enabled INTEGER DEFAULT 1,
-                welcome_enabled INTEGER DEFAULT 1
-            )
-        ''')
+            UPDATE users
+            SET balance = balance + ?, total_earned = total_earned + ?, total_spent = total_spent + ?
+            WHERE user_id = ? AND (? IS NULL OR balance >= ?)
+            RETURNING balance
+        ''', (amount, earned, spent, user_id, required, required))
+        result = cursor.fetchone()
+        return result[0] if result else None
+    
+    def _change_balance(self, user_id, required, amount, kind, wager=0):
+        conn = self.get_connection()
+        balance = self._apply_if_covered(conn.cursor(), user_id, required, amount)
+        conn.commit()
         
-        try:
-            cursor.execute('ALTER TABLE server_settings ADD COLUMN welcome_channel_id INTEGER')
-            conn.commit()
-        except sqlite3.OperationalError:
-            pass
+        if balance is not None:
+            self.rankings.update(user_id, balance=balance)
+            self._forget_profiles((user_id,))
+            self.record_transaction(user_id, kind, amount, wager)
+        return balance
+    
+    def try_debit(self, user_id, amount, kind='debit'):
+        """Take `amount` from a user only if they have it; returns the new balance or None"""
+        return self._change_balance(user_id, amount, -amount, kind)
+    
+    def settle_bet(self, user_id, stake, winnings, kind='bet'):
+        """Apply a bet's net result if the balance still covers the stake
         
-        try:
-            cursor.execute('ALTER TABLE server_settings ADD COLUMN console_enabled INTEGER DEFAULT 1')
-            conn.commit()
-        except sqlite3.OperationalError:
-            pass
+        `winnings` is the net change: positive on a win, -stake on a loss. The
+        balance check and the update are one statement, so concurrent bets
+        can't spend the same coins twice. Returns the new balance, or None if
+        the user can't cover the stake.
+        """
+        return self._change_balance(user_id, stake, winnings, kind, wager=stake)
+    
+    def transfer(self, sender_id, receiver_id, amount, kind='transfer'):
+        """Move coins between users in one transaction
+        
+        Returns (sender_balance, receiver_balance), or None if the sender
+        can't cover `amount` or the receiver doesn't exist.
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
         
         try:
-            cursor.execute('ALTER TABLE server_settings ADD COLUMN welcome_enabled INTEGER DEFAULT 1')
+            sender_balance = self._apply_if_covered(cursor, sender_id, amount, -amount)
+            receiver_balance = None
+            if sender_balance is not None:
+                receiver_balance = self._apply_if_covered(cursor, receiver_id, None, amount)
+            if receiver_balance is None:
+                conn.rollback()
+                return None
             conn.commit()
-        except sqlite3.OperationalError:
-            pass
+        except Exception:
+            conn.rollback()
+            raise
         
+        self.rankings.update(sender_id, balance=sender_balance)
+        self.rankings.update(receiver_id, balance=receiver_balance)
+        self._forget_profiles((sender_id, receiver_id))
+        self.record_transaction(sender_id, kind, -amount)
+        self.record_transaction(receiver_id, kind, amount)
+        return sender_balance, receiver_balance
+    
+    def bulk_adjust(self, amount, user_ids=None, guild_id=None, kind='admin_bulk', progress=None):
+        """Credit (amount > 0) or debit (amount < 0) many users in one transaction
+        
+        Targets are `user_ids`, else the members of `guild_id`, else every
+        user. Debits stop at zero. See _bulk_update() for `progress` and the
+        return value.
+        """
+        if amount >= 0:
+            assignments = 'balance = balance + ?, total_earned = total_earned + ?'
+        else:
+            # Every right-hand side sees the old balance; a negative one is left alone
+            assignments = 'total_spent = total_spent + MAX(0, MIN(balance, ?)), balance = balance - MAX(0, MIN(balance, ?))'
+        return self._bulk_update(assignments, (abs(amount), abs(amount)), kind, user_ids, guild_id, progress)
+    
+    def bulk_reset(self, guild_id=None, user_ids=None, balance=True, xp=True, kind='admin_reset', progress=None):
+        """Zero balances and/or put levels back to 1 with no XP, in one transaction
+        
+        Targets are chosen like bulk_adjust(). Balances taken away are
+        recorded in the ledger; lifetime totals are left alone.
+        """
+        assignments = ', '.join(clause for clause, wanted in (('balance = 0', balance), ('level = 1, xp = 0', xp)) if wanted)
+        if not assignments:
+            return {'users': 0, 'net': 0}
+        return self._bulk_update(assignments, (), kind, user_ids, guild_id, progress)
+    
+    def _bulk_update(self, assignments, params, kind, user_ids, guild_id, progress):
+        """Apply `UPDATE users SET <assignments>` to a target set, BULK_CHUNK users per statement
+        
+        Targets are copied into a temp table first, so every chunk is one
+        indexed range. `progress(done, total)` is called after each chunk,
+        on the database thread. Nothing is committed until every chunk has
+        run. Returns {'users': rows updated, 'net': total balance change}.
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('CREATE TEMP TABLE IF NOT EXISTS bulk_targets (user_id INTEGER NOT NULL)')
+        
+        changes = []
         try:
-            cursor.execute('ALTER TABLE users ADD COLUMN level INTEGER DEFAULT 1')
+            cursor.execute('DELETE FROM temp.bulk_targets')
+            if user_ids is not None:
+                cursor.executemany('INSERT INTO temp.bulk_targets (user_id) VALUES (?)', [(user_id,) for user_id in set(user_ids)])
+            elif guild_id is not None:
+                cursor.execute('INSERT INTO temp.bulk_targets (user_id) SELECT user_id FROM guild_members WHERE guild_id = ?', (guild_id,))
+            else:
+                cursor.execute('INSERT INTO temp.bulk_targets (user_id) SELECT user_id FROM users')
+            # An emptied table numbers its rows from 1 again
+            cursor.execute('SELECT COUNT(*) FROM temp.bulk_targets')
+            total = cursor.fetchone()[0]
+        
+            chunk = 'SELECT user_id FROM temp.bulk_targets WHERE rowid > ? AND rowid <= ?'
+            for start in range(0, total, self.BULK_CHUNK):
+                end = start + self.BULK_CHUNK
+                cursor.execute(f'SELECT user_id, balance FROM users WHERE user_id IN ({chunk})', (start, end))
+                before = dict(cursor.fetchall())
+                cursor.execute(f'UPDATE users SET {assignments} WHERE user_id IN ({chunk}) RETURNING user_id, balance, level, xp',
+                               (*params, start, end))
+                changes.extend((user_id, balance - before[user_id], balance, level, xp) for user_id, balance, level, xp in cursor.fetchall())
+                if progress:
+                    progress(min(end, total), total)
             conn.commit()
-        except sqlite3.OperationalError:
-            pass
+        except Exception:
+            conn.rollback()
+            raise
+        
+        # Re-sorting every board entry by entry costs more than a reload
+        if len(changes) > self.BULK_CHUNK:
+            self.rankings.invalidate()
+        else:
+            for user_id, _, balance, level, xp in changes:
+                self.rankings.update(user_id, balance=balance, level=level, xp=xp)
+        self._forget_profiles([change[0] for change in changes])
+        
+        ts = int(time.time())
+        self.pending_transactions.extend((ts, user_id, kind, delta, 0) for user_id, delta, _, _, _ in changes if delta)
+        self.flush_transactions()
+        return {'users': len(changes), 'net': sum(change[1] for change in changes)}
+    
+    def record_transaction(self, user_id, kind, amount, wager=0):
+        """Queue a ledger row; rows are written in batches by flush_transactions()"""
+        self.pending_transactions.append((int(time.time()), user_id, kind, amount, wager))
+        if len(self.pending_transactions) >= self.LEDGER_BATCH_SIZE:
+            self.flush_transactions()
+    
+    def flush_transactions(self):
+        """Append queued ledger rows and fold them into the daily rollups
+        
+        Returns how many rows were written.
+        """
+        rows, self.pending_transactions = self.pending_transactions, []
+        if not rows:
+            return 0
+        
+        rollups = {}
+        days = {}
+        for ts, user_id, kind, amount, wager in rows:
+            day = days.get(ts)
+            if day is None:
+                day = days[ts] = datetime.fromtimestamp(ts).toordinal()
+            # user_id 0 holds the day's total for the kind
+            for key in ((day, kind, user_id), (day, kind, 0)):
+                totals = rollups.setdefault(key, [0, 0, 0, 0])
+                totals[0] += 1
+                totals[1 if amount > 0 else 2] += abs(amount)
+                totals[3] += wager
         
+        conn = self.get_connection()
+        cursor = conn.cursor()
         try:
-            cursor.execute('ALTER TABLE users ADD COLUMN xp INTEGER DEFAULT 0')
+            cursor.executemany('INSERT INTO transactions (ts, user_id, kind, amount, wager) VALUES (?, ?, ?, ?, ?)', rows)
+            capped = 0
+            for key, totals in rollups.items():
+                # Totals past the largest SQLite integer are held at it rather than turning into floats
+                cursor.execute('''
+                    INSERT INTO transaction_rollups (day, kind, user_id, entries, earned, spent, wagered)
+                    VALUES (?, ?, ?, ?, ?, ?, ?)
+                    ON CONFLICT (day, kind, user_id) DO UPDATE SET
+                        entries = entries + excluded.entries,
+                        earned = MIN(earned + excluded.earned, ?),
+                        spent = MIN(spent + excluded.spent, ?),
+                        wagered = MIN(wagered + excluded.wagered, ?)
+                    RETURNING earned, spent, wagered
+                ''', (*key, *(min(total, self.MAX_INTEGER) for total in totals), *[self.MAX_INTEGER] * 3))
+                if self.MAX_INTEGER in cursor.fetchone():
+                    capped += 1
             conn.commit()
-        except sqlite3.OperationalError:
-            pass
+        except Exception:
+            conn.rollback()
+            # Keep them queued, ahead of anything recorded since
+            self.pending_transactions[:0] = rows
+            raise
         
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS quest_progress (
-                user_id INTEGER,
-                quest_id INTEGER,
-                progress INTEGER DEFAULT 0,
-                completed INTEGER DEFAULT 0,
-                PRIMARY KEY (user_id, quest_id)
-            )
-        ''')
+        if capped:
+            print(f'⚠️ {capped} ledger rollup totals are capped at {self.MAX_INTEGER:,}; earnings and house stats that include them are understated')
+        return len(rows)
+    
+    def get_earnings(self, user_id, since_day):
+        """Return (earned, spent) for a user from the rollups since a date ordinal"""
+        self.flush_transactions()
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('SELECT earned, spent FROM transaction_rollups WHERE user_id = ? AND day >= ?', (user_id, since_day))
+        rows = cursor.fetchall()
+        # Summed here because SQL SUM() raises once a total passes MAX_INTEGER
+        return sum(row[0] for row in rows), sum(row[1] for row in rows)
+    
+    def get_house_stats(self, day, kinds=('coinflip', 'slots')):
+        """Return totals for the given games on one day (date ordinal)
         
-        conn.commit()
-        conn.close()
+        'edge' is the share of the amount wagered the players lost.
+        """
+        self.flush_transactions()
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute(f'''
+            SELECT entries, earned, spent, wagered
+            FROM transaction_rollups
+            WHERE day = ? AND kind IN ({', '.join('?' * len(kinds))}) AND user_id = 0
+        ''', (day, *kinds))
+        rows = cursor.fetchall()
+        # Summed here, like get_earnings()
+        bets, earned, spent, wagered = (sum(row[column] for row in rows) for column in range(4))
+        return {
+            'bets': bets,
+            'wagered': wagered,
+            'house_profit': spent - earned,
+            'edge': (spent - earned) / wagered if wagered else 0.0
+        }
     
-    def get_user(self, user_id, username):
+    def archive_transactions(self, before_ts, archive_path, limit=5000):
+        """Move up to `limit` ledger rows older than `before_ts` into another database
+        
+        Rows are taken in id order, which is the order they were recorded in,
+        so each call only touches the oldest chunk. Rollups are kept, so
+        aggregate queries still cover archived days. Call repeatedly until it
+        returns less than `limit`. Copying is idempotent (rows keep their id),
+        so an interrupted run is safe to repeat; a different row already
+        archived under one of the ids raises sqlite3.IntegrityError and
+        nothing is deleted.
+        """
+        self.flush_transactions()
         conn = self.get_connection()
         cursor = conn.cursor()
         
-        cursor.execute('SELECT * FROM users WHERE user_id = ?', (user_id,))
-        user = cursor.fetchone()
+        cursor.execute('SELECT id, ts, user_id, kind, amount, wager FROM transactions ORDER BY id LIMIT ?', (limit,))
+        rows = []
+        for row in cursor.fetchall():
+            if row[1] >= before_ts:
+                break
+            rows.append(row)
+        if not rows:
+            return 0
         
-        if not user:
+        cursor.execute('ATTACH DATABASE ? AS archive', (archive_path,))
+        try:
             cursor.execute('''
-                INSERT INTO users (user_id, username, balance, daily_quests, last_quest_reset)
-                VALUES (?, ?, 0, '[]', ?)
-            ''', (user_id, username, datetime.now().isoformat()))
+                CREATE TABLE IF NOT EXISTS archive.transactions (
+                    id INTEGER PRIMARY KEY,
+                    ts INTEGER,
+                    user_id INTEGER,
+                    kind TEXT,
+                    amount INTEGER,
+                    wager INTEGER DEFAULT 0
+                )
+            ''')
+            cursor.executemany('INSERT INTO archive.transactions (id, ts, user_id, kind, amount, wager) VALUES (?, ?, ?, ?, ?, ?) ON CONFLICT (id) DO NOTHING', rows)
+            # Rows left by an interrupted run match; anything else must not be deleted from the ledger
+            cursor.execute('SELECT id, ts, user_id, kind, amount, wager FROM archive.transactions WHERE id BETWEEN ? AND ?', (rows[0][0], rows[-1][0]))
+            archived = {row[0]: row for row in cursor.fetchall()}
+            clashes = [row[0] for row in rows if archived.get(row[0]) != row]
+            if clashes:
+                raise sqlite3.IntegrityError(f'archive already holds different ledger rows with ids {clashes[:5]}')
+            # With WAL the two files don't commit atomically, so the copy is committed first
             conn.commit()
-            cursor.execute('SELECT * FROM users WHERE user_id = ?', (user_id,))
-            user = cursor.fetchone()
+            cursor.execute('DELETE FROM transactions WHERE id <= ?', (rows[-1][0],))
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            cursor.execute('DETACH DATABASE archive')
         
-        conn.close()
-        return user
+        return len(rows)
     
-    def update_balance(self, user_id, amount):
+    def queue_exchange(self, idempotency_key, user_id, username, guild_id, amount, mc_amount):
+        """Debit `amount` and queue the exchange for the Minecraft side in one transaction
+        
+        Returns the new balance, or None if the user can't cover `amount`.
+        A key that was already queued changes nothing and returns the
+        current balance, so a retried command can't pay out twice.
+        """
         conn = self.get_connection()
         cursor = conn.cursor()
         
-        cursor.execute('UPDATE users SET balance = balance + ? WHERE user_id = ?', (amount, user_id))
+        try:
+            cursor.execute('''
+                INSERT INTO exchange_outbox (idempotency_key, user_id, username, guild_id, amount, mc_amount, created_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (idempotency_key) DO NOTHING
+                RETURNING id
+            ''', (idempotency_key, user_id, username, guild_id, amount, mc_amount, int(time.time())))
+            if cursor.fetchone() is None:
+                conn.rollback()
+                return self.get_balance(user_id)
+            balance = self._apply_if_covered(cursor, user_id, amount, -amount)
+            if balance is None:
+                conn.rollback()
+                return None
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
         
-        if amount > 0:
-            cursor.execute('UPDATE users SET total_earned = total_earned + ? WHERE user_id = ?', (amount, user_id))
-        else:
-            cursor.execute('UPDATE users SET total_spent = total_spent + ? WHERE user_id = ?', (abs(amount), user_id))
+        self.rankings.update(user_id, balance=balance)
+        self._forget_profiles((user_id,))
+        self.record_transaction(user_id, 'exchange', -amount)
+        return balance
+    
+    def lease_exchanges(self, limit, lease_seconds):
+        """Hand out up to `limit` undelivered exchanges, oldest first
         
+        Each one is leased for `lease_seconds`; anything not acknowledged by
+        then is handed out again.
+        """
+        now = int(time.time())
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            UPDATE exchange_outbox
+            SET leased_until = ?, attempts = attempts + 1
+            WHERE id IN (
+                SELECT id FROM exchange_outbox
+                WHERE delivered_at IS NULL AND leased_until <= ?
+                ORDER BY id
+                LIMIT ?
+            )
+            RETURNING id, idempotency_key, user_id, username, guild_id, amount, mc_amount, created_at, attempts
+        ''', (now + lease_seconds, now, limit))
+        rows = cursor.fetchall()
         conn.commit()
-        conn.close()
+        return sorted(rows)
     
-    def get_balance(self, user_id):
+    def ack_exchanges(self, idempotency_keys):
+        """Mark exchanges delivered; returns how many weren't acknowledged before"""
         conn = self.get_connection()
         cursor = conn.cursor()
-        cursor.execute('SELECT balance FROM users WHERE user_id = ?', (user_id,))
-        result = cursor.fetchone()
-        conn.close()
-        return result[0] if result else 0
+        now = int(time.time())
+        cursor.executemany('UPDATE exchange_outbox SET delivered_at = ? WHERE idempotency_key = ? AND delivered_at IS NULL',
+                           [(now, key) for key in idempotency_keys])
+        conn.commit()
+        return cursor.rowcount
+    
+    def prune_exchange_outbox(self, before_ts):
+        """Delete exchanges delivered before `before_ts` (the ledger keeps the history)"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('DELETE FROM exchange_outbox WHERE delivered_at < ?', (before_ts,))
+        conn.commit()
+        return cursor.rowcount
     
     def get_daily_quests(self, user_id):
+        """Return (quest_ids, day) for a user's current assignment, or ([], 0)"""
         conn = self.get_connection()
         cursor = conn.cursor()
-        cursor.execute('SELECT daily_quests, last_quest_reset FROM users WHERE user_id = ?', (user_id,))
+        cursor.execute('SELECT quests, day FROM daily_assignments WHERE user_id = ?', (user_id,))
         result = cursor.fetchone()
-        conn.close()
         
         if result:
-            quests = json.loads(result[0]) if result[0] else []
-            last_reset = datetime.fromisoformat(result[1])
-            return quests, last_reset
-        return [], datetime.now()
+            return unpack_quest_ids(result[0]), result[1]
+        return [], 0
     
-    def set_daily_quests(self, user_id, quests):
+    def set_daily_quests(self, user_id, quests, day):
         conn = self.get_connection()
         cursor = conn.cursor()
-        cursor.execute('''
-            UPDATE users 
-            SET daily_quests = ?, last_quest_reset = ?
-            WHERE user_id = ?
-        ''', (json.dumps(quests), datetime.now().isoformat(), user_id))
+        cursor.execute('DELETE FROM daily_assignments WHERE user_id = ?', (user_id,))
+        cursor.execute('INSERT INTO daily_assignments (user_id, day, quests) VALUES (?, ?, ?)', (user_id, day, pack_quest_ids(quests)))
         conn.commit()
-        conn.close()
+        self._forget_profiles((user_id,))
     
     def get_quest_progress(self, user_id, quest_id):
         conn = self.get_connection()
@@ -157,7 +524,6 @@ class Database:
             WHERE user_id = ? AND quest_id = ?
         ''', (user_id, quest_id))
         result = cursor.fetchone()
-        conn.close()
         return result if result else (0, 0)
     
     def update_quest_progress(self, user_id, quest_id, progress, completed=0):
@@ -168,64 +534,242 @@ class Database:
             VALUES (?, ?, ?, ?)
         ''', (user_id, quest_id, progress, completed))
         conn.commit()
-        conn.close()
+        self._forget_profiles((user_id,))
     
     def reset_quest_progress(self, user_id):
         conn = self.get_connection()
         cursor = conn.cursor()
         cursor.execute('DELETE FROM quest_progress WHERE user_id = ?', (user_id,))
+        cursor.execute('DELETE FROM quest_sets WHERE user_id = ?', (user_id,))
         conn.commit()
-        conn.close()
+        self._forget_profiles((user_id,))
     
-    def set_server_settings(self, guild_id, server_ip=None, server_port=None, console_channel_id=None, welcome_channel_id=None, console_enabled=None, welcome_enabled=None):
+    def set_server_settings(self, guild_id, server_ip=None, server_port=None, console_channel_id=None, welcome_channel_id=None, console_enabled=None, welcome_enabled=None, xp_per_minute=None, xp_burst=None):
+        """Update a guild's settings in one upsert and return the new ServerSettings"""
+        current = self.get_server_settings(guild_id) or ServerSettings(guild_id)
+        changes = {
+            'server_ip': server_ip or None,
+            'server_port': server_port or None,
+            'console_channel_id': console_channel_id,
+            'welcome_channel_id': welcome_channel_id,
+            'console_enabled': console_enabled,
+            'welcome_enabled': welcome_enabled,
+            'xp_per_minute': xp_per_minute,
+            'xp_burst': xp_burst
+        }
+        settings = replace(current, **{name: value for name, value in changes.items() if value is not None})
+        
         conn = self.get_connection()
         cursor = conn.cursor()
+        cursor.execute('''
+            INSERT INTO server_settings (guild_id, server_ip, server_port, console_channel_id, welcome_channel_id, console_enabled, welcome_enabled, xp_per_minute, xp_burst)
+            VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+            ON CONFLICT (guild_id) DO UPDATE SET
+                server_ip = excluded.server_ip,
+                server_port = excluded.server_port,
+                console_channel_id = excluded.console_channel_id,
+                welcome_channel_id = excluded.welcome_channel_id,
+                console_enabled = excluded.console_enabled,
+                welcome_enabled = excluded.welcome_enabled,
+                xp_per_minute = excluded.xp_per_minute,
+                xp_burst = excluded.xp_burst
+        ''', astuple(settings))
+        conn.commit()
         
-        cursor.execute('SELECT * FROM server_settings WHERE guild_id = ?', (guild_id,))
-        exists = cursor.fetchone()
-        
-        if exists:
-            if server_ip:
-                cursor.execute('UPDATE server_settings SET server_ip = ? WHERE guild_id = ?', (server_ip, guild_id))
-            if server_port:
-                cursor.execute('UPDATE server_settings SET server_port = ? WHERE guild_id = ?', (server_port, guild_id))
-            if console_channel_id is not None:
-                cursor.execute('UPDATE server_settings SET console_channel_id = ? WHERE guild_id = ?', (console_channel_id, guild_id))
-            if welcome_channel_id is not None:
-                cursor.execute('UPDATE server_settings SET welcome_channel_id = ? WHERE guild_id = ?', (welcome_channel_id, guild_id))
-            if console_enabled is not None:
-                cursor.execute('UPDATE server_settings SET console_enabled = ? WHERE guild_id = ?', (console_enabled, guild_id))
-            if welcome_enabled is not None:
-                cursor.execute('UPDATE server_settings SET welcome_enabled = ? WHERE guild_id = ?', (welcome_enabled, guild_id))
+        # Swapped in whole, like the channel rules: the event loop iterates this without a lock
+        self.server_settings = {**self.server_settings, guild_id: settings}
+        return settings
+    
+    def get_server_settings(self, guild_id):
+        """Return a guild's ServerSettings, or None if it was never configured"""
+        if not self.server_settings_loaded:
+            self.load_server_settings()
+        return self.server_settings.get(guild_id)
+    
+    def load_server_settings(self):
+        """Read every guild's settings into the server_settings cache"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT guild_id, server_ip, server_port, console_channel_id, welcome_channel_id, console_enabled, welcome_enabled, xp_per_minute, xp_burst
+            FROM server_settings
+        ''')
+        self.server_settings = {row[0]: ServerSettings(*row) for row in cursor.fetchall()}
+        self.server_settings_loaded = True
+        return len(self.server_settings)
+    
+    def set_channel_rule(self, guild_id, channel_id, rule):
+        """Mark a channel 'ignore' (no XP or quests) or 'only' (counts, others don't); None clears it"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        if rule is None:
+            cursor.execute('DELETE FROM channel_rules WHERE guild_id = ? AND channel_id = ?', (guild_id, channel_id))
         else:
             cursor.execute('''
-                INSERT INTO server_settings (guild_id, server_ip, server_port, console_channel_id, welcome_channel_id, console_enabled, welcome_enabled)
-                VALUES (?, ?, ?, ?, ?, ?, ?)
-            ''', (guild_id, server_ip, server_port, console_channel_id, welcome_channel_id, console_enabled if console_enabled is not None else 1, welcome_enabled if welcome_enabled is not None else 1))
+                INSERT INTO channel_rules (guild_id, channel_id, rule) VALUES (?, ?, ?)
+                ON CONFLICT (guild_id, channel_id) DO UPDATE SET rule = excluded.rule
+            ''', (guild_id, channel_id, rule))
+        conn.commit()
         
+        rules = dict(self.channel_rules.get(guild_id, {}))
+        if rule is None:
+            rules.pop(channel_id, None)
+        else:
+            rules[channel_id] = rule
+        self._index_channel_rules({**self.channel_rules, guild_id: rules})
+    
+    def clear_channel_rules(self, guild_id):
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('DELETE FROM channel_rules WHERE guild_id = ?', (guild_id,))
         conn.commit()
-        conn.close()
+        self._index_channel_rules({g: rules for g, rules in self.channel_rules.items() if g != guild_id})
     
-    def get_server_settings(self, guild_id):
+    def load_channel_rules(self):
+        """Read every guild's channel rules into memory"""
         conn = self.get_connection()
         cursor = conn.cursor()
-        cursor.execute('SELECT * FROM server_settings WHERE guild_id = ?', (guild_id,))
-        result = cursor.fetchone()
-        conn.close()
-        return result
+        cursor.execute('SELECT guild_id, channel_id, rule FROM channel_rules')
+        rules = {}
+        for guild_id, channel_id, rule in cursor.fetchall():
+            rules.setdefault(guild_id, {})[channel_id] = rule
+        self._index_channel_rules(rules)
+        return sum(len(channels) for channels in rules.values())
+    
+    def _index_channel_rules(self, rules):
+        # Built aside and swapped in whole: the event loop reads these without a lock
+        ignored = set()
+        only = {}
+        for guild_id, channels in rules.items():
+            for channel_id, rule in channels.items():
+                if rule == 'ignore':
+                    ignored.add(channel_id)
+                else:
+                    only.setdefault(guild_id, set()).add(channel_id)
+        self.ignored_channels = ignored
+        self.only_channels = only
+        self.channel_rules = {guild_id: channels for guild_id, channels in rules.items() if channels}
     
-    def get_leaderboard(self, limit=10):
+    def add_guild_member(self, guild_id, user_id):
+        """Record that a user belongs to a guild (for per-guild rankings)"""
         conn = self.get_connection()
         cursor = conn.cursor()
-        cursor.execute('''
-            SELECT user_id, username, balance 
-            FROM users 
-            ORDER BY balance DESC 
-            LIMIT ?
-        ''', (limit,))
-        results = cursor.fetchall()
-        conn.close()
-        return results
+        cursor.execute('INSERT OR IGNORE INTO guild_members (guild_id, user_id) VALUES (?, ?)', (guild_id, user_id))
+        conn.commit()
+        
+        cursor.execute('SELECT user_id, username, balance, level, xp FROM users WHERE user_id = ?', (user_id,))
+        row = cursor.fetchone()
+        # Users without a row yet are ranked once they first show up
+        if row:
+            self.rankings.add_member(guild_id, row)
+    
+    def sync_guild_members(self, guild_id, member_ids):
+        """Bulk-record a guild's current members that already have a user row"""
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.executemany('''
+            INSERT OR IGNORE INTO guild_members (guild_id, user_id)
+            SELECT ?, user_id FROM users WHERE user_id = ?
+        ''', [(guild_id, user_id) for user_id in member_ids])
+        conn.commit()
+        
+        # Boards in memory only need the members they don't have yet
+        if self.rankings.is_loaded(guild_id) or self.rankings.is_loading(guild_id):
+            missing = [user_id for user_id in member_ids if not self.rankings.is_member(guild_id, user_id)]
+            for start in range(0, len(missing), 500):
+                chunk = missing[start:start + 500]
+                cursor.execute(f'SELECT user_id, username, balance, level, xp FROM users WHERE user_id IN ({", ".join("?" * len(chunk))})', chunk)
+                for row in cursor.fetchall():
+                    self.rankings.add_member(guild_id, row)
+    
+    def remove_guild_member(self, guild_id, user_id):
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('DELETE FROM guild_members WHERE guild_id = ? AND user_id = ?', (guild_id, user_id))
+        conn.commit()
+        self.rankings.remove_member(guild_id, user_id)
+    
+    def get_leaderboard(self, guild_id=None, limit=10, offset=0, sort_by='balance'):
+        """Top users as (user_id, username, balance, level, xp)
+        
+        guild_id None ranks every user; sort_by is 'balance' or 'level'.
+        """
+        if not self.rankings.is_loaded(guild_id):
+            self._load_rankings(guild_id)
+        return self.rankings.page(guild_id, limit, offset, sort_by)
+    
+    def get_rank(self, guild_id, user_id, sort_by='balance'):
+        """Return (rank, total_users); rank is None if the user isn't ranked"""
+        if not self.rankings.is_loaded(guild_id):
+            self._load_rankings(guild_id)
+        return self.rankings.rank(guild_id, user_id, sort_by)
+    
+    def _load_rankings(self, guild_id):
+        while not self.load_rankings_step(guild_id):
+            pass
+    
+    def load_rankings_step(self, guild_id):
+        """Do one slice of loading a guild's leaderboard; True once it is loaded
+        
+        Each call reads or merges about RANKINGS_CHUNK rows, so a big guild
+        never holds the database thread for long (AsyncDatabase.load_rankings()
+        runs the steps as separate calls). Writes that land between steps are
+        carried over to the finished boards.
+        """
+        return self.rankings.load_step(guild_id, lambda after, limit: self._ranking_rows(guild_id, after, limit), self.RANKINGS_CHUNK)
+    
+    def _ranking_rows(self, guild_id, after, limit):
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        if guild_id is None:
+            cursor.execute('SELECT user_id, username, balance, level, xp FROM users WHERE user_id > ? ORDER BY user_id LIMIT ?', (after, limit))
+        else:
+            cursor.execute('''
+                SELECT u.user_id, u.username, u.balance, u.level, u.xp
+                FROM guild_members m
+                JOIN users u ON u.user_id = m.user_id
+                WHERE m.guild_id = ? AND m.user_id > ?
+                ORDER BY m.user_id
+                LIMIT ?
+            ''', (guild_id, after, limit))
+        return cursor.fetchall()
+    
+    def rollover_daily_quests(self, day, active_since, pick_quests):
+        """Give new daily quests for `day` to every user last assigned on or after active_since
+        
+        Progress and quest sets are cleared with set-based DELETEs and the new
+        assignments written with one executemany. Returns {user_id: quest_ids}.
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        window = (day, active_since)
+        
+        cursor.execute('SELECT user_id FROM daily_assignments WHERE day < ? AND day >= ?', window)
+        assigned = {row[0]: pick_quests() for row in cursor.fetchall()}
+        if not assigned:
+            return assigned
+        
+        try:
+            cursor.execute('''
+                DELETE FROM quest_progress WHERE user_id IN (
+                    SELECT user_id FROM daily_assignments WHERE day < ? AND day >= ?
+                )
+            ''', window)
+            cursor.execute('''
+                DELETE FROM quest_sets WHERE user_id IN (
+                    SELECT user_id FROM daily_assignments WHERE day < ? AND day >= ?
+                )
+            ''', window)
+            cursor.execute('DELETE FROM daily_assignments WHERE day < ? AND day >= ?', window)
+            cursor.executemany('INSERT INTO daily_assignments (user_id, day, quests) VALUES (?, ?, ?)',
+                              [(user_id, day, pack_quest_ids(quest_ids)) for user_id, quest_ids in assigned.items()])
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        
+        self._forget_profiles(assigned)
+        return assigned
     
     def get_level_xp(self, user_id):
         """Get user's level and XP"""
@@ -233,7 +777,6 @@ class Database:
         cursor = conn.cursor()
         cursor.execute('SELECT level, xp FROM users WHERE user_id = ?', (user_id,))
         result = cursor.fetchone()
-        conn.close()
         return result if result else (1, 0)
     
     def add_xp(self, user_id, xp_amount):
@@ -247,33 +790,200 @@ class Database:
         if not result:
             return None
         
-        current_level, current_xp = result
-        new_xp = current_xp + xp_amount
+        xp_result = self.calculate_level_up(result[0], result[1], xp_amount)
         
-        # Calculate XP needed for next level: level * 100
-        leveled_up = False
-        coins_earned = 0
-        
-        while new_xp >= current_level * 100:
-            new_xp -= current_level * 100
-            current_level += 1
-            leveled_up = True
-            coins_earned += current_level * 1000  # Level up reward
-        
-        cursor.execute('UPDATE users SET level = ?, xp = ? WHERE user_id = ?', 
-                      (current_level, new_xp, user_id))
+        cursor.execute('UPDATE users SET level = ?, xp = ? WHERE user_id = ?',
+                      (xp_result['new_level'], xp_result['new_xp'], user_id))
         
+        coins_earned = xp_result['coins_earned']
+        balance = None
         if coins_earned > 0:
-            cursor.execute('UPDATE users SET balance = balance + ?, total_earned = total_earned + ? WHERE user_id = ?', 
+            cursor.execute('UPDATE users SET balance = balance + ?, total_earned = total_earned + ? WHERE user_id = ? RETURNING balance',
                           (coins_earned, coins_earned, user_id))
+            balance = cursor.fetchone()[0]
         
         conn.commit()
-        conn.close()
         
+        self.rankings.update(user_id, balance=balance, level=xp_result['new_level'], xp=xp_result['new_xp'])
+        self._forget_profiles((user_id,))
+        
+        return xp_result
+    
+    @staticmethod
+    def calculate_level_up(current_level, current_xp, xp_amount):
+        """Work out the new level, leftover XP and coin reward after gaining XP"""
+        return level_up(current_level, current_xp, xp_amount)
+    
+    def get_message_state(self, user_id, username):
+        """Load level, XP, daily quests and all quest progress with one query
+        
+        Creates the user like get_user() does if they don't exist yet. Quest
+        sets (members behind the mention/channel quests) come from a second,
+        index-only lookup and are returned as {kind: [member_id, ...]}.
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        cursor.execute('''
+            SELECT u.level, u.xp, a.quests, a.day, p.quest_id, p.progress, p.completed
+            FROM users u
+            LEFT JOIN daily_assignments a ON a.user_id = u.user_id
+            LEFT JOIN quest_progress p ON p.user_id = u.user_id
+            WHERE u.user_id = ?
+        ''', (user_id,))
+        rows = cursor.fetchall()
+        
+        if not rows:
+            cursor.execute('INSERT INTO users (user_id, username, balance) VALUES (?, ?, 0)', (user_id, username))
+            conn.commit()
+            self.rankings.add_member(None, (user_id, username, 0, 1, 0))
+            return {'level': 1, 'xp': 0, 'quests': [], 'day': 0, 'progress': {}, 'sets': {}}
+        
+        sets = {}
+        cursor.execute('SELECT kind, member_id FROM quest_sets WHERE user_id = ?', (user_id,))
+        for kind, member_id in cursor.fetchall():
+            sets.setdefault(kind, []).append(member_id)
+        
+        level, xp, quests, day = rows[0][:4]
         return {
-            'leveled_up': leveled_up,
-            'new_level': current_level,
-            'new_xp': new_xp,
-            'xp_needed': current_level * 100,
-            'coins_earned': coins_earned
+            'level': level,
+            'xp': xp,
+            'quests': unpack_quest_ids(quests) if quests else [],
+            'day': day or 0,
+            'progress': {row[4]: (row[5], row[6]) for row in rows if row[4] is not None},
+            'sets': sets
         }
+    
+    def get_profile(self, user_id, username):
+        """Balance, lifetime totals, level/XP and completed quests in one query
+        
+        Creates the user like get_user() does. 'completed' counts completed
+        quests among those assigned on quest day 'day'. Results are cached
+        for PROFILE_TTL seconds and every write to these fields drops the
+        user's entry.
+        """
+        cached = self.profiles.get(user_id)
+        if cached and cached[0] > time.monotonic():
+            return cached[1]
+        
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        # Only quests packed into the assignment count, so never the secret quest
+        # or quests left over from earlier days
+        cursor.execute('''
+            SELECT u.balance, u.total_earned, u.total_spent, u.level, u.xp, COALESCE(a.day, 0), (
+                SELECT COUNT(*) FROM quest_progress p
+                WHERE p.user_id = u.user_id AND p.completed = 1 AND p.quest_id IN (
+                    a.quests & 255, (a.quests >> 8) & 255, (a.quests >> 16) & 255, (a.quests >> 24) & 255,
+                    (a.quests >> 32) & 255, (a.quests >> 40) & 255, (a.quests >> 48) & 255
+                )
+            )
+            FROM users u
+            LEFT JOIN daily_assignments a ON a.user_id = u.user_id
+            WHERE u.user_id = ?
+        ''', (user_id,))
+        row = cursor.fetchone()
+        if row is None:
+            self.get_user(user_id, username)
+            row = (0, 0, 0, 1, 0, 0, 0)
+        
+        profile = dict(zip(('balance', 'total_earned', 'total_spent', 'level', 'xp', 'day', 'completed'), row))
+        if len(self.profiles) >= self.PROFILE_CACHE_SIZE:
+            # Oldest entry first; they're all short-lived anyway
+            del self.profiles[next(iter(self.profiles))]
+        self.profiles[user_id] = (time.monotonic() + self.PROFILE_TTL, profile)
+        return profile
+    
+    def _forget_profiles(self, user_ids):
+        for user_id in user_ids:
+            self.profiles.pop(user_id, None)
+    
+    def save_progress(self, levels=(), quest_rows=(), rewards=(), assignments=(), set_rows=()):
+        """Write batched XP, quest and reward changes in one transaction
+        
+        - levels: (level, xp, user_id)
+        - quest_rows: (user_id, quest_id, progress, completed)
+        - set_rows: (user_id, kind, member_id) new members of a quest set
+        - rewards: (user_id, amount) credited to balance and total_earned
+        - assignments: (user_id, quest_ids, day, reset_progress) new daily quests
+        """
+        conn = self.get_connection()
+        cursor = conn.cursor()
+        
+        try:
+            for user_id, quest_ids, day, reset_progress in assignments:
+                if reset_progress:
+                    cursor.execute('DELETE FROM quest_progress WHERE user_id = ?', (user_id,))
+                    cursor.execute('DELETE FROM quest_sets WHERE user_id = ?', (user_id,))
+                cursor.execute('DELETE FROM daily_assignments WHERE user_id = ?', (user_id,))
+                cursor.execute('INSERT INTO daily_assignments (user_id, day, quests) VALUES (?, ?, ?)',
+                              (user_id, day, pack_quest_ids(quest_ids)))
+            
+            if quest_rows:
+                cursor.executemany('''
+                    INSERT OR REPLACE INTO quest_progress (user_id, quest_id, progress, completed)
+                    VALUES (?, ?, ?, ?)
+                ''', quest_rows)
+            
+            if set_rows:
+                cursor.executemany('INSERT OR IGNORE INTO quest_sets (user_id, kind, member_id) VALUES (?, ?, ?)', set_rows)
+            
+            if levels:
+                cursor.executemany('UPDATE users SET level = ?, xp = ? WHERE user_id = ?', levels)
+            
+            balances = []
+            for user_id, amount in rewards:
+                cursor.execute('''
+                    UPDATE users
+                    SET balance = balance + ?, total_earned = total_earned + ?
+                    WHERE user_id = ?
+                    RETURNING balance
+                ''', (amount, amount, user_id))
+                result = cursor.fetchone()
+                if result:
+                    balances.append((user_id, result[0], amount))
+            
+            conn.commit()
+        except Exception:
+            conn.rollback()
+            raise
+        
+        self._forget_profiles({row[0] for row in quest_rows} | {row[0] for row in assignments} | {row[0] for row in rewards} | {row[2] for row in levels})
+        for level, xp, user_id in levels:
+            self.rankings.update(user_id, level=level, xp=xp)
+        for user_id, balance, amount in balances:
+            self.rankings.update(user_id, balance=balance)
+            self.record_transaction(user_id, 'reward', amount)
+
+class AsyncDatabase:
+    """Awaitable facade over Database that keeps sqlite off the event loop
+    
+    Every call is queued onto one dedicated worker thread, so writes are
+    serialized and a slow fsync only delays other database work, never the
+    gateway heartbeat or other guilds' events.
+    """
+    
+    def __init__(self, database):
+        self.database = database
+        self._executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='db-writer')
+    
+    def __getattr__(self, name):
+        attr = getattr(self.database, name)
+        if not callable(attr):
+            return attr
+        
+        async def call(*args, **kwargs):
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, functools.partial(attr, *args, **kwargs))
+        
+        call.__name__ = name
+        return call
+    
+    async def load_rankings(self, guild_id):
+        """Load a guild's leaderboard one step per call, letting other queued work run in between"""
+        while not await self.load_rankings_step(guild_id):
+            pass
+    
+    def close(self):
+        """Finish queued database work, then close the connections"""
+        self._executor.shutdown(wait=True)
+        self.database.close()
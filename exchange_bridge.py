@@ -0,0 +1,107 @@
+import hmac
+import time
+
+from aiohttp import web
+
+
+class ExchangeBridge:
+    """Local HTTP endpoint the Minecraft side pulls coin exchanges from
+
+        GET  /exchanges?limit=N   lease up to N pending exchanges (oldest first)
+        POST /exchanges/ack       {"keys": [...]} mark them delivered
+
+    Delivery is at-least-once: an exchange that isn't acknowledged within
+    `lease_seconds` is handed out again, so the consumer must skip
+    idempotency keys it has already applied. When `token` is set, requests
+    need an `Authorization: Bearer <token>` header.
+    """
+
+    def __init__(self, db, host='127.0.0.1', port=8765, token=None, lease_seconds=60, max_batch=500, keep_delivered_days=7):
+        self.db = db
+        self.host = host
+        self.port = port
+        self.token = token
+        self.lease_seconds = lease_seconds
+        self.max_batch = max_batch
+        self.keep_delivered_days = keep_delivered_days
+        self.leased = 0
+        self.acked = 0
+        self._last_prune = 0.0
+        self._runner = None
+
+    async def start(self):
+        if self._runner:
+            return self
+        app = web.Application()
+        app.add_routes([
+            web.get('/exchanges', self._lease),
+            web.post('/exchanges/ack', self._ack)
+        ])
+        runner = web.AppRunner(app, access_log=None)
+        await runner.setup()
+        site = web.TCPSite(runner, self.host, self.port)
+        try:
+            await site.start()
+        except Exception:
+            await runner.cleanup()
+            raise
+        self._runner = runner
+        self.port = runner.addresses[0][1]
+        return self
+
+    async def close(self):
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+
+    def _authorized(self, request):
+        if not self.token:
+            return True
+        return hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {self.token}')
+
+    async def _lease(self, request):
+        if not self._authorized(request):
+            raise web.HTTPUnauthorized()
+        try:
+            limit = min(int(request.query.get('limit', self.max_batch)), self.max_batch)
+        except ValueError:
+            raise web.HTTPBadRequest(text='limit must be a number')
+
+        rows = await self.db.lease_exchanges(max(limit, 1), self.lease_seconds)
+        self.leased += len(rows)
+        return web.json_response({
+            'lease_seconds': self.lease_seconds,
+            'exchanges': [
+                {
+                    'key': key,
+                    'user_id': user_id,
+                    'username': username,
+                    'guild_id': guild_id,
+                    'amount': amount,
+                    'mc_amount': mc_amount,
+                    'created_at': created_at,
+                    'attempt': attempts
+                }
+                for _, key, user_id, username, guild_id, amount, mc_amount, created_at, attempts in rows
+            ]
+        })
+
+    async def _ack(self, request):
+        if not self._authorized(request):
+            raise web.HTTPUnauthorized()
+        try:
+            keys = (await request.json())['keys']
+        except (ValueError, KeyError, TypeError):
+            raise web.HTTPBadRequest(text='expected {"keys": [...]}')
+        if not isinstance(keys, list) or not all(isinstance(key, str) for key in keys):
+            raise web.HTTPBadRequest(text='keys must be a list of strings')
+
+        acked = await self.db.ack_exchanges(keys) if keys else 0
+        self.acked += acked
+
+        # Delivered rows are only kept a while; the ledger has the history
+        if time.monotonic() - self._last_prune >= 3600:
+            self._last_prune = time.monotonic()
+            await self.db.prune_exchange_outbox(int(time.time()) - self.keep_delivered_days * 86400)
+
+        return web.json_response({'acked': acked})
@@ -0,0 +1,82 @@
+"""Stand-in for the Minecraft-side consumer of the exchange bridge
+
+Pulls pending exchanges, "pays" them by printing, and acknowledges them:
+
+    python fake_mc_bridge.py --url http://127.0.0.1:8765 --token secret --drop-acks 0.2
+
+`--drop-acks` skips that share of acknowledgments to exercise redelivery.
+"""
+import argparse
+import asyncio
+import random
+
+import aiohttp
+
+
+class FakeBridgeConsumer:
+    """Applies each exchange once, however many times it is delivered
+
+    `applied` maps idempotency keys to the exchanges paid out; redelivered
+    keys only count towards `duplicates`. Skipped keys are acknowledged
+    with the rest of their batch.
+    """
+
+    def __init__(self, url, token=None, batch=500, drop_acks=0.0, verbose=False):
+        self.url = url.rstrip('/')
+        self.headers = {'Authorization': f'Bearer {token}'} if token else {}
+        self.batch = batch
+        self.drop_acks = drop_acks
+        self.verbose = verbose
+        self.applied = {}
+        self.duplicates = 0
+        self.requests = 0
+
+    async def poll_once(self, session):
+        """Pull one batch, apply it and acknowledge it; returns how many were pulled"""
+        async with session.get(f'{self.url}/exchanges', params={'limit': self.batch}, headers=self.headers) as response:
+            response.raise_for_status()
+            exchanges = (await response.json())['exchanges']
+        self.requests += 1
+
+        for exchange in exchanges:
+            if exchange['key'] in self.applied:
+                self.duplicates += 1
+                continue
+            self.applied[exchange['key']] = exchange
+            if self.verbose:
+                print(f"💱 Paid {exchange['mc_amount']} in-game coin(s) to {exchange['username']} ({exchange['key']})")
+
+        if exchanges and random.random() >= self.drop_acks:
+            keys = [exchange['key'] for exchange in exchanges]
+            async with session.post(f'{self.url}/exchanges/ack', json={'keys': keys}, headers=self.headers) as response:
+                response.raise_for_status()
+            self.requests += 1
+        return len(exchanges)
+
+    async def run(self, interval=1.0):
+        async with aiohttp.ClientSession() as session:
+            while True:
+                try:
+                    if await self.poll_once(session):
+                        continue  # There may be more waiting
+                except aiohttp.ClientError as e:
+                    print(f'❌ Bridge request failed: {e}')
+                await asyncio.sleep(interval)
+
+
+async def main():
+    parser = argparse.ArgumentParser(description='Fake Minecraft-side exchange consumer')
+    parser.add_argument('--url', default='http://127.0.0.1:8765')
+    parser.add_argument('--token')
+    parser.add_argument('--batch', type=int, default=500)
+    parser.add_argument('--interval', type=float, default=1.0)
+    parser.add_argument('--drop-acks', type=float, default=0.0)
+    args = parser.parse_args()
+
+    consumer = FakeBridgeConsumer(args.url, args.token, args.batch, args.drop_acks, verbose=True)
+    print(f'🧪 Pulling exchanges from {consumer.url}')
+    await consumer.run(args.interval)
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
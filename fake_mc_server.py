@@ -0,0 +1,122 @@
+"""Minimal fake Minecraft server that answers Server List Ping status requests
+
+Used to exercise the status monitor without a real server:
+
+    python fake_mc_server.py --port 25599 --players 3 --delay 0.5
+"""
+import argparse
+import asyncio
+import json
+
+
+def _pack_varint(value):
+    out = bytearray()
+    while True:
+        byte = value & 0x7F
+        value >>= 7
+        if value:
+            out.append(byte | 0x80)
+        else:
+            out.append(byte)
+            return bytes(out)
+
+
+async def _read_varint(reader):
+    value = 0
+    for shift in range(0, 35, 7):
+        byte = (await reader.readexactly(1))[0]
+        value |= (byte & 0x7F) << shift
+        if not byte & 0x80:
+            return value
+    raise ValueError('VarInt too long')
+
+
+def _packet(packet_id, payload):
+    body = _pack_varint(packet_id) + payload
+    return _pack_varint(len(body)) + body
+
+
+class FakeStatusServer:
+    """Answers status and ping requests with a fixed, adjustable status
+
+    `delay` holds every response back that many seconds (a slow server) and
+    `silent` accepts connections but never replies (a hung one).
+    """
+
+    def __init__(self, host='127.0.0.1', port=0, players=0, max_players=20, version='1.20.4', motd='Fake server', delay=0.0):
+        self.host = host
+        self.port = port
+        self.players = players
+        self.max_players = max_players
+        self.version = version
+        self.motd = motd
+        self.delay = delay
+        self.silent = False
+        self.requests = 0
+        self._server = None
+
+    def status_json(self):
+        return {
+            'version': {'name': self.version, 'protocol': 765},
+            'players': {
+                'max': self.max_players,
+                'online': self.players,
+                'sample': [{'name': f'player{i}', 'id': f'00000000-0000-0000-0000-{i:012d}'} for i in range(min(self.players, 12))]
+            },
+            'description': {'text': self.motd}
+        }
+
+    async def start(self):
+        self._server = await asyncio.start_server(self._handle, self.host, self.port)
+        self.port = self._server.sockets[0].getsockname()[1]
+        return self
+
+    async def close(self):
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+            self._server = None
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                length = await _read_varint(reader)
+                data = await reader.readexactly(length)
+                packet_id = data[0]
+                if packet_id != 0x00 and packet_id != 0x01:
+                    break
+                if packet_id == 0x00 and len(data) > 1:
+                    continue  # Handshake; the status request follows
+                self.requests += 1
+                if self.silent:
+                    await asyncio.sleep(3600)
+                if self.delay:
+                    await asyncio.sleep(self.delay)
+                if packet_id == 0x00:
+                    payload = json.dumps(self.status_json()).encode('utf-8')
+                    writer.write(_packet(0x00, _pack_varint(len(payload)) + payload))
+                else:
+                    writer.write(_packet(0x01, data[1:]))  # Pong echoes the ping payload
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError, ValueError):
+            pass
+        finally:
+            writer.close()
+
+
+async def main():
+    parser = argparse.ArgumentParser(description='Fake Minecraft status responder')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=25599)
+    parser.add_argument('--players', type=int, default=0)
+    parser.add_argument('--max-players', type=int, default=20)
+    parser.add_argument('--delay', type=float, default=0.0)
+    args = parser.parse_args()
+
+    server = await FakeStatusServer(args.host, args.port, args.players, args.max_players, delay=args.delay).start()
+    print(f'🧪 Fake Minecraft server listening on {server.host}:{server.port}')
+    await asyncio.Event().wait()
+
+
+if __name__ == '__main__':
+    asyncio.run(main())
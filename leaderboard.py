@@ -0,0 +1,296 @@
+import heapq
+import threading
+from bisect import bisect_left, insort
+from itertools import islice
+
+# sort name -> sort key for a user, from their (balance, level, xp)
+SORT_KEYS = {
+    'balance': lambda user_id, stats: (-stats[0], user_id),
+    'level': lambda user_id, stats: (-stats[1], -stats[2], user_id),
+}
+
+
+def _merge_stats(stats, balance, level, xp):
+    return (stats[0] if balance is None else balance,
+            stats[1] if level is None else level,
+            stats[2] if xp is None else xp)
+
+
+class Leaderboard:
+    """One ranking (e.g. a guild's members by balance), kept sorted in memory
+
+    User ids are held in sorted blocks of about BLOCK ids, with the last
+    sort key of each block alongside. A score change finds its block by
+    binary search and moves entries within that block only, so it costs
+    O(log n + BLOCK) instead of shifting one list of every user. A page
+    walks the blocks, and a rank adds up the sizes of the blocks before
+    the user's.
+    """
+
+    BLOCK = 1000
+
+    def __init__(self, keys, order=None):
+        self._keys = keys
+        order = sorted(keys, key=keys.__getitem__) if order is None else order
+        self._blocks = [order[start:start + self.BLOCK] for start in range(0, len(order), self.BLOCK)]
+        self._maxes = [keys[block[-1]] for block in self._blocks]
+        self._len = len(order)
+
+    def update(self, user_id, key):
+        old = self._keys.get(user_id)
+        if old == key:
+            return
+        if old is not None:
+            self._delete(old)
+        self._keys[user_id] = key
+        self._insert(user_id, key)
+
+    def remove(self, user_id):
+        key = self._keys.get(user_id)
+        if key is not None:
+            self._delete(key)
+            del self._keys[user_id]
+
+    def _insert(self, user_id, key):
+        self._len += 1
+        if not self._blocks:
+            self._blocks.append([user_id])
+            self._maxes.append(key)
+            return
+        index = min(bisect_left(self._maxes, key), len(self._blocks) - 1)
+        block = self._blocks[index]
+        insort(block, user_id, key=self._keys.__getitem__)
+        self._maxes[index] = self._keys[block[-1]]
+        if len(block) > 2 * self.BLOCK:
+            self._blocks[index:index + 1] = [block[:self.BLOCK], block[self.BLOCK:]]
+            self._maxes.insert(index, self._keys[block[self.BLOCK - 1]])
+
+    def _delete(self, key):
+        # Call while the user's key is still in self._keys
+        self._len -= 1
+        index = bisect_left(self._maxes, key)
+        block = self._blocks[index]
+        del block[bisect_left(block, key, key=self._keys.__getitem__)]
+        if len(block) >= self.BLOCK // 4 or len(self._blocks) == 1:
+            if block:
+                self._maxes[index] = self._keys[block[-1]]
+            else:
+                del self._blocks[index], self._maxes[index]
+            return
+        # Fold a small block into its neighbour so the block count stays near n / BLOCK
+        if index == 0:
+            index = 1
+        merged = self._blocks[index - 1] + self._blocks[index]
+        self._blocks[index - 1:index + 1] = [merged]
+        self._maxes[index - 1:index + 1] = [self._keys[merged[-1]]]
+        if len(merged) > 2 * self.BLOCK:
+            self._blocks[index - 1:index] = [merged[:self.BLOCK], merged[self.BLOCK:]]
+            self._maxes.insert(index - 1, self._keys[merged[self.BLOCK - 1]])
+
+    def page(self, limit, offset=0):
+        ids = []
+        for block in self._blocks:
+            if len(ids) >= limit:
+                break
+            if offset >= len(block):
+                offset -= len(block)
+                continue
+            ids.extend(block[offset:offset + limit - len(ids)])
+            offset = 0
+        return ids
+
+    def rank(self, user_id):
+        """1-based rank of a user, or None if they aren't ranked"""
+        key = self._keys.get(user_id)
+        if key is None:
+            return None
+        index = bisect_left(self._maxes, key)
+        before = sum(len(block) for block in self._blocks[:index])
+        return before + bisect_left(self._blocks[index], key, key=self._keys.__getitem__) + 1
+
+    def __contains__(self, user_id):
+        return user_id in self._keys
+
+    def __len__(self):
+        return self._len
+
+
+class _BoardLoad:
+    """A guild's boards part way through Rankings.load_step()
+
+    Rows are read in user id order; each chunk is sorted into a run per
+    sort, and the runs are merged once every row is in. Sort keys are
+    fixed when a row is read, so users whose figures change afterwards,
+    or who join or leave meanwhile, are noted and sorted in once the
+    boards exist.
+    """
+
+    def __init__(self):
+        # Below any user id
+        self.after = -2**63
+        self.keys = {sort_by: {} for sort_by in SORT_KEYS}
+        self.runs = {sort_by: [] for sort_by in SORT_KEYS}
+        # sort_by -> (merge iterator, merged order), once every row is read
+        self.merging = None
+        self.changed = set()
+        self.removed = set()
+
+    def __contains__(self, user_id):
+        return (user_id in self.keys['balance'] or user_id in self.changed) and user_id not in self.removed
+
+
+class Rankings:
+    """Global and per-guild leaderboards for every sort, loaded on first use
+
+    Guild id None is the global ranking of every user. Figures and names
+    are held once per user and shared by every board. update() looks the
+    user up on each loaded guild's boards, which is cheap for the few dozen
+    guilds a bot is in and saves keeping a membership set per user. Big
+    guilds are loaded a slice at a time with load_step().
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._boards = {}
+        # Guild ids whose boards are loaded
+        self._guilds = set()
+        self._stats = {}
+        self._names = {}
+        # guild_id -> _BoardLoad for boards still being loaded
+        self._loads = {}
+
+    def is_loaded(self, guild_id):
+        return guild_id in self._guilds
+
+    def is_loading(self, guild_id):
+        return guild_id in self._loads
+
+    def is_member(self, guild_id, user_id):
+        """Whether a user is on a loaded or loading guild's boards"""
+        with self._lock:
+            load = self._loads.get(guild_id)
+            if load is not None:
+                return user_id in load
+            return guild_id in self._guilds and user_id in self._boards[(guild_id, 'balance')]
+
+    def load_step(self, guild_id, fetch, chunk):
+        """Do about `chunk` rows' worth of loading a guild's boards; True once they're loaded
+
+        fetch(after, limit) returns up to `limit` (user_id, username, balance,
+        level, xp) rows with user ids above `after`, in user id order. It is
+        called without the lock held. Boards already loaded are left alone.
+        """
+        with self._lock:
+            if guild_id in self._guilds:
+                return True
+            load = self._loads.setdefault(guild_id, _BoardLoad())
+            reading = load.merging is None
+            after = load.after
+
+        if reading:
+            rows = fetch(after, chunk)
+            with self._lock:
+                self._stage(load, rows)
+                if len(rows) < chunk:
+                    load.merging = {sort_by: (heapq.merge(*load.runs[sort_by], key=load.keys[sort_by].__getitem__), [])
+                                    for sort_by in SORT_KEYS}
+                    load.runs = None
+            return False
+
+        with self._lock:
+            done = True
+            for sort_by, (merged, order) in load.merging.items():
+                order.extend(islice(merged, chunk))
+                done = done and len(order) == len(load.keys[sort_by])
+            if done:
+                self._finish_load(guild_id, load)
+            return done
+
+    def _stage(self, load, rows):
+        for user_id, username, balance, level, xp in rows:
+            self._stats[user_id] = (balance, level, xp)
+            self._names[user_id] = username
+        if rows:
+            load.after = rows[-1][0]
+        for sort_by, sort_key in SORT_KEYS.items():
+            keys = load.keys[sort_by]
+            for row in rows:
+                keys[row[0]] = sort_key(row[0], self._stats[row[0]])
+            load.runs[sort_by].append(sorted((row[0] for row in rows), key=keys.__getitem__))
+
+    def _finish_load(self, guild_id, load):
+        del self._loads[guild_id]
+        for sort_by, (_, order) in load.merging.items():
+            self._boards[(guild_id, sort_by)] = Leaderboard(load.keys[sort_by], order)
+        self._guilds.add(guild_id)
+        for user_id in load.changed - load.removed:
+            for sort_by, sort_key in SORT_KEYS.items():
+                self._boards[(guild_id, sort_by)].update(user_id, sort_key(user_id, self._stats[user_id]))
+        for user_id in load.removed:
+            for sort_by in SORT_KEYS:
+                self._boards[(guild_id, sort_by)].remove(user_id)
+
+    def invalidate(self):
+        with self._lock:
+            self._boards.clear()
+            self._guilds.clear()
+            self._loads.clear()
+            self._stats.clear()
+            self._names.clear()
+
+    def add_member(self, guild_id, row):
+        """Put a (user_id, username, balance, level, xp) row on a loaded or loading guild's boards"""
+        with self._lock:
+            load = self._loads.get(guild_id)
+            if load is None and guild_id not in self._guilds:
+                return
+            user_id, username, balance, level, xp = row
+            self._stats[user_id] = (balance, level, xp)
+            self._names[user_id] = username
+            if load is not None:
+                # Rows already read won't be read again, so it goes in once the boards exist
+                load.changed.add(user_id)
+                load.removed.discard(user_id)
+                return
+            for sort_by, sort_key in SORT_KEYS.items():
+                self._boards[(guild_id, sort_by)].update(user_id, sort_key(user_id, self._stats[user_id]))
+
+    def remove_member(self, guild_id, user_id):
+        with self._lock:
+            load = self._loads.get(guild_id)
+            if load is not None:
+                load.removed.add(user_id)
+            elif guild_id in self._guilds:
+                for sort_by in SORT_KEYS:
+                    self._boards[(guild_id, sort_by)].remove(user_id)
+
+    def update(self, user_id, balance=None, level=None, xp=None):
+        """Record a user's new balance and/or level and XP"""
+        with self._lock:
+            stats = self._stats.get(user_id)
+            if stats is None:
+                return
+            stats = _merge_stats(stats, balance, level, xp)
+            self._stats[user_id] = stats
+            for load in self._loads.values():
+                if user_id in load.keys['balance']:
+                    load.changed.add(user_id)
+            sorts = [sort_by for sort_by, changed in (('balance', balance is not None), ('level', level is not None)) if changed]
+            for guild_id in self._guilds:
+                for sort_by in sorts:
+                    board = self._boards[(guild_id, sort_by)]
+                    if user_id in board:
+                        board.update(user_id, SORT_KEYS[sort_by](user_id, stats))
+
+    def page(self, guild_id, limit, offset=0, sort_by='balance'):
+        """(user_id, username, balance, level, xp) rows for one page of a board"""
+        with self._lock:
+            board = self._boards[(guild_id, sort_by)]
+            return [(user_id, self._names.get(user_id), *self._stats[user_id])
+                    for user_id in board.page(limit, offset)]
+
+    def rank(self, guild_id, user_id, sort_by='balance'):
+        """Return (rank, total); rank is None if the user isn't on the board"""
+        with self._lock:
+            board = self._boards[(guild_id, sort_by)]
+            return board.rank(user_id), len(board)
@@ -0,0 +1,60 @@
+import asyncio
+import time
+
+
+class LedgerMaintenance:
+    """Background upkeep for the transactions ledger
+
+    Economy operations only queue ledger rows in memory. This writes them
+    every `flush_interval` seconds (Database also writes a batch on its own
+    once LEDGER_BATCH_SIZE rows are queued), and once every
+    `archive_interval` seconds moves rows older than `keep_days` into
+    `archive_path`, one chunk per database call so other queries keep
+    getting through. The daily rollups are never archived.
+    """
+
+    def __init__(self, db, archive_path='ledger_archive.db', keep_days=90, flush_interval=5.0, archive_interval=3600.0, archive_chunk=2000):
+        self.db = db
+        self.archive_path = archive_path
+        self.keep_days = keep_days
+        self.flush_interval = flush_interval
+        self.archive_interval = archive_interval
+        self.archive_chunk = archive_chunk
+        self.last_archive = None
+        self._task = None
+
+    async def archive(self):
+        """Move every row older than keep_days to the archive; returns how many moved"""
+        before_ts = int(time.time()) - self.keep_days * 86400
+        started = time.perf_counter()
+        moved = 0
+        while True:
+            chunk = await self.db.archive_transactions(before_ts, self.archive_path, self.archive_chunk)
+            moved += chunk
+            if chunk < self.archive_chunk:
+                break
+        self.last_archive = {'rows': moved, 'seconds': time.perf_counter() - started, 'at': time.time()}
+        return moved
+
+    def start(self):
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        next_archive = time.monotonic()
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            try:
+                await self.db.flush_transactions()
+                if time.monotonic() >= next_archive:
+                    next_archive = time.monotonic() + self.archive_interval
+                    moved = await self.archive()
+                    if moved:
+                        print(f'🗄️ Archived {moved} ledger rows in {self.last_archive["seconds"]:.2f}s')
+            except Exception as e:
+                print(f'❌ Ledger maintenance failed: {e}')
@@ -0,0 +1,64 @@
+from math import isqrt
+
+XP_PER_LEVEL = 100  # Level L needs L * XP_PER_LEVEL XP to reach L + 1
+COINS_PER_LEVEL = 1000  # Reaching level L pays L * COINS_PER_LEVEL coins
+BAR_WIDTH = 10
+
+# One string per filled segment count, so drawing a bar is a lookup
+_BARS = tuple('▰' * filled + '▱' * (BAR_WIDTH - filled) for filled in range(BAR_WIDTH + 1))
+
+
+def xp_needed(level):
+    """XP needed to go from `level` to the next one"""
+    return level * XP_PER_LEVEL
+
+
+def level_floor(level):
+    """Total XP earned from level 1 by the time `level` is reached"""
+    return XP_PER_LEVEL * level * (level - 1) // 2
+
+
+def level_for_total(total_xp):
+    """The level a user with `total_xp` XP since level 1 is at
+
+    Inverts level_floor(): the largest L with 50 * L * (L - 1) <= total_xp,
+    which is the positive root of the triangular-number quadratic.
+    """
+    return (1 + isqrt(1 + 4 * (total_xp // (XP_PER_LEVEL // 2)))) // 2
+
+
+def level_up(current_level, current_xp, xp_amount):
+    """Work out the new level, leftover XP and coin reward after gaining XP
+
+    Same result as levelling up one level at a time, in constant time
+    however large the grant is.
+    """
+    new_xp = current_xp + xp_amount
+    if new_xp < xp_needed(current_level):
+        return {
+            'leveled_up': False,
+            'new_level': current_level,
+            'new_xp': new_xp,
+            'xp_needed': xp_needed(current_level),
+            'coins_earned': 0
+        }
+
+    total = level_floor(current_level) + new_xp
+    new_level = level_for_total(total)
+    # Sum of new_level * COINS_PER_LEVEL over every level gained
+    coins_earned = COINS_PER_LEVEL * (new_level * (new_level + 1) - current_level * (current_level + 1)) // 2
+    return {
+        'leveled_up': True,
+        'new_level': new_level,
+        'new_xp': total - level_floor(new_level),
+        'xp_needed': xp_needed(new_level),
+        'coins_earned': coins_earned
+    }
+
+
+def progress_bar(level, xp):
+    """A BAR_WIDTH-segment bar for progress through the current level"""
+    needed = xp_needed(level)
+    if needed <= 0:
+        return _BARS[0]
+    return _BARS[min(max(xp, 0) * BAR_WIDTH // needed, BAR_WIDTH)]
@@ -0,0 +1,80 @@
+import asyncio
+from collections import Counter, deque
+
+
+class LoopLagMonitor:
+    """Measures event loop lag: how late a fixed sleep wakes up
+
+    Anything that blocks the loop (sync I/O, heavy CPU work) shows up here
+    directly, because the sleeper can't be resumed until the loop is free.
+    """
+
+    def __init__(self, interval=0.25, window=240):
+        self.interval = interval
+        self.samples = deque(maxlen=window)
+        self.max_lag = 0.0
+        self._task = None
+
+    def start(self):
+        """Start sampling on the running loop (safe to call more than once)"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            started = loop.time()
+            await asyncio.sleep(self.interval)
+            lag = max(0.0, loop.time() - started - self.interval)
+            self.samples.append(lag)
+            self.max_lag = max(self.max_lag, lag)
+
+    def stats(self):
+        """Lag over the recent window in milliseconds"""
+        if not self.samples:
+            return {'current': 0.0, 'avg': 0.0, 'p99': 0.0, 'max': self.max_lag * 1000}
+
+        ordered = sorted(self.samples)
+        p99 = ordered[min(len(ordered) - 1, int(len(ordered) * 0.99))]
+        return {
+            'current': self.samples[-1] * 1000,
+            'avg': sum(ordered) / len(ordered) * 1000,
+            'p99': p99 * 1000,
+            'max': self.max_lag * 1000
+        }
+
+
+class EventFilterStats:
+    """Counts messages handled in full vs. dropped before any database work
+
+    Full handling is timed, so what the early exits saved is estimated as
+    the dropped count times the average cost of a handled message.
+    """
+
+    def __init__(self):
+        self.handled = 0
+        self.handled_seconds = 0.0
+        self.skipped = Counter()
+
+    def skip(self, reason):
+        self.skipped[reason] += 1
+
+    def record(self, elapsed):
+        self.handled += 1
+        self.handled_seconds += elapsed
+
+    def stats(self):
+        avg = self.handled_seconds / self.handled if self.handled else 0.0
+        skipped = sum(self.skipped.values())
+        return {
+            'handled': self.handled,
+            'skipped': skipped,
+            'by_reason': dict(self.skipped),
+            'avg_ms': avg * 1000,
+            'saved_ms': skipped * avg * 1000
+        }
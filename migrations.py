@@ -0,0 +1,226 @@
+import json
+from datetime import datetime
+
+from quests import pack_quest_ids
+
+
+def _add_missing_columns(cursor, table, columns):
+    """Add columns that databases created by older versions don't have yet"""
+    cursor.execute(f'PRAGMA table_info({table})')
+    existing = {row[1] for row in cursor.fetchall()}
+    for name, definition in columns:
+        if name not in existing:
+            cursor.execute(f'ALTER TABLE {table} ADD COLUMN {name} {definition}')
+
+
+def _base_schema(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS users (
+            user_id INTEGER PRIMARY KEY,
+            username TEXT,
+            balance INTEGER DEFAULT 0,
+            daily_quests TEXT,
+            last_quest_reset TEXT,
+            total_earned INTEGER DEFAULT 0,
+            total_spent INTEGER DEFAULT 0,
+            level INTEGER DEFAULT 1,
+            xp INTEGER DEFAULT 0
+        )
+    ''')
+    _add_missing_columns(cursor, 'users', [
+        ('level', 'INTEGER DEFAULT 1'),
+        ('xp', 'INTEGER DEFAULT 0')
+    ])
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS server_settings (
+            guild_id INTEGER PRIMARY KEY,
+            server_ip TEXT,
+            server_port INTEGER,
+            console_channel_id INTEGER,
+            welcome_channel_id INTEGER,
+            console_enabled INTEGER DEFAULT 1,
+            welcome_enabled INTEGER DEFAULT 1
+        )
+    ''')
+    _add_missing_columns(cursor, 'server_settings', [
+        ('welcome_channel_id', 'INTEGER'),
+        ('console_enabled', 'INTEGER DEFAULT 1'),
+        ('welcome_enabled', 'INTEGER DEFAULT 1')
+    ])
+
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS quest_progress (
+            user_id INTEGER,
+            quest_id INTEGER,
+            progress INTEGER DEFAULT 0,
+            completed INTEGER DEFAULT 0,
+            PRIMARY KEY (user_id, quest_id)
+        )
+    ''')
+
+
+def _balance_index(cursor):
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_users_balance ON users (balance DESC, user_id)')
+
+
+def _guild_members(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS guild_members (
+            guild_id INTEGER,
+            user_id INTEGER,
+            PRIMARY KEY (guild_id, user_id)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_guild_members_user ON guild_members (user_id, guild_id)')
+
+
+def _quest_sets(cursor):
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS quest_sets (
+            user_id INTEGER,
+            kind TEXT,
+            member_id INTEGER,
+            PRIMARY KEY (user_id, kind, member_id)
+        ) WITHOUT ROWID
+    ''')
+
+
+def _daily_assignments(cursor):
+    # One row per user: the quest day it was assigned for (date ordinal of
+    # the day's start) and up to 7 quest ids packed one byte each
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS daily_assignments (
+            user_id INTEGER,
+            day INTEGER,
+            quests INTEGER,
+            PRIMARY KEY (user_id, day)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_daily_assignments_day ON daily_assignments (day)')
+
+    # The old JSON column only kept a reset timestamp, so the day is taken from its date
+    cursor.execute("SELECT user_id, daily_quests, last_quest_reset FROM users WHERE daily_quests IS NOT NULL AND daily_quests != '[]'")
+    rows = []
+    for user_id, daily_quests, last_reset in cursor.fetchall():
+        day = datetime.fromisoformat(last_reset).toordinal() if last_reset else 0
+        rows.append((user_id, day, pack_quest_ids(json.loads(daily_quests))))
+    cursor.executemany('INSERT OR REPLACE INTO daily_assignments (user_id, day, quests) VALUES (?, ?, ?)', rows)
+    cursor.execute('UPDATE users SET daily_quests = NULL WHERE daily_quests IS NOT NULL')
+
+
+def _transactions(cursor):
+    # Append-only economy ledger; rows only ever leave through archival, and
+    # AUTOINCREMENT keeps the ids they free from being handed out again
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS transactions (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            ts INTEGER,
+            user_id INTEGER,
+            kind TEXT,
+            amount INTEGER,
+            wager INTEGER DEFAULT 0
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_transactions_user ON transactions (user_id, ts)')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_transactions_kind ON transactions (kind, ts)')
+
+    # Per day (date ordinal), kind and user totals, kept up to date as the ledger is written;
+    # user_id 0 rows hold each day's total for a kind
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS transaction_rollups (
+            day INTEGER,
+            kind TEXT,
+            user_id INTEGER,
+            entries INTEGER DEFAULT 0,
+            earned INTEGER DEFAULT 0,
+            spent INTEGER DEFAULT 0,
+            wagered INTEGER DEFAULT 0,
+            PRIMARY KEY (day, kind, user_id)
+        ) WITHOUT ROWID
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_transaction_rollups_user ON transaction_rollups (user_id, day)')
+
+
+def _exchange_outbox(cursor):
+    # Exchanges waiting for the Minecraft side to pull and acknowledge them
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS exchange_outbox (
+            id INTEGER PRIMARY KEY,
+            idempotency_key TEXT UNIQUE,
+            user_id INTEGER,
+            username TEXT,
+            guild_id INTEGER,
+            amount INTEGER,
+            mc_amount INTEGER,
+            created_at INTEGER,
+            leased_until INTEGER DEFAULT 0,
+            attempts INTEGER DEFAULT 0,
+            delivered_at INTEGER
+        )
+    ''')
+    cursor.execute('CREATE INDEX IF NOT EXISTS idx_exchange_outbox_pending ON exchange_outbox (id) WHERE delivered_at IS NULL')
+
+
+def _channel_rules(cursor):
+    # Per-guild channels that are ignored for XP and quests, or the only ones that count
+    cursor.execute('''
+        CREATE TABLE IF NOT EXISTS channel_rules (
+            guild_id INTEGER NOT NULL,
+            channel_id INTEGER NOT NULL,
+            rule TEXT NOT NULL,
+            PRIMARY KEY (guild_id, channel_id)
+        )
+    ''')
+
+
+def _xp_rate_limits(cursor):
+    # NULL means the bot-wide default; xp_per_minute 0 turns the limit off
+    _add_missing_columns(cursor, 'server_settings', [
+        ('xp_per_minute', 'INTEGER'),
+        ('xp_burst', 'INTEGER')
+    ])
+
+
+# (version, description, function); append new migrations, never edit shipped ones
+MIGRATIONS = [
+    (1, 'base schema', _base_schema),
+    (2, 'leaderboard balance index', _balance_index),
+    (3, 'guild membership', _guild_members),
+    (4, 'persistent quest sets', _quest_sets),
+    (5, 'daily quest assignments', _daily_assignments),
+    (6, 'transaction ledger', _transactions),
+    (7, 'exchange outbox', _exchange_outbox),
+    (8, 'channel rules', _channel_rules),
+    (9, 'per-guild XP rate limits', _xp_rate_limits),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+
+def migrate(conn):
+    """Bring the schema up to LATEST_VERSION; returns the versions applied
+
+    The schema version lives in PRAGMA user_version, so a current database
+    costs one PRAGMA read. Pending migrations run in a single transaction
+    and either all apply or none do.
+    """
+    if conn.execute('PRAGMA user_version').fetchone()[0] >= LATEST_VERSION:
+        return []
+
+    cursor = conn.cursor()
+    cursor.execute('BEGIN IMMEDIATE')
+    try:
+        # Re-read under the write lock in case another process just migrated
+        version = cursor.execute('PRAGMA user_version').fetchone()[0]
+        pending = [migration for migration in MIGRATIONS if migration[0] > version]
+        for number, description, apply in pending:
+            apply(cursor)
+        # PRAGMA doesn't take parameters; the version is always one of ours
+        cursor.execute(f'PRAGMA user_version = {LATEST_VERSION}')
+        conn.commit()
+    except Exception:
+        conn.rollback()
+        raise
+
+    return [(number, description) for number, description, _ in pending]
@@ -0,0 +1,280 @@
+import asyncio
+import time
+
+from database import Database
+from trackers import IdSet
+
+
+class ProgressCache:
+    """Write-behind cache for XP and quest progress
+
+    Each active user's level, XP, daily quests, quest progress and quest
+    sets (who they mentioned, which channels they used) live in memory.
+    Plain increments (a chat message, a keyword, a new set member) only
+    mark the user dirty and are written in bulk with executemany, either
+    every `flush_interval` seconds or as soon as `max_dirty` entries pile up.
+
+    Anything that pays out coins (level ups, quest completions) or hands out
+    new daily quests is written through immediately, so a crash can only lose
+    un-rewarded progress from the current flush window. window() reports
+    exactly how much that is at any moment. If a write-through fails, its
+    reward and quest assignment stay pending and go out with the next flush.
+    """
+
+    def __init__(self, db, flush_interval=5.0, max_dirty=500, idle_ttl=900):
+        self.db = db
+        self.flush_interval = flush_interval
+        self.max_dirty = max_dirty
+        self.idle_ttl = idle_ttl
+        self._users = {}
+        self._touched = {}
+        self._dirty_levels = set()
+        self._dirty_quests = set()
+        self._dirty_sets = set()
+        # Rewards (user_id -> coins) and assignments (user_id -> (quest_ids, day, reset_progress))
+        # whose write-through failed
+        self._pending_rewards = {}
+        self._pending_assignments = {}
+        self._dirty_since = None
+        self._flush_task = None
+        self._timer_task = None
+        self.flushes = 0
+        self.rows_flushed = 0
+
+    async def get_state(self, user_id, username):
+        """Return the cached state for a user, loading it on first use"""
+        state = self._users.get(user_id)
+        if state is None:
+            loaded = await self.db.get_message_state(user_id, username)
+            loaded['sets'] = {kind: IdSet(members) for kind, members in loaded['sets'].items()}
+            # Another handler may have loaded the same user while we waited
+            state = self._users.setdefault(user_id, loaded)
+        self._touched[user_id] = time.monotonic()
+        return state
+
+    def peek(self, user_id):
+        """Return the cached state for a user, or None without loading it"""
+        return self._users.get(user_id)
+
+    async def apply(self, user_id, username, xp_amount=0, evaluate=None):
+        """Apply XP and quest changes for a user
+
+        `evaluate(state)` returns a dict with optional keys:
+          - 'reset': drop all quest progress first
+          - 'new_quests': quest ids to assign for quest day 'day'
+          - 'updates': list of (quest_id, progress, completed, reward)
+          - 'set_members': (kind, member_id) pairs newly added to state['sets']
+        Returns (xp_result, updates). Level ups and completions are already
+        persisted when this returns.
+        """
+        state = await self.get_state(user_id, username)
+
+        xp_result = Database.calculate_level_up(state['level'], state['xp'], xp_amount)
+        state['level'] = xp_result['new_level']
+        state['xp'] = xp_result['new_xp']
+
+        changes = evaluate(state) if evaluate else {}
+        updates = changes.get('updates', [])
+        set_rows = [(user_id, kind, member_id) for kind, member_id in changes.get('set_members', ())]
+
+        assignments = []
+        if changes.get('reset'):
+            state['progress'] = {}
+            # The reset deletes the stored sets; older unsaved members must not come back
+            self._dirty_sets.difference_update([row for row in self._dirty_sets if row[0] == user_id])
+        if changes.get('new_quests') is not None:
+            state['quests'] = changes['new_quests']
+            state['day'] = changes['day']
+            assignments.append((user_id, state['quests'], state['day'], bool(changes.get('reset'))))
+
+        for quest_id, progress, completed, _ in updates:
+            state['progress'][quest_id] = (progress, completed)
+
+        reward = xp_result['coins_earned'] + sum(reward for _, _, _, reward in updates)
+
+        if reward or assignments:
+            await self._write_through(user_id, state, reward, assignments, set_rows)
+        else:
+            if xp_amount:
+                self._mark_dirty(self._dirty_levels, user_id)
+            for quest_id, _, _, _ in updates:
+                self._mark_dirty(self._dirty_quests, (user_id, quest_id))
+            for row in set_rows:
+                self._mark_dirty(self._dirty_sets, row)
+
+        return xp_result, updates
+
+    def apply_rollover(self, assigned, day):
+        """Mirror a bulk quest rollover ({user_id: quest_ids}) into cached users"""
+        rolled = [user_id for user_id in assigned if user_id in self._users]
+        for user_id in rolled:
+            state = self._users[user_id]
+            state['quests'] = assigned[user_id]
+            state['day'] = day
+            state['progress'] = {}
+            state['sets'] = {}
+        # Unsaved progress from the old day would otherwise be written back
+        rolled = set(rolled)
+        for user_id in rolled:
+            self._pending_assignments.pop(user_id, None)
+        self._dirty_quests.difference_update([key for key in self._dirty_quests if key[0] in rolled])
+        self._dirty_sets.difference_update([row for row in self._dirty_sets if row[0] in rolled])
+
+    def apply_level_reset(self, user_ids):
+        """Put cached users back to level 1 with no XP, before the database reset runs
+
+        Their pending level writes are dropped so a later flush can't bring
+        the old level back; XP gained from here on builds on the reset.
+        """
+        for user_id in user_ids:
+            state = self._users.get(user_id)
+            if state is not None:
+                state['level'] = 1
+                state['xp'] = 0
+        self._dirty_levels.difference_update(user_ids)
+
+    def _mark_dirty(self, dirty, key):
+        if self._dirty_since is None:
+            self._dirty_since = time.monotonic()
+        dirty.add(key)
+        if self._dirty_count() >= self.max_dirty:
+            self._schedule_flush()
+
+    def _dirty_count(self):
+        return (len(self._dirty_levels) + len(self._dirty_quests) + len(self._dirty_sets)
+                + len(self._pending_rewards) + len(self._pending_assignments))
+
+    def _dirty_users(self):
+        return (self._dirty_levels | {user_id for user_id, _ in self._dirty_quests} | {row[0] for row in self._dirty_sets}
+                | self._pending_rewards.keys() | self._pending_assignments.keys())
+
+    async def _write_through(self, user_id, state, reward, assignments, set_rows):
+        # Save the user's whole state so nothing older is left pending for them
+        self._dirty_levels.discard(user_id)
+        self._dirty_quests.difference_update([key for key in self._dirty_quests if key[0] == user_id])
+        pending_sets = [row for row in self._dirty_sets if row[0] == user_id]
+        self._dirty_sets.difference_update(pending_sets)
+        try:
+            await self.db.save_progress(
+                levels=[(state['level'], state['xp'], user_id)],
+                quest_rows=[(user_id, quest_id, progress, completed) for quest_id, (progress, completed) in state['progress'].items()],
+                rewards=[(user_id, reward)] if reward else [],
+                assignments=assignments,
+                set_rows=pending_sets + set_rows
+            )
+        except Exception as e:
+            # The cached state already counts the level up or completion, so it can't
+            # happen again; keep everything pending, reward included, for the next flush
+            print(f'❌ Progress write failed, retrying with the next flush: {e}')
+            if reward:
+                self._pending_rewards[user_id] = self._pending_rewards.get(user_id, 0) + reward
+            for _, quest_ids, day, reset_progress in assignments:
+                # Progress from before an unsaved reset must still be deleted
+                earlier = self._pending_assignments.get(user_id)
+                self._pending_assignments[user_id] = (quest_ids, day, reset_progress or (earlier is not None and earlier[2]))
+            self._mark_dirty(self._dirty_levels, user_id)
+            for quest_id in state['progress']:
+                self._mark_dirty(self._dirty_quests, (user_id, quest_id))
+            for row in pending_sets + set_rows:
+                self._mark_dirty(self._dirty_sets, row)
+
+    def _drain(self):
+        levels = [(self._users[user_id]['level'], self._users[user_id]['xp'], user_id)
+                  for user_id in self._dirty_levels]
+        quest_rows = []
+        for user_id, quest_id in self._dirty_quests:
+            progress = self._users[user_id]['progress'].get(quest_id)
+            if progress is not None:
+                quest_rows.append((user_id, quest_id, progress[0], progress[1]))
+        set_rows = list(self._dirty_sets)
+        rewards = list(self._pending_rewards.items())
+        assignments = [(user_id, *assignment) for user_id, assignment in self._pending_assignments.items()]
+        drained = (set(self._dirty_levels), set(self._dirty_quests), set(self._dirty_sets),
+                   dict(self._pending_rewards), dict(self._pending_assignments))
+        self._dirty_levels.clear()
+        self._dirty_quests.clear()
+        self._dirty_sets.clear()
+        self._pending_rewards.clear()
+        self._pending_assignments.clear()
+        self._dirty_since = None
+        return levels, quest_rows, set_rows, rewards, assignments, drained
+
+    async def flush(self):
+        """Write every pending change to the database in one batch"""
+        if not self._dirty_count():
+            return 0
+
+        dirty_since = self._dirty_since
+        levels, quest_rows, set_rows, rewards, assignments, drained = self._drain()
+        try:
+            await self.db.save_progress(levels=levels, quest_rows=quest_rows, rewards=rewards, assignments=assignments, set_rows=set_rows)
+        except Exception:
+            # Keep the changes pending; the cached values are still current
+            dirty_levels, dirty_quests, dirty_sets, pending_rewards, pending_assignments = drained
+            self._dirty_levels |= dirty_levels
+            self._dirty_quests |= dirty_quests
+            self._dirty_sets |= dirty_sets
+            for user_id, reward in pending_rewards.items():
+                self._pending_rewards[user_id] = self._pending_rewards.get(user_id, 0) + reward
+            for user_id, (quest_ids, day, reset_progress) in pending_assignments.items():
+                # An assignment made while this flush ran is newer; keep it
+                earlier = self._pending_assignments.get(user_id)
+                if earlier is None:
+                    self._pending_assignments[user_id] = (quest_ids, day, reset_progress)
+                elif reset_progress:
+                    self._pending_assignments[user_id] = (*earlier[:2], True)
+            self._dirty_since = dirty_since
+            raise
+
+        self.flushes += 1
+        self.rows_flushed += len(levels) + len(quest_rows) + len(set_rows)
+        self._evict_idle()
+        return len(levels) + len(quest_rows) + len(set_rows)
+
+    def flush_sync(self):
+        """Durably write pending changes without an event loop (used on shutdown)"""
+        if not self._dirty_count():
+            return 0
+        levels, quest_rows, set_rows, rewards, assignments, _ = self._drain()
+        self.db.database.save_progress(levels=levels, quest_rows=quest_rows, rewards=rewards, assignments=assignments, set_rows=set_rows)
+        return len(levels) + len(quest_rows) + len(set_rows)
+
+    def _evict_idle(self):
+        cutoff = time.monotonic() - self.idle_ttl
+        dirty_users = self._dirty_users()
+        for user_id, touched in list(self._touched.items()):
+            if touched < cutoff and user_id not in dirty_users:
+                del self._touched[user_id]
+                self._users.pop(user_id, None)
+
+    def _schedule_flush(self):
+        if self._flush_task is None or self._flush_task.done():
+            self._flush_task = asyncio.get_running_loop().create_task(self._flush_logged())
+
+    def start(self):
+        """Start the periodic flush timer on the running loop"""
+        if self._timer_task is None or self._timer_task.done():
+            self._timer_task = asyncio.get_running_loop().create_task(self._run())
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.flush_interval)
+            await self._flush_logged()
+
+    async def _flush_logged(self):
+        try:
+            await self.flush()
+        except Exception as e:
+            print(f'❌ Progress flush failed: {e}')
+
+    def window(self):
+        """Exactly what a crash right now would lose"""
+        age = time.monotonic() - self._dirty_since if self._dirty_since is not None else 0.0
+        return {
+            'dirty_users': len(self._dirty_users()),
+            'dirty_rows': self._dirty_count(),
+            'oldest_change_age': age,
+            'flush_interval': self.flush_interval,
+            'max_dirty': self.max_dirty,
+            'cached_users': len(self._users)
+        }
@@ -0,0 +1,76 @@
+import asyncio
+import time
+from datetime import datetime, timedelta
+
+from quests import get_random_quests
+
+
+class DailyRollover:
+    """Hands out new daily quests to every active user at a fixed daily boundary
+
+    Quest days start at `reset_hour` local time. At each boundary every user
+    who was assigned quests in the last `active_days` days gets new ones in
+    one bulk database pass, and cached users are updated in place. Message
+    handlers only compare a user's assigned day against `current_day`;
+    anyone the bulk pass skipped (long inactive users) is still caught by
+    that check the next time they show up.
+    """
+
+    def __init__(self, db, progress_cache, reset_hour=0, active_days=7, quests_per_day=5):
+        self.db = db
+        self.progress_cache = progress_cache
+        self.reset_hour = reset_hour
+        self.active_days = active_days
+        self.quests_per_day = quests_per_day
+        self.current_start = self.day_start(datetime.now())
+        self.last_run = None
+        self._task = None
+
+    def day_start(self, moment):
+        """Start of the quest day that `moment` falls in"""
+        start = moment.replace(hour=self.reset_hour, minute=0, second=0, microsecond=0)
+        return start if start <= moment else start - timedelta(days=1)
+
+    @property
+    def current_day(self):
+        """Date ordinal of the current quest day's start, as stored in daily_assignments"""
+        return self.current_start.toordinal()
+
+    def pick_quests(self):
+        return [quest["id"] for quest in get_random_quests(self.quests_per_day)]
+
+    async def run(self, day_start=None):
+        """Roll every active user over to the quest day starting at `day_start`"""
+        day_start = day_start or self.day_start(datetime.now())
+        started = time.perf_counter()
+
+        # Pending progress belongs to the old day; write it before it's replaced
+        await self.progress_cache.flush()
+        day = day_start.toordinal()
+        assigned = await self.db.rollover_daily_quests(day, day - self.active_days, self.pick_quests)
+        self.progress_cache.apply_rollover(assigned, day)
+        self.current_start = max(self.current_start, day_start)
+
+        self.last_run = {'day_start': day_start, 'users': len(assigned), 'seconds': time.perf_counter() - started}
+        return len(assigned)
+
+    def start(self):
+        """Catch up on a missed boundary now, then roll over at each new one"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        day_start = self.current_start
+        while True:
+            try:
+                users = await self.run(day_start)
+                print(f'🔄 Daily quests rolled over for {users} users in {self.last_run["seconds"]:.2f}s')
+            except Exception as e:
+                print(f'❌ Daily quest rollover failed: {e}')
+            day_start += timedelta(days=1)
+            await asyncio.sleep(max(0.0, (day_start - datetime.now()).total_seconds()))
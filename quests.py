@@ -1,4 +1,5 @@
 import random
+import re
 
 QUEST_POOL = [
     {"id": 1, "name": "Chatterbox I", "description": "Send 50 messages", "type": "chat", "target": 50, "reward": 100, "emoji": "💬"},
@@ -46,8 +47,144 @@ QUEST_POOL = [
 def get_random_quests(count=5):
     return random.sample(QUEST_POOL, min(count, len(QUEST_POOL)))
 
+QUESTS_BY_ID = {quest["id"]: quest for quest in QUEST_POOL}
+
+def pack_quest_ids(quest_ids):
+    """Pack up to 7 quest ids (1-255) into one integer, one byte each, in order"""
+    if len(quest_ids) > 7:
+        raise ValueError("at most 7 quest ids fit in one packed integer")
+    packed = 0
+    for i, quest_id in enumerate(quest_ids):
+        if not 0 < quest_id < 256:
+            raise ValueError(f"quest id {quest_id} doesn't fit in one byte")
+        packed |= quest_id << (8 * i)
+    return packed
+
+def unpack_quest_ids(packed):
+    quest_ids = []
+    while packed:
+        quest_ids.append(packed & 0xFF)
+        packed >>= 8
+    return quest_ids
+
+# Keyword quests count a message if any of these appear anywhere in it (lowercased)
+QUEST_KEYWORDS = {
+    "greeting": ["hi", "hello", "hey"],
+    "gg": ["gg"],
+    "laugh": ["lol", "lmao", "haha", "hehe"],
+    "thanks": ["thanks", "thank you", "thx", "ty"],
+    "welcome": ["welcome"],
+    "minecraft": ["minecraft"],
+    "build": ["build", "building"],
+    "mine": ["mine", "mining"],
+    "fight": ["pvp", "fight", "fighting"],
+    "trade": ["trade", "trading"],
+    "explore": ["explore", "adventure"],
+    "craft": ["craft", "crafting"],
+    "farm": ["farm", "farming"],
+    "positive": ["awesome", "great", "nice", "good", "amazing", "fantastic", "wonderful", "excellent", "perfect", "lovely"],
+}
+
+def _compile_keywords(quest_keywords):
+    """Build one regex that finds every keyword quest in a single scan
+
+    The lookahead reports a match at every position, and with the longest
+    keywords first it picks the longest keyword starting there. Any shorter
+    keyword at the same spot is a prefix of that one ('mine' in 'minecraft'),
+    so each keyword maps to the quest types of all its prefixes too.
+    """
+    keywords = sorted({word for words in quest_keywords.values() for word in words}, key=len, reverse=True)
+    types_for = {}
+    for keyword in keywords:
+        types_for[keyword] = frozenset(
+            quest_type for quest_type, words in quest_keywords.items()
+            if any(keyword.startswith(word) for word in words)
+        )
+    pattern = re.compile("(?=(" + "|".join(re.escape(keyword) for keyword in keywords) + "))")
+    return pattern, types_for
+
+KEYWORD_PATTERN, KEYWORD_TYPES = _compile_keywords(QUEST_KEYWORDS)
+
+QUEST_EMOJIS = "😀😁😂🤣😃😄😅😆😉😊😋😎😍😘🥰😗😙😚☺️🙂🤗🤩🤔🤨😐😑😶🙄😏😣😥😮🤐😯😪😫🥱😴😌😛😜😝🤤😒😓😔😕🙃🤑😲☹️🙁😖😞😟😤😢😭😦😧😨😩🤯😬😰😱🥵🥶😳🤪😵😡😠🤬😷🤒🤕🤢🤮🤧😇🤠🤡🤥🤫🤭🧐🤓"
+
+def _compile_emoji_pattern(emojis):
+    """Character class of every quest emoji, stored as compact codepoint ranges
+
+    Variation selectors are left out, so '☺️' counts once instead of twice.
+    """
+    codepoints = sorted({ord(char) for char in emojis if char != "\ufe0f"})
+    ranges = []
+    for codepoint in codepoints:
+        if ranges and ranges[-1][1] == codepoint - 1:
+            ranges[-1][1] = codepoint
+        else:
+            ranges.append([codepoint, codepoint])
+    return re.compile("[" + "".join(f"{chr(start)}-{chr(end)}" for start, end in ranges) + "]")
+
+EMOJI_PATTERN = _compile_emoji_pattern(QUEST_EMOJIS)
+
+def count_emojis(text):
+    """Count quest emojis in a single O(len(text)) scan"""
+    if text.isascii():
+        return 0
+    return len(EMOJI_PATTERN.findall(text))
+
+class MessageFeatures:
+    """Everything the quest matchers need from a message, computed once"""
+    
+    def __init__(self, raw_content, hour):
+        content = raw_content.lower()
+        self.raw = raw_content
+        self.length = len(raw_content)
+        self.hour = hour
+        self.keywords = set()
+        for match in KEYWORD_PATTERN.finditer(content):
+            self.keywords |= KEYWORD_TYPES[match.group(1)]
+        self.has_question = "?" in raw_content
+        self.has_exclamation = "!" in raw_content
+        self.has_link = "http://" in raw_content or "https://" in raw_content
+        self._emoji_count = None
+        # Filled in by the caller from its trackers when those quests are active
+        self.mention_total = None
+        self.channel_total = None
+    
+    @property
+    def emoji_count(self):
+        if self._emoji_count is None:
+            self._emoji_count = count_emojis(self.raw)
+        return self._emoji_count
+
+def analyze_message(raw_content, hour):
+    return MessageFeatures(raw_content, hour)
+
+def _counts_if(predicate):
+    return lambda features, progress: progress + 1 if predicate(features) else progress
+
+def _keyword_matcher(quest_type):
+    return lambda features, progress: progress + 1 if quest_type in features.keywords else progress
+
+# quest type -> matcher(features, progress) -> new progress
+QUEST_MATCHERS = {quest_type: _keyword_matcher(quest_type) for quest_type in QUEST_KEYWORDS}
+QUEST_MATCHERS.update({
+    "chat": lambda features, progress: progress + 1,
+    # Set sizes never lower stored progress (e.g. sets recorded before they were persisted)
+    "mention": lambda features, progress: max(progress, features.mention_total or 0),
+    "different_channels": lambda features, progress: max(progress, features.channel_total or 0),
+    "emoji": lambda features, progress: progress + features.emoji_count,
+    "question": _counts_if(lambda features: features.has_question),
+    "exclamation": _counts_if(lambda features: features.has_exclamation),
+    "links": _counts_if(lambda features: features.has_link),
+    "long_message": _counts_if(lambda features: features.length >= 100),
+    "short_message": _counts_if(lambda features: features.length < 20),
+    "medium_message": _counts_if(lambda features: 50 <= features.length < 100),
+    "early_bird": lambda features, progress: 1 if features.hour < 8 else progress,
+    "night_owl": lambda features, progress: 1 if features.hour >= 22 else progress,
+})
+
+def evaluate_quest(quest, features, progress):
+    """Return a quest's progress after a message (unchanged for non-message quests)"""
+    matcher = QUEST_MATCHERS.get(quest["type"])
+    return matcher(features, progress) if matcher else progress
+
 def get_quest_by_id(quest_id):
-    for quest in QUEST_POOL:
-        if quest["id"] == quest_id:
-            return quest
-    return None
+    return QUESTS_BY_ID.get(quest_id)
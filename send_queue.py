@@ -0,0 +1,141 @@
+import asyncio
+import time
+from collections import deque
+
+from trackers import TrackerStore
+
+
+class _ChannelQueue:
+    __slots__ = ('channel', 'replies', 'batches', 'open', 'wake', 'task')
+
+    def __init__(self, channel):
+        self.channel = channel
+        self.replies = deque()  # (send kwargs, future)
+        self.batches = deque()  # [due, user_id, embeds], oldest first
+        self.open = {}  # user_id -> the batch still taking embeds
+        self.wake = asyncio.Event()
+        self.task = None
+
+
+class SendQueue:
+    """Outbound channel messages, paced per channel and merged per user
+
+    notify() queues a notification embed. Notifications for the same user
+    in the same channel go out together as one message (up to 10 embeds)
+    if they arrive within `window` seconds of the first, or while it waits
+    for the channel. reply() is for command replies: it skips ahead of any
+    queued notifications and returns the sent message.
+
+    Each channel sends at most `limit` messages per `per` seconds, matching
+    Discord's per-channel bucket, so bursts wait here instead of running
+    into 429s. A channel's worker task only runs while it has work.
+    """
+
+    MAX_EMBEDS = 10
+
+    def __init__(self, window=0.5, limit=5, per=5.0):
+        self.window = window
+        self.limit = limit
+        self.per = per
+        self._channels = {}
+        # channel_id -> monotonic times of its last `limit` sends
+        self._recent = TrackerStore(ttl=per, max_entries=10000, factory=lambda: deque(maxlen=limit))
+        self.sent = 0
+        self.merged = 0
+        self.throttled = 0
+        self.failed = 0
+
+    def notify(self, channel, user_id, embed):
+        """Queue a notification embed about `user_id` for `channel`"""
+        queue = self._queue(channel)
+        batch = queue.open.get(user_id)
+        if batch is not None and len(batch[2]) < self.MAX_EMBEDS:
+            batch[2].append(embed)
+            self.merged += 1
+        else:
+            batch = [time.monotonic() + self.window, user_id, [embed]]
+            queue.batches.append(batch)
+            queue.open[user_id] = batch
+        queue.wake.set()
+
+    async def reply(self, channel, **kwargs):
+        """Send a command reply ahead of queued notifications; returns the Message"""
+        queue = self._queue(channel)
+        future = asyncio.get_running_loop().create_future()
+        queue.replies.append((kwargs, future))
+        queue.wake.set()
+        return await future
+
+    def close(self):
+        """Stop every channel's worker; anything still queued is dropped"""
+        for queue in list(self._channels.values()):
+            queue.task.cancel()
+
+    def stats(self):
+        return {
+            'sent': self.sent,
+            'merged': self.merged,
+            'throttled': self.throttled,
+            'failed': self.failed,
+            'queued': sum(len(queue.replies) + len(queue.batches) for queue in self._channels.values())
+        }
+
+    def _queue(self, channel):
+        queue = self._channels.get(channel.id)
+        if queue is None:
+            queue = self._channels[channel.id] = _ChannelQueue(channel)
+            queue.task = asyncio.get_running_loop().create_task(self._drain(queue))
+        return queue
+
+    def _bucket_wait(self, channel_id, now):
+        """Seconds until the channel may send again under `limit` per `per`"""
+        recent = self._recent.get(channel_id)
+        if recent is None or len(recent) < self.limit:
+            return 0.0
+        return recent[0] + self.per - now
+
+    async def _drain(self, queue):
+        channel = queue.channel
+        try:
+            while queue.replies or queue.batches:
+                now = time.monotonic()
+                due = 0.0 if queue.replies else queue.batches[0][0] - now
+                bucket = self._bucket_wait(channel.id, now)
+                if max(due, bucket) > 0:
+                    if bucket > 0 and due <= 0:
+                        self.throttled += 1
+                    queue.wake.clear()
+                    try:
+                        await asyncio.wait_for(queue.wake.wait(), max(due, bucket))
+                    except asyncio.TimeoutError:
+                        pass
+                    continue
+
+                self._recent.setdefault(channel.id).append(now)
+                if queue.replies:
+                    kwargs, future = queue.replies.popleft()
+                    try:
+                        message = await channel.send(**kwargs)
+                    except Exception as e:
+                        if not future.done():
+                            future.set_exception(e)
+                        continue
+                    if not future.done():
+                        future.set_result(message)
+                else:
+                    batch = queue.batches.popleft()
+                    # Later notifications start a new batch while this one is sent
+                    if queue.open.get(batch[1]) is batch:
+                        del queue.open[batch[1]]
+                    try:
+                        await channel.send(embeds=batch[2])
+                    except Exception as e:
+                        self.failed += 1
+                        print(f'❌ Failed to send notification to #{channel.id}: {e}')
+                        continue
+                self.sent += 1
+        finally:
+            # Nothing can be queued between the empty check and here (no await)
+            del self._channels[channel.id]
+            for _, future in queue.replies:
+                future.cancel()
@@ -0,0 +1,121 @@
+import asyncio
+import time
+from collections import deque
+from dataclasses import dataclass
+
+from mcstatus import JavaServer
+
+DEFAULT_PORT = 25565
+
+
+@dataclass(slots=True)
+class ServerStatus:
+    """Result of one status ping to a Minecraft server"""
+    online: bool
+    checked_at: float
+    players_online: int = 0
+    players_max: int = 0
+    latency: float = None
+    version: str = None
+    players: tuple = ()
+    error: str = None
+
+
+class StatusMonitor:
+    """Polls every configured Minecraft server in the background
+
+    `targets()` returns the (host, port) addresses to watch. Each one is
+    pinged at most once per `ttl` seconds, with no more than `concurrency`
+    pings in flight, so commands can answer from the cache instead of
+    waiting on the network. A down server costs one timeout per poll rather
+    than one per command. The last `history_size` results per address are
+    kept for player count and latency trends.
+    """
+
+    def __init__(self, targets, ttl=60.0, concurrency=8, timeout=3.0, history_size=60):
+        self.targets = targets
+        self.ttl = ttl
+        self.timeout = timeout
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._history_size = history_size
+        self._latest = {}
+        self._history = {}
+        self._pending = {}
+        self._task = None
+        self.polls = 0
+
+    def get(self, host, port=None):
+        """Last known status for an address, or None if it was never polled"""
+        return self._latest.get((host, port or DEFAULT_PORT))
+
+    def history(self, host, port=None):
+        """Recent (checked_at, players_online, latency) samples, oldest first"""
+        return list(self._history.get((host, port or DEFAULT_PORT), ()))
+
+    async def refresh(self, host, port=None):
+        """Ping an address now; concurrent callers share one ping"""
+        address = (host, port or DEFAULT_PORT)
+        pending = self._pending.get(address)
+        if pending is None:
+            pending = asyncio.ensure_future(self._poll(address))
+            self._pending[address] = pending
+            pending.add_done_callback(lambda _: self._pending.pop(address, None))
+        return await asyncio.shield(pending)
+
+    async def _poll(self, address):
+        async with self._semaphore:
+            try:
+                # mcstatus applies the timeout per socket operation; cap the whole ping
+                response = await asyncio.wait_for(JavaServer(*address, timeout=self.timeout).async_status(), self.timeout * 2)
+                status = ServerStatus(
+                    online=True,
+                    checked_at=time.time(),
+                    players_online=response.players.online,
+                    players_max=response.players.max,
+                    latency=response.latency,
+                    version=response.version.name,
+                    players=tuple(player.name for player in response.players.sample or ())
+                )
+            except Exception as e:
+                status = ServerStatus(online=False, checked_at=time.time(), error=str(e)[:100] or type(e).__name__)
+
+        self.polls += 1
+        self._latest[address] = status
+        history = self._history.setdefault(address, deque(maxlen=self._history_size))
+        history.append((status.checked_at, status.players_online, status.latency))
+        return status
+
+    async def poll_due(self):
+        """Ping every target whose cached status is older than the TTL"""
+        addresses = {(host, port or DEFAULT_PORT) for host, port in self.targets()}
+        for address in set(self._latest) - addresses:
+            # No guild points at this server any more
+            del self._latest[address]
+            self._history.pop(address, None)
+
+        now = time.time()
+        due = [address for address in addresses
+               if address not in self._latest or now - self._latest[address].checked_at >= self.ttl]
+        if due:
+            await asyncio.gather(*(self.refresh(*address) for address in due))
+        return len(due)
+
+    def start(self):
+        """Start background polling on the running loop (safe to call more than once)"""
+        if self._task is None or self._task.done():
+            self._task = asyncio.get_running_loop().create_task(self._run())
+
+    def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    async def _run(self):
+        # Wake often enough that each server is re-polled close to its TTL
+        interval = max(1.0, self.ttl / 4)
+        while True:
+            try:
+                await self.poll_due()
+            except Exception as e:
+                print(f'❌ Server status poll failed: {e}')
+            await asyncio.sleep(interval)
@@ -0,0 +1,406 @@
+import asyncio
+import random
+from datetime import datetime, timedelta
+
+import discord
+
+from leveling import progress_bar, xp_needed
+from quests import get_quest_by_id
+
+
+class ServiceError(Exception):
+    """A user-facing refusal (bad input, not enough coins); the message is the reply"""
+
+
+class CommandServices:
+    """The economy and quest commands, shared by the prefix and slash front ends
+
+    Each method does the command's database and quest work and returns the
+    finished discord.Embed, or raises ServiceError with the reply text.
+    Front ends only parse arguments and send the result. `update_quest`
+    and `refresh_daily_quests` are bot.py's quest hooks.
+    """
+
+    def __init__(self, db, progress_cache, quest_rollover, update_quest, refresh_daily_quests):
+        self.db = db
+        self.progress_cache = progress_cache
+        self.quest_rollover = quest_rollover
+        self.update_quest = update_quest
+        self.refresh_daily_quests = refresh_daily_quests
+
+    async def balance(self, member, requester, channel):
+        user_id = member.id
+        username = str(member)
+        await self.db.get_user(user_id, username)
+
+        await self.update_quest(user_id, username, 22, 1, channel)
+
+        user_balance = await self.db.get_balance(user_id)
+
+        embed = discord.Embed(
+            title=f"💰 {member.display_name}'s Balance",
+            description=f"**{user_balance:,}** coins",
+            color=discord.Color.gold()
+        )
+        embed.set_thumbnail(url=member.display_avatar.url)
+        embed.set_footer(text=f"Requested by {requester}")
+        return embed
+
+    async def profile(self, member, requester):
+        user_id = member.id
+        username = str(member)
+        profile = await self.db.get_profile(user_id, username)
+
+        balance = profile['balance']
+        total_earned = profile['total_earned']
+        total_spent = profile['total_spent']
+        # Active users may have XP and progress the database hasn't seen yet
+        state = self.progress_cache.peek(user_id)
+        if state is None:
+            level, xp, completed_quests = profile['level'], profile['xp'], profile['completed']
+        else:
+            level, xp = state['level'], state['xp']
+            completed_quests = sum(1 for q_id in state['quests'] if state['progress'].get(q_id, (0, 0))[1] == 1)
+
+        embed = discord.Embed(
+            title=f"📊 {member.display_name}'s Profile",
+            description=f"⭐ Level {level} | {xp}/{xp_needed(level)} XP\n{progress_bar(level, xp)}",
+            color=discord.Color.blue()
+        )
+        embed.set_thumbnail(url=member.display_avatar.url)
+        embed.add_field(name="💰 Balance", value=f"{balance:,} coins", inline=True)
+        embed.add_field(name="📈 Total Earned", value=f"{total_earned:,} coins", inline=True)
+        embed.add_field(name="📉 Total Spent", value=f"{total_spent:,} coins", inline=True)
+        embed.add_field(name="✅ Quests Completed Today", value=f"{completed_quests}/5", inline=True)
+        embed.set_footer(text=f"Requested by {requester}")
+        return embed
+
+    async def leaderboard(self, requester, guild_id, sort, channel):
+        await self.update_quest(requester.id, str(requester), 23, 1, channel)
+
+        sort = sort.lower()
+        if sort not in ('balance', 'level'):
+            raise ServiceError("❌ Sort by `balance` or `level`!")
+
+        await self.db.load_rankings(guild_id)
+        top_users = await self.db.get_leaderboard(guild_id, 10, sort_by=sort)
+
+        if not top_users:
+            raise ServiceError("❌ No users found in the leaderboard!")
+
+        if sort == 'level':
+            embed = discord.Embed(
+                title="🏆 Highest Level Leaderboard",
+                description="Top 10 most active members",
+                color=discord.Color.gold()
+            )
+        else:
+            embed = discord.Embed(
+                title="🏆 Richest Players Leaderboard",
+                description="Top 10 wealthiest members",
+                color=discord.Color.gold()
+            )
+
+        medals = ["🥇", "🥈", "🥉"]
+
+        for idx, (user_id, username, balance, level, xp) in enumerate(top_users):
+            medal = medals[idx] if idx < 3 else f"#{idx + 1}"
+            embed.add_field(
+                name=f"{medal} {username}",
+                value=f"⭐ Level {level} ({xp:,} XP)" if sort == 'level' else f"💰 {balance:,} coins",
+                inline=False
+            )
+
+        rank, total = await self.db.get_rank(guild_id, requester.id, sort)
+        rank_text = f" • You are #{rank:,} of {total:,}" if rank else ""
+        embed.set_footer(text=f"Requested by {requester}{rank_text}")
+        return embed
+
+    async def quests(self, user, channel):
+        user_id = user.id
+        username = str(user)
+        await self.db.get_user(user_id, username)
+
+        await self.update_quest(user_id, username, 24, 1, channel)
+
+        await self.progress_cache.apply(user_id, username, evaluate=lambda state: self.refresh_daily_quests(user_id, state))
+        state = await self.progress_cache.get_state(user_id, username)
+
+        embed = discord.Embed(
+            title="📋 Your Daily Quests",
+            description="Complete these to earn coins!",
+            color=discord.Color.blue()
+        )
+
+        for quest_id in state['quests']:
+            quest = get_quest_by_id(quest_id)
+            if not quest:
+                continue
+
+            progress, completed = state['progress'].get(quest_id, (0, 0))
+
+            status = "✅ Completed" if completed else f"📊 Progress: {progress}/{quest['target']}"
+
+            embed.add_field(
+                name=f"{quest['emoji']} {quest['name']}",
+                value=f"{quest['description']}\n{status}\n💰 Reward: {quest['reward']} coins",
+                inline=False
+            )
+
+        time_until_reset = self.quest_rollover.current_start + timedelta(days=1) - datetime.now()
+        hours, remainder = divmod(int(time_until_reset.total_seconds()), 3600)
+        minutes, _ = divmod(remainder, 60)
+
+        embed.set_footer(text=f"Resets in {hours}h {minutes}m")
+        return embed
+
+    async def _bet_amount(self, user_id, amount):
+        """Parse a bet: a positive number, or 'all' for the whole balance"""
+        if amount.lower() == 'all':
+            amount = await self.db.get_balance(user_id)
+        else:
+            try:
+                amount = int(amount)
+            except ValueError:
+                raise ServiceError("❌ Amount must be a number or 'all'!")
+
+        if amount <= 0:
+            raise ServiceError("❌ Amount must be positive!")
+        return amount
+
+    async def _settle(self, user_id, amount, winnings, kind):
+        # Balance check and payout in one statement, so parallel bets can't overspend
+        new_balance = await self.db.settle_bet(user_id, amount, winnings, kind=kind)
+        if new_balance is None:
+            balance = await self.db.get_balance(user_id)
+            raise ServiceError(f"❌ You don't have enough coins! Your balance: {balance:,} coins")
+        return new_balance
+
+    async def coinflip(self, user, amount, choice, channel):
+        user_id = user.id
+        username = str(user)
+        await self.db.get_user(user_id, username)
+
+        choice = choice.lower()
+        if choice not in ['heads', 'head', 'h', 'tails', 'tail', 't']:
+            raise ServiceError("❌ Please choose 'heads' or 'tails'!")
+
+        amount = await self._bet_amount(user_id, amount)
+
+        result = random.choice(['heads', 'tails'])
+        user_choice_normalized = 'heads' if choice in ['heads', 'head', 'h'] else 'tails'
+
+        won = result == user_choice_normalized
+
+        new_balance = await self._settle(user_id, amount, amount if won else -amount, 'coinflip')
+
+        await self.update_quest(user_id, username, 16, 1, channel)
+
+        if won:
+            await self.update_quest(user_id, username, 18, 1, channel)
+
+            embed = discord.Embed(
+                title="🎉 You Won!",
+                description=f"The coin landed on **{result}**!",
+                color=discord.Color.green()
+            )
+            embed.add_field(name="💰 Winnings", value=f"+{amount:,} coins", inline=True)
+            embed.add_field(name="💳 New Balance", value=f"{new_balance:,} coins", inline=True)
+        else:
+            embed = discord.Embed(
+                title="😢 You Lost!",
+                description=f"The coin landed on **{result}**!",
+                color=discord.Color.red()
+            )
+            embed.add_field(name="💸 Lost", value=f"-{amount:,} coins", inline=True)
+            embed.add_field(name="💳 New Balance", value=f"{new_balance:,} coins", inline=True)
+
+        embed.set_footer(text=f"{user}")
+        return embed
+
+    async def slots(self, user, amount, channel):
+        """Slot machine: 1/200 pays x100, 1/75 x50, 1/25 x10"""
+        user_id = user.id
+        username = str(user)
+        await self.db.get_user(user_id, username)
+
+        amount = await self._bet_amount(user_id, amount)
+
+        r = random.random()
+        emojis = ["🍒", "🍋", "🍊", "🍇", "⭐", "💎", "7️⃣"]
+        slots = [random.choice(emojis) for _ in range(3)]
+
+        # Probabilities checked in order from rarest to most common
+        winnings = amount * 100 if r < 1/200 else amount * 50 if r < 1/75 else amount * 10 if r < 1/25 else -amount
+        new_balance = await self._settle(user_id, amount, winnings, 'slots')
+
+        await self.update_quest(user_id, username, 17, 1, channel)
+
+        if r < 1/200:
+            embed = discord.Embed(title="🎰 JACKPOT! 💰", description=f"{' '.join(['💎','💎','💎'])}\n\n**YOU HIT THE JACKPOT!**", color=discord.Color.gold())
+            embed.add_field(name="🎉 Winnings", value=f"+{winnings:,} coins (x100!)", inline=True)
+            embed.add_field(name="💳 New Balance", value=f"{new_balance:,} coins", inline=True)
+        elif r < 1/75:
+            embed = discord.Embed(title="🎰 MASSIVE WIN! 💥", description=f"{' '.join(slots)}\n\nAmazing!", color=discord.Color.green())
+            embed.add_field(name="💰 Winnings", value=f"+{winnings:,} coins (x50!)", inline=True)
+            embed.add_field(name="💳 New Balance", value=f"{new_balance:,} coins", inline=True)
+        elif r < 1/25:
+            embed = discord.Embed(title="🎰 Nice Win! 🎉", description=f"{' '.join(slots)}\n\nWell played!", color=discord.Color.blue())
+            embed.add_field(name="💰 Winnings", value=f"+{winnings:,} coins (x10!)", inline=True)
+            embed.add_field(name="💳 New Balance", value=f"{new_balance:,} coins", inline=True)
+        else:
+            embed = discord.Embed(title="🎰 You Lost!", description=f"{' '.join(slots)}\n\nBetter luck next time!", color=discord.Color.red())
+            embed.add_field(name="💸 Lost", value=f"-{amount:,} coins", inline=True)
+            embed.add_field(name="💳 New Balance", value=f"{new_balance:,} coins", inline=True)
+
+        embed.set_footer(text=f"{user}")
+        return embed
+
+    async def grant(self, member, amount, requester):
+        """Admin grant of new coins"""
+        if amount <= 0:
+            raise ServiceError("❌ Amount must be positive!")
+
+        user_id = member.id
+        await self.db.get_user(user_id, str(member))
+        new_balance = await self.db.update_balance(user_id, amount, kind='admin_give')
+
+        embed = discord.Embed(
+            title="✅ Coins Given!",
+            description=f"Gave **{amount:,}** coins to {member.mention}",
+            color=discord.Color.green()
+        )
+        embed.add_field(name="💳 New Balance", value=f"{new_balance:,} coins", inline=True)
+        embed.set_footer(text=f"Given by {requester}")
+        return embed
+
+    async def transfer(self, sender, receiver, amount):
+        """Player-to-player transfer"""
+        if amount <= 0:
+            raise ServiceError("❌ Amount must be positive!")
+
+        if sender.id == receiver.id:
+            raise ServiceError("❌ You can't give coins to yourself!")
+
+        await self.db.get_user(sender.id, str(sender))
+        await self.db.get_user(receiver.id, str(receiver))
+
+        balances = await self.db.transfer(sender.id, receiver.id, amount)
+        if balances is None:
+            balance = await self.db.get_balance(sender.id)
+            raise ServiceError(f"❌ You don't have enough coins! Your balance: {balance:,} coins")
+        sender_new_balance, receiver_new_balance = balances
+
+        embed = discord.Embed(
+            title="✅ Money Transferred!",
+            description=f"{sender.mention} gave **{amount:,}** coins to {receiver.mention}",
+            color=discord.Color.green()
+        )
+        embed.add_field(name=f"💳 {sender.display_name}'s Balance", value=f"{sender_new_balance:,} coins", inline=True)
+        embed.add_field(name=f"💳 {receiver.display_name}'s Balance", value=f"{receiver_new_balance:,} coins", inline=True)
+        embed.set_footer(text=f"Transfer by {sender}")
+        return embed
+
+    async def bulk_grant(self, guild, targets, amount, requester, on_progress=None, take=False):
+        """Admin credit (or debit, with `take`) for roles and members in one transaction
+
+        Mentioning @everyone covers every member the bot knows on the server.
+        Debits stop at zero. Members who never used the bot have no balance
+        yet and are skipped.
+        """
+        if amount <= 0:
+            raise ServiceError("❌ Amount must be positive!")
+
+        user_ids = self._bulk_targets(guild, targets)
+        kind = 'admin_take' if take else 'admin_give'
+        result = await self._with_progress(
+            lambda progress: self.db.bulk_adjust(-amount if take else amount, user_ids=user_ids, guild_id=guild.id, kind=kind, progress=progress),
+            on_progress
+        )
+
+        if take:
+            embed = discord.Embed(
+                title="✅ Coins Taken!",
+                description=f"Took up to **{amount:,}** coins from **{result['users']:,}** members",
+                color=discord.Color.orange()
+            )
+        else:
+            embed = discord.Embed(
+                title="✅ Coins Given!",
+                description=f"Gave **{amount:,}** coins to **{result['users']:,}** members",
+                color=discord.Color.green()
+            )
+        embed.add_field(name="💰 Net Change", value=f"{result['net']:+,} coins", inline=True)
+        self._note_skipped(embed, user_ids, result)
+        embed.set_footer(text=f"By {requester}")
+        return embed
+
+    async def bulk_reset(self, guild, targets, what, requester, on_progress=None):
+        """Admin reset of balances ('balance'), levels ('xp') or both ('all') for roles and members"""
+        what = what.lower()
+        if what not in ('balance', 'xp', 'all'):
+            raise ServiceError("❌ Reset `balance`, `xp` or `all`!")
+
+        user_ids = self._bulk_targets(guild, targets)
+        if what != 'balance':
+            # Cached levels are written back on flush, so they go first
+            self.progress_cache.apply_level_reset(user_ids if user_ids is not None else [member.id for member in guild.members])
+        result = await self._with_progress(
+            lambda progress: self.db.bulk_reset(guild_id=guild.id, user_ids=user_ids, balance=what != 'xp', xp=what != 'balance', progress=progress),
+            on_progress
+        )
+
+        reset = {'balance': 'balances', 'xp': 'levels and XP', 'all': 'balances, levels and XP'}[what]
+        embed = discord.Embed(
+            title="✅ Reset Done!",
+            description=f"Reset {reset} for **{result['users']:,}** members",
+            color=discord.Color.green()
+        )
+        if what != 'xp':
+            embed.add_field(name="💸 Coins Removed", value=f"{-result['net']:,} coins", inline=True)
+        self._note_skipped(embed, user_ids, result)
+        embed.set_footer(text=f"By {requester}")
+        return embed
+
+    @staticmethod
+    def _bulk_targets(guild, targets):
+        """User ids behind the mentioned roles and members; None for the whole server"""
+        if not targets:
+            raise ServiceError("❌ Mention at least one role or member (or @everyone)!")
+        user_ids = set()
+        for target in targets:
+            if isinstance(target, discord.Role):
+                if target.is_default():
+                    return None
+                members = target.members
+            else:
+                members = [target]
+            user_ids.update(member.id for member in members if not member.bot)
+        return user_ids
+
+    @staticmethod
+    def _note_skipped(embed, user_ids, result):
+        if user_ids is not None and len(user_ids) > result['users']:
+            embed.add_field(name="ℹ️ Skipped", value=f"{len(user_ids) - result['users']:,} members haven't used the bot yet", inline=True)
+
+    @staticmethod
+    async def _with_progress(run, on_progress, interval=2.0):
+        """Await run(progress), passing its latest (done, total) to on_progress every `interval` seconds
+
+        The database calls progress() from its own thread, so it only records
+        the numbers; reporting happens here on the event loop.
+        """
+        latest = None
+
+        def progress(done, total):
+            nonlocal latest
+            latest = (done, total)
+
+        task = asyncio.ensure_future(run(progress))
+        reported = None
+        while not task.done():
+            await asyncio.wait((task,), timeout=interval)
+            if on_progress and not task.done() and latest != reported:
+                reported = latest
+                await on_progress(*reported)
+        return task.result()
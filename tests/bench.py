@@ -0,0 +1,33 @@
+"""Helpers shared by the bench_*.py scripts
+
+Importing this puts the repository root on sys.path, so the scripts run
+directly from a checkout (python tests/bench_connections.py) as well as
+from the test suite.
+"""
+import statistics
+import sys
+import time
+from pathlib import Path
+
+ROOT = Path(__file__).resolve().parent.parent
+if str(ROOT) not in sys.path:
+    sys.path.insert(0, str(ROOT))
+
+
+def timed(call, runs):
+    """Seconds taken by each of `runs` calls of call(i)"""
+    samples = []
+    for i in range(runs):
+        started = time.perf_counter()
+        call(i)
+        samples.append(time.perf_counter() - started)
+    return samples
+
+
+def report(timings):
+    """Print p50 and p99 for {(name, variant): [seconds]}"""
+    width = max(len(variant) for _, variant in timings)
+    for (name, variant), samples in timings.items():
+        samples = sorted(samples)
+        p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+        print(f'{name:14s} {variant:{width}s}  p50 {statistics.median(samples) * 1000:9.3f} ms   p99 {p99 * 1000:9.3f} ms')
@@ -0,0 +1,71 @@
+"""Bulk economy commands at scale
+
+Seeds a throwaway database with N users, all members of one guild, with
+the global and guild leaderboards loaded as they are in a running bot,
+and times bulk_adjust() (a credit and a debit) and bulk_reset() once
+per run for each way of picking targets: an explicit user list, the
+guild, and every user. The ledger is flushed between calls, outside the
+timing. Run from the repository root:
+
+    python tests/bench_bulk.py [--runs 3] [--users 100000]
+"""
+import argparse
+import sqlite3
+import tempfile
+from pathlib import Path
+
+from bench import report, timed
+from database import Database
+
+GUILD_ID = 7
+
+# (call, call(db, targets)) where targets are bulk_adjust/bulk_reset keyword arguments
+CALLS = [
+    ('bulk credit', lambda db, targets: db.bulk_adjust(10, **targets)),
+    ('bulk debit', lambda db, targets: db.bulk_adjust(-10, **targets)),
+    ('bulk reset', lambda db, targets: db.bulk_reset(**targets)),
+]
+
+
+def seed(db, users):
+    conn = sqlite3.connect(db.db_name)
+    conn.executemany('INSERT INTO users (user_id, username, balance, level, xp) VALUES (?, ?, 500, 3, 50)',
+                     ((user_id, f'user{user_id}') for user_id in range(1, users + 1)))
+    conn.executemany('INSERT INTO guild_members (guild_id, user_id) VALUES (?, ?)', ((GUILD_ID, user_id) for user_id in range(1, users + 1)))
+    conn.commit()
+    conn.close()
+
+
+def measure(workdir, runs, users):
+    """Time each call for each target mode; returns {(call, targets): [seconds]}"""
+    db = Database(str(Path(workdir) / 'bulk.db'))
+    try:
+        seed(db, users)
+        db.get_leaderboard(None)
+        db.get_leaderboard(GUILD_ID)
+        modes = [('user list', {'user_ids': list(range(1, users + 1))}), ('guild', {'guild_id': GUILD_ID}), ('all users', {})]
+        timings = {}
+        for name, call in CALLS:
+            for mode, targets in modes:
+                samples = []
+                for _ in range(runs):
+                    samples += timed(lambda i: call(db, targets), 1)
+                    db.flush_transactions()
+                timings[(name, mode)] = samples
+        return timings
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=3, help='calls per command and target mode')
+    parser.add_argument('--users', type=int, default=100000, help='users in the database')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        report(measure(workdir, args.runs, args.users))
+
+
+if __name__ == '__main__':
+    main()
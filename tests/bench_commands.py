@@ -0,0 +1,80 @@
+"""Per-command latency for the prefix and slash front ends
+
+Drives each shared economy command through both front ends with fake
+contexts and interactions against a throwaway database, and prints the
+median and p99 time per call. Every call gets its own channel, so the
+send queue's per-channel pacing never comes into it. Run from the
+repository root:
+
+    python tests/bench_commands.py [--runs 300]
+"""
+import argparse
+import asyncio
+import importlib
+import os
+import tempfile
+import time
+
+from bench import report
+from fakes import GUILD_ID, FakeContext, FakeInteraction, FakeUser
+
+# (command, prefix command name, slash command name, arguments after the context)
+COMMANDS = [
+    ('balance', 'balance', 'balance', lambda other: (None,)),
+    ('profile', 'profile', 'profile', lambda other: (None,)),
+    ('leaderboard', 'leaderboard', 'leaderboard', lambda other: ('balance',)),
+    ('quests', 'quests', 'quests', lambda other: ()),
+    ('coinflip', 'cf', 'coinflip', lambda other: ('1', 'heads')),
+    ('slots', 'gamble', 'slots', lambda other: ('1',)),
+    # Prefix give is the admin grant, /give a transfer between players
+    ('give', 'give', 'give', lambda other: (other, 1)),
+]
+USER_IDS = (1, 2, 3, 4)
+
+
+async def seed(bot):
+    for user_id in USER_IDS:
+        await bot.db.get_user(user_id, f'user{user_id}')
+        await bot.db.update_balance(user_id, 10**6)
+    await bot.db.sync_guild_members(GUILD_ID, USER_IDS)
+
+
+async def measure(bot, runs):
+    """Time `runs` calls of every command through each front end; returns {(command, front): [seconds]}"""
+    await seed(bot)
+    prefix = {command.name: command.callback for command in bot.bot.commands}
+    slash = {command.name: command.callback for command in bot.bot.tree.get_commands()}
+    users = [FakeUser(user_id) for user_id in USER_IDS]
+    timings = {}
+    for name, prefix_name, slash_name, arguments in COMMANDS:
+        for front in ('prefix', 'slash'):
+            samples = timings[(name, front)] = []
+            for i in range(runs):
+                user, other = users[i % len(users)], users[(i + 1) % len(users)]
+                target = FakeContext(user) if front == 'prefix' else FakeInteraction(user)
+                callback = prefix[prefix_name] if front == 'prefix' else slash[slash_name]
+                started = time.perf_counter()
+                await callback(target, *arguments(other))
+                samples.append(time.perf_counter() - started)
+    await bot.progress_cache.flush()
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=300, help='calls per command and front end')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        # bot.py opens minecraft_bot.db in the working directory on import
+        os.chdir(workdir)
+        os.environ['XP_PER_MINUTE'] = '0'
+        bot = importlib.import_module('bot')
+        try:
+            report(asyncio.run(measure(bot, args.runs)))
+        finally:
+            bot.db.close()
+
+
+if __name__ == '__main__':
+    main()
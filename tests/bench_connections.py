@@ -0,0 +1,69 @@
+"""Per-call sqlite3.connect() against Database's pooled connections
+
+Times existing Database methods against two copies of the same database:
+once with get_connection() opening a fresh connection for every call, as
+Database did before connections were pooled, and once with the long-lived
+per-thread connection. Run from the repository root:
+
+    python tests/bench_connections.py [--runs 2000] [--users 10000]
+"""
+import argparse
+import sqlite3
+import tempfile
+from pathlib import Path
+
+from bench import report, timed
+from database import Database
+
+
+class PerCallDatabase(Database):
+    """Database opening a new connection on every get_connection(), closed once the caller drops it"""
+
+    def get_connection(self):
+        return sqlite3.connect(self.db_name, timeout=self.BUSY_TIMEOUT)
+
+
+# (method, call(db, i) against a seeded database of `users` users)
+CALLS = [
+    ('get_user', lambda db, i, users: db.get_user(i % users + 1, f'user{i % users + 1}')),
+    ('update_balance', lambda db, i, users: db.update_balance(i % users + 1, 1)),
+    ('get_balance', lambda db, i, users: db.get_balance(i % users + 1)),
+]
+
+
+def seed(db, users):
+    conn = sqlite3.connect(db.db_name)
+    conn.executemany('INSERT INTO users (user_id, username, balance) VALUES (?, ?, 100)', [(user_id, f'user{user_id}') for user_id in range(1, users + 1)])
+    conn.commit()
+    conn.close()
+
+
+def measure(workdir, runs, users):
+    """Time `runs` calls of each method both ways; returns {(method, way): [seconds]}"""
+    timings = {}
+    for way, cls in (('per-call', PerCallDatabase), ('pooled', Database)):
+        db = cls(str(Path(workdir) / f'{way}.db'))
+        try:
+            seed(db, users)
+            for name, call in CALLS:
+                timings[(name, way)] = timed(lambda i: call(db, i, users), runs)
+            db.flush_transactions()
+        finally:
+            db.close()
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=2000, help='calls per method and connection mode')
+    parser.add_argument('--users', type=int, default=10000, help='users in the database')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        timings = measure(workdir, args.runs, args.users)
+    # Per method, per-call first, then pooled
+    report(dict(sorted(timings.items(), key=lambda item: [name for name, _ in CALLS].index(item[0][0]))))
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,58 @@
+"""Emoji counting throughput on long messages
+
+Times quests.count_emojis() against the per-character scan it replaced
+(every character looked up in the emoji string) on messages of 2,000 and
+4,000 characters (Discord's limits without and with Nitro): plain text,
+text with a few emojis, and emoji spam. Run from the repository root:
+
+    python tests/bench_emojis.py [--runs 2000]
+"""
+import argparse
+import random
+
+from bench import report, timed
+from quests import QUEST_EMOJIS, count_emojis
+
+
+def scan_count(text):
+    """The count before count_emojis(), minus the variation selector it also counted"""
+    return sum(1 for char in text if char in QUEST_EMOJIS and char != "️")
+
+
+def message(length, emoji_share, seed=1):
+    rng = random.Random(seed)
+    words = ['gg', 'minecraft', 'build', 'nice', 'farm', 'the', 'creeper', 'blew', 'up', 'my', 'house']
+    emojis = ['😀', '😂', '☺️', '🤔', '😭', '☹️', '🥰']
+    parts, size = [], 0
+    while size < length:
+        part = rng.choice(emojis) if rng.random() < emoji_share else rng.choice(words) + ' '
+        parts.append(part)
+        size += len(part)
+    return ''.join(parts)[:length]
+
+
+MESSAGES = [
+    (f'{length} {kind}', message(length, share))
+    for length in (2000, 4000)
+    for kind, share in (('ascii', 0.0), ('some', 0.05), ('spam', 0.9))
+]
+
+
+def measure(runs):
+    """Time both counters on every message; returns {(message, counter): [seconds]}"""
+    timings = {}
+    for name, text in MESSAGES:
+        timings[(name, 'per-char')] = timed(lambda i: scan_count(text), runs)
+        timings[(name, 'count_emojis')] = timed(lambda i: count_emojis(text), runs)
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=2000, help='counts per message and counter')
+    args = parser.parse_args()
+    report(measure(args.runs))
+
+
+if __name__ == '__main__':
+    main()
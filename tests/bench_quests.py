@@ -0,0 +1,74 @@
+"""Quest evaluation: the old if/elif chain against analyze_message()/evaluate_quest()
+
+Feeds the chat stream from the on_message differential test (random
+chatter and mentions over 12 channels, plus a 'cbd' spammer) through
+both ways of working out quest progress, and prints the median and p99
+time per message. Each message is checked against one user's five daily
+quests and, separately, against every quest in the pool. Run from the
+repository root:
+
+    python tests/bench_quests.py [--messages 20000]
+"""
+import argparse
+import random
+from datetime import datetime
+
+from bench import report, timed
+from quests import QUEST_POOL, analyze_message, evaluate_quest
+from test_message_pipeline import legacy_progress, message_stream
+
+
+def legacy(message, quests, trackers):
+    content = message.content.lower()
+    return [legacy_progress(quest, 0, message, content, trackers) for quest in quests]
+
+
+def matchers(message, quests, trackers, hour):
+    features = analyze_message(message.content, hour)
+    user_id = message.author.id
+    progress = []
+    for quest in quests:
+        # Stands in for bot.track_quest_sets, with the same sets legacy_progress keeps
+        if quest["type"] == "mention" and message.mentions:
+            mentioned = trackers.setdefault(("mention", user_id), set())
+            mentioned.update(mention.id for mention in message.mentions)
+            features.mention_total = len(mentioned)
+        elif quest["type"] == "different_channels":
+            channels = trackers.setdefault(("channels", user_id), set())
+            channels.add(message.channel.id)
+            features.channel_total = len(channels)
+        progress.append(evaluate_quest(quest, features, 0))
+    return progress
+
+
+def corpus(count, seed=1):
+    """(message, the sender's daily quests) pairs"""
+    rng = random.Random(seed)
+    daily = {}
+    pairs = []
+    for message in message_stream(count, seed):
+        quests = daily.setdefault(message.author.id, rng.sample(QUEST_POOL, 5))
+        pairs.append((message, quests))
+    return pairs
+
+
+def measure(messages):
+    """Time both evaluators over the corpus; returns {(quests, evaluator): [seconds]}"""
+    pairs = corpus(messages)
+    hour = datetime.now().hour
+    timings = {}
+    for name, quests_of in (('5 daily', lambda quests: quests), ('whole pool', lambda quests: QUEST_POOL)):
+        timings[(name, 'if/elif')] = timed(lambda i: legacy(pairs[i][0], quests_of(pairs[i][1]), {}), len(pairs))
+        timings[(name, 'matchers')] = timed(lambda i: matchers(pairs[i][0], quests_of(pairs[i][1]), {}, hour), len(pairs))
+    return timings
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--messages', type=int, default=20000, help='messages in the corpus')
+    args = parser.parse_args()
+    report(measure(args.messages))
+
+
+if __name__ == '__main__':
+    main()
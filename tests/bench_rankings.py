@@ -0,0 +1,82 @@
+"""Leaderboard queries: SQL against the in-memory Rankings
+
+Seeds a throwaway database with N users and times, for the global
+balance board, a top-10 page, one user's rank and a balance change: as
+SQL on the users table and its (balance DESC, user_id) index, and
+through Database.get_leaderboard(), get_rank() and Rankings.update().
+Loading the rankings is timed once per size. Run from the repository
+root:
+
+    python tests/bench_rankings.py [--runs 500] [--sizes 10000,100000,1000000]
+"""
+import argparse
+import random
+import sqlite3
+import tempfile
+import time
+from pathlib import Path
+
+from bench import report, timed
+from database import Database
+
+SQL_TOP = 'SELECT user_id, username, balance, level, xp FROM users ORDER BY balance DESC, user_id LIMIT 10'
+SQL_RANK = '''
+    SELECT (SELECT COUNT(*) FROM users WHERE balance > me.balance OR (balance = me.balance AND user_id < me.user_id)) + 1,
+           (SELECT COUNT(*) FROM users)
+    FROM users me WHERE me.user_id = ?
+'''
+
+
+def seed(db, users):
+    rng = random.Random(users)
+    conn = sqlite3.connect(db.db_name)
+    conn.executemany('INSERT INTO users (user_id, username, balance, level, xp) VALUES (?, ?, ?, ?, ?)',
+                     ((user_id, f'user{user_id}', rng.randint(0, 10**6), rng.randint(1, 60), rng.randint(0, 999)) for user_id in range(1, users + 1)))
+    conn.commit()
+    conn.close()
+
+
+def measure(workdir, runs, users):
+    """Time each query both ways; returns ({(query, way): [seconds]}, seconds to load the rankings)"""
+    db = Database(str(Path(workdir) / f'rankings-{users}.db'))
+    try:
+        seed(db, users)
+        conn = db.get_connection()
+        rng = random.Random(0)
+        targets = [rng.randint(1, users) for _ in range(runs)]
+        balances = [rng.randint(0, 10**6) for _ in range(runs)]
+
+        started = time.perf_counter()
+        db.get_leaderboard(None)
+        loaded = time.perf_counter() - started
+
+        timings = {
+            ('top-10', 'sql'): timed(lambda i: conn.execute(SQL_TOP).fetchall(), runs),
+            ('top-10', 'rankings'): timed(lambda i: db.get_leaderboard(None, limit=10), runs),
+            ('rank', 'sql'): timed(lambda i: conn.execute(SQL_RANK, (targets[i],)).fetchone(), runs),
+            ('rank', 'rankings'): timed(lambda i: db.get_rank(None, targets[i]), runs),
+            # The UPDATE keeps the balance index current; it is rolled back afterwards
+            ('update', 'sql'): timed(lambda i: conn.execute('UPDATE users SET balance = ? WHERE user_id = ?', (balances[i], targets[i])), runs),
+            ('update', 'rankings'): timed(lambda i: db.rankings.update(targets[i], balance=balances[i]), runs),
+        }
+        conn.rollback()
+        return timings, loaded
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=500, help='calls per query, way and size')
+    parser.add_argument('--sizes', default='10000,100000,1000000', help='comma-separated user counts')
+    args = parser.parse_args()
+
+    for users in (int(size) for size in args.sizes.split(',')):
+        with tempfile.TemporaryDirectory() as workdir:
+            timings, loaded = measure(workdir, args.runs, users)
+        print(f'{users:,} users, rankings loaded in {loaded * 1000:.0f} ms')
+        report(timings)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,72 @@
+"""Daily quest rollover at scale
+
+Seeds a throwaway database with N active users, each with a day's quest
+progress and quest set members, and times Database.rollover_daily_quests()
+handing all of them the next day's quests. The progress is put back
+between runs, outside the timing. Run from the repository root:
+
+    python tests/bench_rollover.py [--runs 5] [--users 100000]
+"""
+import argparse
+import sqlite3
+import tempfile
+import time
+from pathlib import Path
+
+from bench import report
+from database import Database
+from quests import get_random_quests, pack_quest_ids
+
+FIRST_DAY = 740000
+
+
+def seed(db, users):
+    conn = sqlite3.connect(db.db_name)
+    conn.executemany('INSERT INTO users (user_id, username, balance) VALUES (?, ?, 0)', ((user_id, f'user{user_id}') for user_id in range(1, users + 1)))
+    conn.executemany('INSERT INTO daily_assignments (user_id, day, quests) VALUES (?, ?, ?)',
+                     ((user_id, FIRST_DAY, pack_quest_ids([1, 2, 3, 4, 5])) for user_id in range(1, users + 1)))
+    conn.commit()
+    conn.close()
+
+
+def seed_progress(db, users):
+    """Two quests' progress and two mention set members per user"""
+    conn = sqlite3.connect(db.db_name)
+    conn.executemany('INSERT OR REPLACE INTO quest_progress (user_id, quest_id, progress, completed) VALUES (?, ?, 3, 0)',
+                     ((user_id, quest_id) for user_id in range(1, users + 1) for quest_id in (1, 2)))
+    conn.executemany('INSERT OR IGNORE INTO quest_sets (user_id, kind, member_id) VALUES (?, ?, ?)',
+                     ((user_id, 'mention', member_id) for user_id in range(1, users + 1) for member_id in (user_id + 1, user_id + 2)))
+    conn.commit()
+    conn.close()
+
+
+def measure(workdir, runs, users):
+    """Time `runs` rollovers of every user; returns {('rollover', f'{users} users'): [seconds]}"""
+    db = Database(str(Path(workdir) / 'rollover.db'))
+    try:
+        seed(db, users)
+        samples = []
+        for run in range(runs):
+            seed_progress(db, users)
+            day = FIRST_DAY + run + 1
+            started = time.perf_counter()
+            assigned = db.rollover_daily_quests(day, day - 7, lambda: [quest["id"] for quest in get_random_quests(5)])
+            samples.append(time.perf_counter() - started)
+            assert len(assigned) == users
+        return {('rollover', f'{users:,} users'): samples}
+    finally:
+        db.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=5, help='rollovers to time')
+    parser.add_argument('--users', type=int, default=100000, help='active users')
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as workdir:
+        report(measure(workdir, args.runs, args.users))
+
+
+if __name__ == '__main__':
+    main()
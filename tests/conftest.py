@@ -0,0 +1,48 @@
+import importlib
+import shutil
+import sys
+from pathlib import Path
+
+import pytest
+
+from database import Database
+
+ROOT = Path(__file__).resolve().parent.parent
+SHIPPED_DB = ROOT / 'minecraft_bot.db'
+
+
+@pytest.fixture
+def db(tmp_path):
+    """A Database on a fresh file, closed afterwards"""
+    database = Database(str(tmp_path / 'test.db'))
+    yield database
+    database.close()
+
+
+@pytest.fixture
+def shipped_db_path(tmp_path):
+    """Path to a copy of the minecraft_bot.db that ships with the repo"""
+    path = tmp_path / 'shipped.db'
+    shutil.copy(SHIPPED_DB, path)
+    return path
+
+
+@pytest.fixture
+def bot_module(tmp_path, monkeypatch):
+    """bot.py imported fresh, with its database in tmp_path and the XP rate limit off
+
+    bot.py opens minecraft_bot.db in the working directory when it is
+    imported, so every test gets its own module and database.
+    """
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setenv('XP_PER_MINUTE', '0')
+    sys.modules.pop('bot', None)
+    module = importlib.import_module('bot')
+
+    async def no_commands(message):
+        pass
+
+    module.bot.process_commands = no_commands
+    yield module
+    module.db.close()
+    sys.modules.pop('bot', None)
@@ -0,0 +1,108 @@
+"""Stand-ins for the few discord.py objects the handlers and commands touch"""
+import asyncio
+import itertools
+import time
+
+GUILD_ID = 1416285398942089371
+
+_ids = itertools.count(10**15)
+
+
+def embed_data(embed):
+    """An embed as plain data, for comparing what was sent"""
+    data = embed.to_dict()
+    data.pop('type', None)
+    return data
+
+
+class FakeAvatar:
+    url = 'https://cdn.example/avatar.png'
+
+
+class FakeUser:
+    def __init__(self, user_id, bot=False):
+        self.id = user_id
+        self.bot = bot
+        self.display_name = f'u{user_id}'
+        self.display_avatar = FakeAvatar()
+        self.mention = f'<@{user_id}>'
+
+    def __str__(self):
+        return f'user{self.id}'
+
+
+class FakeGuild:
+    def __init__(self, guild_id=GUILD_ID):
+        self.id = guild_id
+        self.name = 'Test Guild'
+
+
+class FakeMessage:
+    def __init__(self, author, content, channel, mentions=(), guild=None):
+        self.id = next(_ids)
+        self.author = author
+        self.content = content
+        self.channel = channel
+        self.mentions = list(mentions)
+        self.guild = guild
+
+
+class FakeChannel:
+    """Records every send as (monotonic time, kwargs)
+
+    `latency` is how long each send takes; `fail` is an exception raised
+    by every send after it is recorded.
+    """
+
+    def __init__(self, channel_id=None, latency=0.0, fail=None):
+        self.id = next(_ids) if channel_id is None else channel_id
+        self.latency = latency
+        self.fail = fail
+        self.sends = []
+
+    async def send(self, content=None, embed=None, embeds=None):
+        self.sends.append((time.monotonic(), {'content': content, 'embed': embed, 'embeds': embeds}))
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.fail:
+            raise self.fail
+        return FakeMessage(None, content, self)
+
+    def embeds(self):
+        """Every embed sent, in order, whether alone or in a batch"""
+        sent = []
+        for _, kwargs in self.sends:
+            if kwargs['embeds']:
+                sent.extend(kwargs['embeds'])
+            elif kwargs['embed'] is not None:
+                sent.append(kwargs['embed'])
+        return sent
+
+
+class FakeContext:
+    """A prefix-command context; each one gets its own channel unless given one"""
+
+    def __init__(self, author, channel=None, guild=None):
+        self.author = author
+        self.channel = channel or FakeChannel()
+        self.guild = guild or FakeGuild()
+        self.message = FakeMessage(author, '', self.channel, guild=self.guild)
+
+    async def send(self, content=None, embed=None):
+        return await self.channel.send(content=content, embed=embed)
+
+
+class FakeResponse:
+    def __init__(self):
+        self.sent = []
+
+    async def send_message(self, content=None, embed=None, ephemeral=False):
+        self.sent.append({'content': content, 'embed': embed, 'ephemeral': ephemeral})
+
+
+class FakeInteraction:
+    def __init__(self, user, channel=None, guild=None):
+        self.user = user
+        self.channel = channel or FakeChannel()
+        self.guild = guild or FakeGuild()
+        self.response = FakeResponse()
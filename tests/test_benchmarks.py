@@ -0,0 +1,44 @@
+"""Each bench_*.py script run at a tiny size, so they keep working as the code changes"""
+import bench_bulk
+import bench_connections
+import bench_emojis
+import bench_quests
+import bench_rankings
+import bench_rollover
+
+
+def test_bench_bulk(tmp_path):
+    timings = bench_bulk.measure(tmp_path, runs=1, users=30)
+    assert set(timings) == {(name, mode) for name, _ in bench_bulk.CALLS for mode in ('user list', 'guild', 'all users')}
+
+
+def test_bench_connections(tmp_path):
+    timings = bench_connections.measure(tmp_path, runs=5, users=20)
+    assert set(timings) == {(name, way) for name, _ in bench_connections.CALLS for way in ('per-call', 'pooled')}
+    assert all(len(samples) == 5 for samples in timings.values())
+
+
+def test_bench_quests_evaluators_agree():
+    hour = bench_quests.datetime.now().hour
+    for message, quests in bench_quests.corpus(200):
+        assert bench_quests.legacy(message, bench_quests.QUEST_POOL, {}) == bench_quests.matchers(message, bench_quests.QUEST_POOL, {}, hour)
+    timings = bench_quests.measure(messages=20)
+    assert set(timings) == {(name, way) for name in ('5 daily', 'whole pool') for way in ('if/elif', 'matchers')}
+
+
+def test_bench_emojis_counters_agree():
+    for _, text in bench_emojis.MESSAGES:
+        assert bench_emojis.count_emojis(text) == bench_emojis.scan_count(text)
+    timings = bench_emojis.measure(runs=3)
+    assert len(timings) == 2 * len(bench_emojis.MESSAGES)
+
+
+def test_bench_rankings(tmp_path):
+    timings, loaded = bench_rankings.measure(tmp_path, runs=5, users=50)
+    assert set(timings) == {(query, way) for query in ('top-10', 'rank', 'update') for way in ('sql', 'rankings')}
+    assert loaded > 0
+
+
+def test_bench_rollover(tmp_path):
+    timings = bench_rollover.measure(tmp_path, runs=2, users=30)
+    assert [len(samples) for samples in timings.values()] == [2]
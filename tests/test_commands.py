@@ -0,0 +1,36 @@
+import asyncio
+
+from bench_commands import COMMANDS, measure, seed
+from fakes import FakeContext, FakeInteraction, FakeUser, embed_data
+
+
+def test_prefix_and_slash_send_the_same_embeds(bot_module):
+    bot = bot_module
+    prefix = {command.name: command.callback for command in bot.bot.commands}
+    slash = {command.name: command.callback for command in bot.bot.tree.get_commands()}
+    user, other = FakeUser(1), FakeUser(2)
+    arguments = {name: build(other) for name, _, _, build in COMMANDS}
+
+    async def run():
+        await seed(bot)
+        # Message quests only, so the commands' own quest progress can't make the second reply differ
+        await bot.db.set_daily_quests(user.id, [1, 2, 3, 4, 5], bot.quest_rollover.current_day)
+        replies = {}
+        # The read-only commands; the rest depend on random draws or differ by design
+        for name in ('balance', 'profile', 'leaderboard', 'quests'):
+            ctx, interaction = FakeContext(user), FakeInteraction(user)
+            await prefix[name](ctx, *arguments[name])
+            await slash[name](interaction, *arguments[name])
+            replies[name] = ([embed_data(embed) for embed in ctx.channel.embeds()],
+                             [embed_data(sent['embed']) for sent in interaction.response.sent])
+        return replies
+
+    for name, (from_prefix, from_slash) in asyncio.run(run()).items():
+        assert len(from_prefix) == 1, name
+        assert from_prefix == from_slash, name
+
+
+def test_latency_harness_covers_every_command(bot_module):
+    timings = asyncio.run(measure(bot_module, runs=3))
+    assert set(timings) == {(name, front) for name, *_ in COMMANDS for front in ('prefix', 'slash')}
+    assert all(len(samples) == 3 for samples in timings.values())
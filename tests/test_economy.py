@@ -0,0 +1,137 @@
+"""Stress tests for the balance-changing calls under concurrency
+
+Several Database instances (one connection each, like separate processes)
+and an AsyncDatabase with hundreds of queued bets all hit the same users.
+A lost update would show up as coins appearing or vanishing: the final
+balances must equal the starting ones plus the net of every call that
+reported success, no balance may go negative, and the ledger must agree.
+"""
+import asyncio
+import random
+import threading
+
+from database import AsyncDatabase, Database
+
+USERS = range(1, 11)
+START = 1000
+
+
+def seed(path):
+    db = Database(path)
+    for user_id in USERS:
+        db.get_user(user_id, f'user{user_id}')
+        db.update_balance(user_id, START)
+    db.close()
+
+
+def random_call(db, rng):
+    """Make one random economy call; returns {user_id: change} for what it reported applying"""
+    user_id = rng.choice(USERS)
+    action = rng.randrange(3)
+    if action == 0:
+        stake = rng.randint(1, 400)
+        winnings = rng.choice([stake, -stake, stake * 2])
+        return {user_id: winnings} if db.settle_bet(user_id, stake, winnings) is not None else {}
+    if action == 1:
+        amount = rng.randint(1, 400)
+        return {user_id: -amount} if db.try_debit(user_id, amount) is not None else {}
+    receiver_id = rng.choice([other for other in USERS if other != user_id])
+    amount = rng.randint(1, 400)
+    return {user_id: -amount, receiver_id: amount} if db.transfer(user_id, receiver_id, amount) is not None else {}
+
+
+def add_changes(totals, changes):
+    for user_id, change in changes.items():
+        totals[user_id] = totals.get(user_id, 0) + change
+
+
+def check_books(path, applied):
+    db = Database(path)
+    try:
+        conn = db.get_connection()
+        balances = dict(conn.execute('SELECT user_id, balance FROM users').fetchall())
+        ledger = dict(conn.execute("SELECT user_id, SUM(amount) FROM transactions WHERE kind != 'adjust' GROUP BY user_id").fetchall())
+    finally:
+        db.close()
+    assert all(balance >= 0 for balance in balances.values())
+    assert balances == {user_id: START + applied.get(user_id, 0) for user_id in USERS}
+    assert {user_id: total for user_id, total in ledger.items() if total} == {user_id: total for user_id, total in applied.items() if total}
+
+
+def test_threads_with_their_own_connections_lose_no_updates(tmp_path):
+    path = str(tmp_path / 'economy.db')
+    seed(path)
+    threads_count, calls = 8, 300
+    barrier = threading.Barrier(threads_count)
+    results = [None] * threads_count
+    errors = []
+
+    def worker(index):
+        db = Database(path)
+        rng = random.Random(index)
+        applied = {}
+        try:
+            barrier.wait()
+            for _ in range(calls):
+                add_changes(applied, random_call(db, rng))
+            db.flush_transactions()
+        except Exception as e:
+            errors.append(e)
+        finally:
+            db.close()
+        results[index] = applied
+
+    workers = [threading.Thread(target=worker, args=(index,)) for index in range(threads_count)]
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+
+    assert errors == []
+    applied = {}
+    for result in results:
+        add_changes(applied, result)
+    # Enough calls must have gone through for this to test anything
+    assert sum(abs(change) for change in applied.values()) > START
+    check_books(path, applied)
+
+
+def test_concurrent_async_bets_lose_no_updates(tmp_path):
+    path = str(tmp_path / 'economy.db')
+    seed(path)
+    db = AsyncDatabase(Database(path))
+    rng = random.Random(7)
+
+    async def bet(user_id, stake, winnings):
+        if await db.settle_bet(user_id, stake, winnings) is not None:
+            return {user_id: winnings}
+        return {}
+
+    async def run():
+        calls = []
+        for _ in range(500):
+            stake = rng.randint(1, 300)
+            calls.append(bet(rng.choice(USERS), stake, rng.choice([stake, -stake])))
+        results = await asyncio.gather(*calls)
+        await db.flush_transactions()
+        return results
+
+    applied = {}
+    for changes in asyncio.run(run()):
+        add_changes(applied, changes)
+    db.close()
+    check_books(path, applied)
+
+
+def test_bulk_debit_stops_at_zero_and_leaves_negative_balances_alone(db):
+    for user_id, balance in ((1, 500), (2, 30), (3, 0), (4, -40)):
+        db.get_user(user_id, f'user{user_id}')
+        if balance:
+            db.update_balance(user_id, balance)
+    db.flush_transactions()
+    spent_before = dict(db.get_connection().execute('SELECT user_id, total_spent FROM users').fetchall())
+
+    result = db.bulk_adjust(-100, user_ids=[1, 2, 3, 4])
+    rows = db.get_connection().execute('SELECT user_id, balance, total_spent FROM users ORDER BY user_id').fetchall()
+    assert [(user_id, balance, spent - spent_before[user_id]) for user_id, balance, spent in rows] == [(1, 400, 100), (2, 0, 30), (3, 0, 0), (4, -40, 0)]
+    assert result['net'] == -130
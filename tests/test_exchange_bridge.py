@@ -0,0 +1,106 @@
+"""The exchange outbox, the HTTP bridge over it and the fake Minecraft-side consumer"""
+import asyncio
+import random
+import time
+
+import aiohttp
+
+from database import AsyncDatabase
+from exchange_bridge import ExchangeBridge
+from fake_mc_bridge import FakeBridgeConsumer
+
+TOKEN = 'secret'
+
+
+def undelivered(db):
+    return db.get_connection().execute('SELECT COUNT(*) FROM exchange_outbox WHERE delivered_at IS NULL').fetchone()[0]
+
+
+def seed(db, balance=1000):
+    db.get_user(1, 'user1')
+    db.update_balance(1, balance)
+
+
+def test_repeated_idempotency_key_debits_once(db):
+    seed(db)
+    assert db.queue_exchange('exchange-1', 1, 'user1', 7, 100, 1) == 900
+    assert db.queue_exchange('exchange-1', 1, 'user1', 7, 100, 1) == 900
+    assert db.queue_exchange('exchange-2', 1, 'user1', 7, 100, 1) == 800
+    db.flush_transactions()
+    conn = db.get_connection()
+    assert conn.execute('SELECT idempotency_key FROM exchange_outbox ORDER BY id').fetchall() == [('exchange-1',), ('exchange-2',)]
+    assert conn.execute("SELECT COUNT(*), SUM(amount) FROM transactions WHERE kind = 'exchange'").fetchone() == (2, -200)
+
+
+def test_unacknowledged_exchanges_are_leased_again_after_the_lease(db, monkeypatch):
+    seed(db)
+    for n in range(3):
+        db.queue_exchange(f'exchange-{n}', 1, 'user1', 7, 10, 1)
+    clock = [time.time()]
+    monkeypatch.setattr(time, 'time', lambda: clock[0])
+
+    first = db.lease_exchanges(10, lease_seconds=60)
+    assert [row[1] for row in first] == ['exchange-0', 'exchange-1', 'exchange-2']
+    assert db.ack_exchanges(['exchange-1']) == 1
+    clock[0] += 59
+    assert db.lease_exchanges(10, lease_seconds=60) == []
+    clock[0] += 1
+    again = db.lease_exchanges(10, lease_seconds=60)
+    # Same rows, second attempt; the acknowledged one stays delivered
+    assert [(row[1], row[-1]) for row in again] == [('exchange-0', 2), ('exchange-2', 2)]
+
+
+def test_bridge_rejects_bad_tokens_and_malformed_acks(db):
+    async def run():
+        async_db = AsyncDatabase(db)
+        bridge = await ExchangeBridge(async_db, port=0, token=TOKEN).start()
+        url = f'http://{bridge.host}:{bridge.port}'
+        good = {'Authorization': f'Bearer {TOKEN}'}
+        try:
+            async with aiohttp.ClientSession() as session:
+                statuses = []
+                for method, path, kwargs in (
+                    ('GET', '/exchanges', {}),
+                    ('GET', '/exchanges', {'headers': {'Authorization': 'Bearer wrong'}}),
+                    ('POST', '/exchanges/ack', {'json': {'keys': []}, 'headers': {'Authorization': 'Bearer wrong'}}),
+                    ('POST', '/exchanges/ack', {'data': 'not json', 'headers': good}),
+                    ('POST', '/exchanges/ack', {'json': {'ids': ['a']}, 'headers': good}),
+                    ('POST', '/exchanges/ack', {'json': {'keys': 'a'}, 'headers': good}),
+                    ('POST', '/exchanges/ack', {'json': {'keys': [1]}, 'headers': good}),
+                    ('POST', '/exchanges/ack', {'json': {'keys': []}, 'headers': good}),
+                ):
+                    async with session.request(method, url + path, **kwargs) as response:
+                        statuses.append(response.status)
+                return statuses
+        finally:
+            await bridge.close()
+
+    assert asyncio.run(run()) == [401, 401, 401, 400, 400, 400, 400, 200]
+
+
+def test_consumer_dropping_acks_applies_every_exchange_once(db, monkeypatch):
+    seed(db, balance=10**6)
+    keys = [f'exchange-{n}' for n in range(40)]
+    for key in keys:
+        db.queue_exchange(key, 1, 'user1', 7, 10, 1)
+    monkeypatch.setattr(random, 'random', random.Random(4).random)
+
+    async def run():
+        async_db = AsyncDatabase(db)
+        # Leases expire at once, so every dropped ack means a redelivery on the next pull
+        bridge = await ExchangeBridge(async_db, port=0, token=TOKEN, lease_seconds=0).start()
+        consumer = FakeBridgeConsumer(f'http://{bridge.host}:{bridge.port}', TOKEN, batch=7, drop_acks=0.5)
+        try:
+            async with aiohttp.ClientSession() as session:
+                for _ in range(100):
+                    await consumer.poll_once(session)
+                    if not undelivered(db):
+                        break
+        finally:
+            await bridge.close()
+        return consumer
+
+    consumer = asyncio.run(run())
+    assert sorted(consumer.applied) == sorted(keys)
+    assert consumer.duplicates > 0
+    assert undelivered(db) == 0
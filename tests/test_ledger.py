@@ -0,0 +1,89 @@
+import sqlite3
+from datetime import date
+
+import pytest
+
+NOW = 1_800_000_000
+
+
+def ledger(path, table='transactions'):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute(f'SELECT id, ts, user_id, kind, amount, wager FROM {table} ORDER BY id').fetchall()
+    finally:
+        conn.close()
+
+
+def record(db, *amounts, ts=NOW - 100):
+    db.pending_transactions.extend((ts, 1, 'adjust', amount, 0) for amount in amounts)
+    db.flush_transactions()
+
+
+def test_archived_ids_are_not_reused(db, tmp_path):
+    archive = str(tmp_path / 'archive.db')
+    record(db, 1, 2, 3)
+    assert db.archive_transactions(NOW, archive) == 3
+    # Every live row is gone; a plain INTEGER PRIMARY KEY would hand out id 1 again
+    record(db, 4)
+    assert [row[0] for row in ledger(db.db_name)] == [4]
+    assert db.archive_transactions(NOW, archive) == 1
+    assert [row[4] for row in ledger(archive)] == [1, 2, 3, 4]
+
+
+def test_archive_refuses_to_drop_rows_whose_id_is_taken(db, tmp_path):
+    archive = str(tmp_path / 'archive.db')
+    record(db, 1)
+    db.archive_transactions(NOW, archive)
+    # A different row already archived under the next id, as an older schema could leave
+    conn = sqlite3.connect(archive)
+    conn.execute("INSERT INTO transactions (id, ts, user_id, kind, amount, wager) VALUES (2, 0, 9, 'bet', 50, 50)")
+    conn.commit()
+    conn.close()
+
+    record(db, 7)
+    with pytest.raises(sqlite3.IntegrityError):
+        db.archive_transactions(NOW, archive)
+    assert [row[4] for row in ledger(db.db_name)] == [7]
+    assert [row[4] for row in ledger(archive)] == [1, 50]
+
+
+def test_interrupted_archive_run_can_be_repeated(db, tmp_path):
+    archive = str(tmp_path / 'archive.db')
+    record(db, 1, 2)
+    db.archive_transactions(NOW, archive, limit=1)
+    archived = ledger(archive)
+    record(db, 3)
+    # As if the copy committed but the delete didn't
+    rows = ledger(db.db_name)
+    conn = sqlite3.connect(archive)
+    conn.executemany('INSERT INTO transactions (id, ts, user_id, kind, amount, wager) VALUES (?, ?, ?, ?, ?, ?)', rows[:1])
+    conn.commit()
+    conn.close()
+
+    assert db.archive_transactions(NOW, archive) == 2
+    assert ledger(archive) == archived + rows
+    assert ledger(db.db_name) == []
+
+
+def test_totals_past_the_integer_range_still_add_up(db):
+    big = 5 * 10**18
+    conn = db.get_connection()
+    conn.executemany('INSERT INTO transaction_rollups (day, kind, user_id, entries, earned, spent, wagered) VALUES (?, ?, ?, 1, ?, ?, ?)',
+                     [(day, 'coinflip', user_id, big, big, big) for day in (100, 101) for user_id in (0, 1)]
+                     + [(100, 'slots', 0, big, big, big)])
+    conn.commit()
+
+    assert db.get_earnings(1, 100) == (2 * big, 2 * big)
+    stats = db.get_house_stats(100)
+    assert stats['wagered'] == 2 * big
+    assert stats['house_profit'] == 0
+
+
+def test_capped_rollups_are_reported(db, capsys):
+    day = date.fromtimestamp(NOW - 100).toordinal()
+    record(db, db.MAX_INTEGER - 5)
+    assert capsys.readouterr().out == ''
+    record(db, 10)
+    assert 'capped' in capsys.readouterr().out
+    earned = db.get_connection().execute('SELECT earned FROM transaction_rollups WHERE day = ? AND user_id = 1', (day,)).fetchone()[0]
+    assert earned == db.MAX_INTEGER
@@ -0,0 +1,62 @@
+"""level_up() against the one-level-at-a-time loop it replaced"""
+import random
+
+import pytest
+
+from leveling import BAR_WIDTH, level_floor, level_for_total, level_up, progress_bar, xp_needed
+
+
+def loop_level_up(current_level, current_xp, xp_amount):
+    """The original Database.calculate_level_up"""
+    new_xp = current_xp + xp_amount
+    leveled_up = False
+    coins_earned = 0
+    while new_xp >= current_level * 100:
+        new_xp -= current_level * 100
+        current_level += 1
+        leveled_up = True
+        coins_earned += current_level * 1000
+    return {
+        'leveled_up': leveled_up,
+        'new_level': current_level,
+        'new_xp': new_xp,
+        'xp_needed': current_level * 100,
+        'coins_earned': coins_earned
+    }
+
+
+def test_matches_the_loop_on_a_grid():
+    for level in range(0, 30):
+        needed = level * 100
+        for xp in range(-150, needed + 1, 7):
+            grants = {0, 1, 99, 100, 101, 5000, needed - xp, needed - xp - 1, needed - xp + 1}
+            for grant in grants:
+                if grant >= 0:
+                    assert level_up(level, xp, grant) == loop_level_up(level, xp, grant), (level, xp, grant)
+
+
+def test_matches_the_loop_on_random_cases():
+    rng = random.Random(21)
+    for _ in range(20000):
+        level = rng.randint(1, 3000)
+        xp = rng.randint(0, xp_needed(level) - 1)
+        grant = rng.choice([rng.randint(0, 1000), rng.randint(0, 10**6), rng.randint(0, 10**7)])
+        assert level_up(level, xp, grant) == loop_level_up(level, xp, grant), (level, xp, grant)
+
+
+@pytest.mark.parametrize('level', [1, 2, 3, 10, 999, 1000, 123456, 10**9, 10**12])
+def test_level_for_total_is_exact_at_thresholds(level):
+    floor = level_floor(level)
+    assert level_for_total(floor) == level
+    assert level_for_total(floor + xp_needed(level) - 1) == level
+    if level > 1:
+        assert level_for_total(floor - 1) == level - 1
+
+
+def test_progress_bar():
+    assert progress_bar(1, 0) == '▱' * BAR_WIDTH
+    assert progress_bar(1, 50) == '▰' * 5 + '▱' * 5
+    assert progress_bar(1, 99) == '▰' * 9 + '▱'
+    assert progress_bar(2, 500) == '▰' * BAR_WIDTH
+    assert progress_bar(3, -20) == '▱' * BAR_WIDTH
+    assert progress_bar(0, 10) == '▱' * BAR_WIDTH
@@ -0,0 +1,283 @@
+"""Differential test for on_message against the handler it replaced
+
+The reference below is the pre-batching handler: one Database call per
+step (get_user, add_xp, get_daily_quests, then get_quest_progress,
+update_quest_progress and update_balance per quest) and the original
+if/elif quest chain. Deliberate changes since then are applied to it too:
+quest days instead of a rolling 24 hours (daily quest rollover) and '☺️'
+counting as one emoji. The same random message stream goes through both,
+and the tables and notifications they produce must match.
+"""
+import asyncio
+import random
+import sqlite3
+from datetime import datetime
+
+import discord
+
+from database import Database
+from quests import get_random_quests, get_quest_by_id
+from fakes import GUILD_ID, FakeChannel, FakeGuild, FakeMessage, FakeUser, embed_data
+
+WORDS = ['hi', 'hello', 'gg', 'lol', 'minecraft', 'mine', 'build', 'farm', 'thanks', 'ty', '?', '!', 'https://x.y',
+         'cbd', 'nice', '😀', '☺️', 'welcome', 'craft', 'explore', 'ip', 'pvp', 'trade', 'haha', 'a' * 60, 'b' * 120]
+EMOJIS = "😀😁😂🤣😃😄😅😆😉😊😋😎😍😘🥰😗😙😚☺️🙂🤗🤩🤔🤨😐😑😶🙄😏😣😥😮🤐😯😪😫🥱😴😌😛😜😝🤤😒😓😔😕🙃🤑😲☹️🙁😖😞😟😤😢😭😦😧😨😩🤯😬😰😱🥵🥶😳🤪😵😡😠🤬😷🤒🤕🤢🤮🤧😇🤠🤡🤥🤫🤭🧐🤓"
+KEYWORDS = {
+    "greeting": ["hi", "hello", "hey"],
+    "gg": ["gg"],
+    "laugh": ["lol", "lmao", "haha", "hehe"],
+    "thanks": ["thanks", "thank you", "thx", "ty"],
+    "welcome": ["welcome"],
+    "minecraft": ["minecraft"],
+    "build": ["build", "building"],
+    "mine": ["mine", "mining"],
+    "fight": ["pvp", "fight", "fighting"],
+    "trade": ["trade", "trading"],
+    "explore": ["explore", "adventure"],
+    "craft": ["craft", "crafting"],
+    "farm": ["farm", "farming"],
+    "positive": ["awesome", "great", "nice", "good", "amazing", "fantastic", "wonderful", "excellent", "perfect", "lovely"],
+}
+
+
+def level_up_embed(message, xp_result):
+    embed = discord.Embed(
+        title="🎊 LEVEL UP! 🎊",
+        description=f"**{message.author.display_name}** reached **Level {xp_result['new_level']}**!",
+        color=discord.Color.purple()
+    )
+    embed.add_field(name="💰 Reward", value=f"+{xp_result['coins_earned']:,} coins!", inline=True)
+    embed.add_field(name="📊 Next Level", value=f"{xp_result['new_xp']}/{xp_result['xp_needed']} XP", inline=True)
+    embed.set_thumbnail(url=message.author.display_avatar.url)
+    embed.set_footer(text="Keep chatting to level up!")
+    return embed
+
+
+def ip_embed(settings):
+    embed = discord.Embed(title="🎮 Minecraft Server Info", description="Join our server with these details:", color=discord.Color.green())
+    embed.add_field(name="🌐 Server IP", value=f"`{settings.server_ip}`", inline=False)
+    embed.add_field(name="🔌 Port", value=f"`{settings.server_port or 'Default'}`", inline=False)
+    embed.set_footer(text="See you in game!")
+    return embed
+
+
+def quest_embed(quest, username):
+    embed = discord.Embed(title="🎉 Quest Completed!", description=f"**{quest['emoji']} {quest['name']}**\n{quest['description']}", color=discord.Color.gold())
+    embed.add_field(name="💰 Reward", value=f"+{quest['reward']} coins", inline=False)
+    embed.set_footer(text=f"Great job, {username}!")
+    return embed
+
+
+def secret_embed(progress, username):
+    embed = discord.Embed(
+        title="🎊 SECRET QUEST UNLOCKED! 🎊",
+        description="**🌿 The CBD Master**\nYou discovered and completed the secret quest!",
+        color=discord.Color.purple()
+    )
+    embed.add_field(name="💰 Secret Reward", value="+1,000,000,000 coins! (1 BILLION!)", inline=False)
+    embed.add_field(name="📊 Progress", value=f"You typed 'cbd' {progress} times!", inline=False)
+    embed.set_footer(text=f"Congratulations, {username}! You're one of the few who knows...")
+    return embed
+
+
+def legacy_progress(quest, progress, message, content, trackers):
+    user_id = message.author.id
+    kind = quest["type"]
+    if kind == "chat":
+        return progress + 1
+    if kind in KEYWORDS:
+        return progress + 1 if any(word in content for word in KEYWORDS[kind]) else progress
+    if kind == "mention":
+        if not message.mentions:
+            return progress
+        mentioned = trackers.setdefault(("mention", user_id), set())
+        mentioned.update(mention.id for mention in message.mentions)
+        return len(mentioned)
+    if kind == "emoji":
+        return progress + sum(1 for char in message.content if char in EMOJIS and char != "️")
+    if kind == "question":
+        return progress + 1 if "?" in message.content else progress
+    if kind == "exclamation":
+        return progress + 1 if "!" in message.content else progress
+    if kind == "long_message":
+        return progress + 1 if len(message.content) >= 100 else progress
+    if kind == "early_bird":
+        return 1 if datetime.now().hour < 8 else progress
+    if kind == "night_owl":
+        return 1 if datetime.now().hour >= 22 else progress
+    if kind == "different_channels":
+        channels = trackers.setdefault(("channels", user_id), set())
+        channels.add(message.channel.id)
+        return len(channels)
+    if kind == "links":
+        return progress + 1 if "http://" in message.content or "https://" in message.content else progress
+    if kind == "short_message":
+        return progress + 1 if len(message.content) < 20 else progress
+    if kind == "medium_message":
+        return progress + 1 if 50 <= len(message.content) < 100 else progress
+    return progress
+
+
+def legacy_on_message(db, message, current_day, trackers, sent):
+    """The handler as it was before batching, one database call per step"""
+    user_id = message.author.id
+    username = str(message.author)
+    content = message.content.lower()
+    notify = lambda embed: sent.append((message.channel.id, user_id, embed_data(embed)))
+
+    db.get_user(user_id, username)
+    xp_result = db.add_xp(user_id, 1 + len({mention.id for mention in message.mentions}))
+    if xp_result and xp_result['leveled_up']:
+        notify(level_up_embed(message, xp_result))
+
+    if "ip" in content.split() or "server ip" in content or "what's the ip" in content or "whats the ip" in content:
+        settings = db.get_server_settings(message.guild.id)
+        if settings and settings.server_ip:
+            notify(ip_embed(settings))
+            return
+
+    quests, day = db.get_daily_quests(user_id)
+    if day < current_day:
+        db.reset_quest_progress(user_id)
+        quests = [q["id"] for q in get_random_quests(5)]
+        db.set_daily_quests(user_id, quests, current_day)
+        trackers.pop(("mention", user_id), None)
+        trackers.pop(("channels", user_id), None)
+
+    for quest_id in quests:
+        quest = get_quest_by_id(quest_id)
+        progress, completed = db.get_quest_progress(user_id, quest_id)
+        if completed:
+            continue
+        new_progress = legacy_progress(quest, progress, message, content, trackers)
+        if new_progress >= quest["target"]:
+            db.update_quest_progress(user_id, quest_id, new_progress, 1)
+            db.update_balance(user_id, quest["reward"])
+            notify(quest_embed(quest, username))
+        elif new_progress != progress:
+            db.update_quest_progress(user_id, quest_id, new_progress, 0)
+
+    if "cbd" in content:
+        progress, completed = db.get_quest_progress(user_id, 999)
+        if not completed:
+            progress += 1
+            if progress >= 100:
+                db.update_quest_progress(user_id, 999, progress, 1)
+                db.update_balance(user_id, 1000000000)
+                notify(secret_embed(progress, username))
+            else:
+                db.update_quest_progress(user_id, 999, progress, 0)
+
+
+def message_stream(count, seed):
+    """Random chatter from 15 users over 12 channels, plus one user who spams 'cbd'"""
+    rng = random.Random(seed)
+    guild = FakeGuild()
+    channels = {channel_id: FakeChannel(channel_id) for channel_id in range(1, 13)}
+    for i in range(count):
+        if i % 20 == 0:
+            yield FakeMessage(FakeUser(99), 'cbd cbd', channels[1], guild=guild)
+            continue
+        content = ' '.join(rng.choice(WORDS) for _ in range(rng.randint(1, 4)))
+        mentions = [FakeUser(rng.randint(1, 30)) for _ in range(rng.randint(0, 2))]
+        yield FakeMessage(FakeUser(rng.randint(1, 15)), content, channels[rng.randint(1, 12)], mentions, guild)
+
+
+def table_rows(path):
+    conn = sqlite3.connect(path)
+    try:
+        users = conn.execute('SELECT user_id, username, balance, total_earned, total_spent, level, xp FROM users ORDER BY user_id').fetchall()
+        progress = conn.execute('SELECT * FROM quest_progress ORDER BY user_id, quest_id').fetchall()
+        return users, progress
+    finally:
+        conn.close()
+
+
+def test_on_message_matches_the_unbatched_handler(bot_module, tmp_path):
+    bot = bot_module
+    count = 3000
+    current_day = bot.quest_rollover.current_day
+
+    legacy_sent = []
+    legacy_db = Database(str(tmp_path / 'legacy.db'))
+    legacy_db.set_server_settings(GUILD_ID, server_ip='mc.example.net', server_port=25565)
+    random.seed(42)
+    trackers = {}
+    for message in message_stream(count, seed=5):
+        legacy_on_message(legacy_db, message, current_day, trackers, legacy_sent)
+    legacy_db.close()
+
+    sent = []
+    bot.send_queue.notify = lambda channel, user_id, embed: sent.append((channel.id, user_id, embed_data(embed)))
+
+    async def replay():
+        await bot.db.set_server_settings(GUILD_ID, server_ip='mc.example.net', server_port=25565)
+        random.seed(42)
+        for message in message_stream(count, seed=5):
+            await bot.on_message(message)
+        await bot.progress_cache.flush()
+
+    asyncio.run(replay())
+
+    users, progress = table_rows(tmp_path / 'minecraft_bot.db')
+    assert (users, progress) == table_rows(tmp_path / 'legacy.db')
+    assert sent == legacy_sent
+    # The stream has to reach the interesting paths for the comparison to mean much
+    titles = {embed['title'] for _, _, embed in sent}
+    assert {"🎊 LEVEL UP! 🎊", "🎮 Minecraft Server Info", "🎉 Quest Completed!", "🎊 SECRET QUEST UNLOCKED! 🎊"} <= titles
+
+
+def test_spam_past_the_xp_rate_never_reaches_the_database(bot_module):
+    bot = bot_module
+    bot.XP_PER_MINUTE, bot.XP_BURST = 12, 6
+    bot.send_queue.notify = lambda channel, user_id, embed: None
+    calls = []
+    submit = bot.db._executor.submit
+    bot.db._executor.submit = lambda call, *args: (calls.append(call.func.__name__), submit(call, *args))[1]
+    guild, channel = FakeGuild(), FakeChannel(1)
+
+    async def burst(user_ids, per_user):
+        """Database calls made while each user sends `per_user` messages as fast as possible"""
+        calls.clear()
+        # Both groups get the same daily quests, so they complete the same ones
+        random.seed(24)
+        for _ in range(per_user):
+            for user_id in user_ids:
+                await bot.on_message(FakeMessage(FakeUser(user_id), 'hi gg lol', channel, guild=guild))
+        await bot.progress_cache.flush()
+        return list(calls)
+
+    async def run():
+        return await burst(range(1, 21), 10), await burst(range(21, 41), 1000)
+
+    light, heavy = asyncio.run(run())
+    # 100 times the messages, the same database work
+    assert sorted(heavy) == sorted(light)
+    xp = dict(bot.db.database.get_connection().execute('SELECT user_id, xp FROM users WHERE user_id > 20').fetchall())
+    # The burst allowance, plus at most a token refilled while the test ran
+    assert len(xp) == 20 and all(bot.XP_BURST <= value <= bot.XP_BURST + 1 for value in xp.values())
+    assert bot.event_filter.stats()['skipped'] >= 20 * (1000 - bot.XP_BURST - 1)
+
+
+def test_ip_requests_are_answered_the_same_way_in_filtered_channels(bot_module):
+    bot = bot_module
+    sent, commands = [], []
+    bot.send_queue.notify = lambda channel, user_id, embed: sent.append((channel.id, embed.title))
+
+    async def process_commands(message):
+        commands.append((message.channel.id, message.content))
+
+    bot.bot.process_commands = process_commands
+    guild = FakeGuild()
+
+    async def run():
+        await bot.db.set_server_settings(GUILD_ID, server_ip='mc.example.net', server_port=25565)
+        await bot.db.set_channel_rule(GUILD_ID, 2, 'ignore')
+        for channel_id in (1, 2):
+            await bot.on_message(FakeMessage(FakeUser(5), 'whats the ip', FakeChannel(channel_id), guild=guild))
+            await bot.on_message(FakeMessage(FakeUser(5), '!balance', FakeChannel(channel_id), guild=guild))
+        await bot.progress_cache.flush()
+
+    asyncio.run(run())
+    assert sent == [(1, "🎮 Minecraft Server Info"), (2, "🎮 Minecraft Server Info")]
+    assert commands == [(1, '!balance'), (2, '!balance')]
@@ -0,0 +1,57 @@
+import sqlite3
+from datetime import datetime
+
+from database import Database
+from migrations import LATEST_VERSION, migrate
+from quests import unpack_quest_ids
+
+
+def schema(conn):
+    """Every table's columns and every index, in a form that ignores how the SQL was written"""
+    tables = {}
+    for (name,) in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name NOT LIKE 'sqlite_%' ORDER BY name"):
+        tables[name] = conn.execute(f'PRAGMA table_info({name})').fetchall()
+    indexes = {}
+    for name, table in conn.execute("SELECT name, tbl_name FROM sqlite_master WHERE type = 'index' AND name NOT LIKE 'sqlite_%'"):
+        indexes[name] = (table, conn.execute(f'PRAGMA index_xinfo({name})').fetchall())
+    return tables, indexes
+
+
+def test_shipped_database_migrates_to_the_fresh_schema(shipped_db_path, tmp_path):
+    conn = sqlite3.connect(shipped_db_path)
+    assert conn.execute('PRAGMA user_version').fetchone()[0] == 0
+    applied = migrate(conn)
+    assert [number for number, _ in applied] == list(range(1, LATEST_VERSION + 1))
+    assert conn.execute('PRAGMA user_version').fetchone()[0] == LATEST_VERSION
+
+    fresh = sqlite3.connect(tmp_path / 'fresh.db')
+    migrate(fresh)
+    assert schema(conn) == schema(fresh)
+    # Running it again is a no-op
+    assert migrate(conn) == []
+    conn.close()
+    fresh.close()
+
+
+def test_json_quest_lists_move_to_daily_assignments(shipped_db_path):
+    conn = sqlite3.connect(shipped_db_path)
+    before = conn.execute('SELECT user_id, daily_quests, last_quest_reset FROM users ORDER BY user_id').fetchall()
+    migrate(conn)
+
+    assignments = conn.execute('SELECT user_id, day, quests FROM daily_assignments ORDER BY user_id').fetchall()
+    assert [(user_id, day, unpack_quest_ids(quests)) for user_id, day, quests in assignments] == [
+        (1358586510831652864, datetime(2025, 11, 9).toordinal(), [10, 35, 32, 31, 6]),
+        (1364461650840911983, datetime(2025, 11, 9).toordinal(), [30, 33, 17, 8, 31]),
+    ]
+    assert [user_id for user_id, _, _ in before] == [user_id for user_id, _, _ in assignments]
+    assert conn.execute('SELECT COUNT(*) FROM users WHERE daily_quests IS NOT NULL').fetchone()[0] == 0
+    conn.close()
+
+
+def test_database_opens_the_shipped_file(shipped_db_path):
+    db = Database(str(shipped_db_path))
+    try:
+        assert db.get_daily_quests(1364461650840911983) == ([30, 33, 17, 8, 31], datetime(2025, 11, 9).toordinal())
+        assert db.get_quest_progress(1364461650840911983, 999) == (100, 1)
+    finally:
+        db.close()
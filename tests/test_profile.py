@@ -0,0 +1,23 @@
+from database import Database
+
+
+def test_profile_counts_only_assigned_quests(shipped_db_path):
+    db = Database(str(shipped_db_path))
+    try:
+        # Completed 17, 30, 31 and 33 from today's five, plus the secret quest 999
+        assert db.get_profile(1364461650840911983, 'user')['completed'] == 4
+        assert db.get_profile(1358586510831652864, 'user')['completed'] == 4
+    finally:
+        db.close()
+
+
+def test_profile_ignores_quests_from_earlier_assignments(db):
+    db.get_user(1, 'user1')
+    db.update_quest_progress(1, 40, 5, 1)
+    db.set_daily_quests(1, [10, 11, 12], 700000)
+    db.update_quest_progress(1, 11, 3, 1)
+    db.update_quest_progress(1, 12, 1, 0)
+    profile = db.get_profile(1, 'user1')
+    assert (profile['day'], profile['completed']) == (700000, 1)
+
+    assert db.get_profile(2, 'user2')['completed'] == 0
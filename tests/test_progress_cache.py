@@ -0,0 +1,71 @@
+"""ProgressCache against a real database behind a minimal async facade"""
+import asyncio
+
+from progress_cache import ProgressCache
+
+
+class FlakyDatabase:
+    """Awaitable Database calls on the loop thread; save_progress raises `failures` times"""
+
+    def __init__(self, database, failures=0):
+        self.database = database
+        self.failures = failures
+
+    async def get_message_state(self, user_id, username):
+        return self.database.get_message_state(user_id, username)
+
+    async def save_progress(self, **rows):
+        if self.failures:
+            self.failures -= 1
+            raise RuntimeError('database is locked')
+        self.database.save_progress(**rows)
+
+
+def stored(db, user_id):
+    conn = db.get_connection()
+    balance, level = conn.execute('SELECT balance, level FROM users WHERE user_id = ?', (user_id,)).fetchone()
+    progress = dict((quest_id, (progress, completed)) for quest_id, progress, completed
+                    in conn.execute('SELECT quest_id, progress, completed FROM quest_progress WHERE user_id = ?', (user_id,)))
+    day, = conn.execute('SELECT day FROM daily_assignments WHERE user_id = ?', (user_id,)).fetchone() or (None,)
+    return balance, level, progress, day
+
+
+def test_failed_write_through_is_retried_by_the_next_flush(db):
+    async def run():
+        cache = ProgressCache(FlakyDatabase(db, failures=1))
+        await cache.apply(1, 'user1', evaluate=lambda state: {'new_quests': [3, 4], 'day': 20000, 'reset': True})
+        await cache.flush()
+        await cache.apply(1, 'user1', evaluate=lambda state: {'updates': [(3, 5, 0, 0)]})
+        await cache.flush()
+
+        cache.db.failures = 1
+        await cache.apply(1, 'user1', evaluate=lambda state: {'updates': [(3, 10, 1, 50)]})
+        # The completion is cached but not stored, and nothing was dropped
+        assert cache.peek(1)['progress'] == {3: (10, 1)}
+        assert stored(db, 1) == (0, 1, {3: (5, 0)}, 20000)
+        assert cache.window()['dirty_users'] == 1
+        await cache.flush()
+        return cache
+
+    cache = asyncio.run(run())
+    assert stored(db, 1) == (50, 1, {3: (10, 1)}, 20000)
+    assert cache.window()['dirty_rows'] == 0
+
+
+def test_failed_assignment_keeps_its_reset_until_written(db):
+    async def run():
+        cache = ProgressCache(FlakyDatabase(db))
+        await cache.apply(1, 'user1', evaluate=lambda state: {'new_quests': [3], 'day': 20000})
+        await cache.apply(1, 'user1', evaluate=lambda state: {'updates': [(3, 4, 0, 0)]})
+        await cache.flush()
+
+        cache.db.failures = 2
+        await cache.apply(1, 'user1', evaluate=lambda state: {'new_quests': [5], 'day': 20001, 'reset': True})
+        try:
+            await cache.flush()
+        except RuntimeError:
+            pass
+        await cache.flush()
+
+    asyncio.run(run())
+    assert stored(db, 1) == (0, 1, {}, 20001)
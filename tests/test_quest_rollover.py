@@ -0,0 +1,78 @@
+"""DailyRollover and ProgressCache.apply_rollover() against a real database"""
+import asyncio
+from datetime import datetime, timedelta
+
+from database import AsyncDatabase
+from progress_cache import ProgressCache
+from quest_rollover import DailyRollover
+
+
+def quest_rows(db, user_id):
+    conn = db.get_connection()
+    progress = conn.execute('SELECT quest_id, progress FROM quest_progress WHERE user_id = ?', (user_id,)).fetchall()
+    sets = conn.execute('SELECT kind, member_id FROM quest_sets WHERE user_id = ?', (user_id,)).fetchall()
+    return progress, sets
+
+
+def seed(db, day):
+    # 1 and 2 were active yesterday, 3 last played ten days ago
+    for user_id, assigned in ((1, day - 1), (2, day - 1), (3, day - 10)):
+        db.get_message_state(user_id, f'user{user_id}')
+        db.set_daily_quests(user_id, [1, 2, 3, 4, 5], assigned)
+        db.save_progress(quest_rows=[(user_id, 1, 4, 0)], set_rows=[(user_id, 'mention', 40 + user_id)])
+
+
+def test_day_starts_at_the_reset_hour():
+    rollover = DailyRollover(None, None, reset_hour=6)
+    assert rollover.day_start(datetime(2024, 3, 10, 5, 59)) == datetime(2024, 3, 9, 6)
+    assert rollover.day_start(datetime(2024, 3, 10, 6, 0)) == datetime(2024, 3, 10, 6)
+    assert rollover.day_start(datetime(2024, 3, 10, 23, 0)) == datetime(2024, 3, 10, 6)
+
+
+def test_run_rolls_over_active_users_only(db):
+    rollover = DailyRollover(None, None, active_days=7)
+    day_start = rollover.current_start + timedelta(days=1)
+    day = day_start.toordinal()
+    seed(db, day)
+    async_db = AsyncDatabase(db)
+
+    async def run():
+        cache = ProgressCache(async_db)
+        rollover.db, rollover.progress_cache = async_db, cache
+        # User 1 is cached with unsaved progress from the old day
+        await cache.apply(1, 'user1', evaluate=lambda state: {'updates': [(2, 1, 0, 0)]})
+        users = await rollover.run(day_start)
+        await cache.flush()
+        return cache, users
+
+    cache, users = asyncio.run(run())
+    assert users == 2
+    assert rollover.current_day == day and rollover.last_run['users'] == 2
+    for user_id in (1, 2):
+        quests, assigned = db.get_daily_quests(user_id)
+        assert assigned == day and len(quests) == 5
+        assert quest_rows(db, user_id) == ([], [])
+    assert db.get_daily_quests(3)[1] == day - 10
+    assert quest_rows(db, 3) == ([(1, 4)], [('mention', 43)])
+    state = cache.peek(1)
+    assert state['day'] == day and state['quests'] == db.get_daily_quests(1)[0] and state['progress'] == {}
+
+
+def test_apply_rollover_drops_old_day_rows_of_cached_users(db):
+    day = datetime.now().toordinal() + 1
+    seed(db, day)
+    async_db = AsyncDatabase(db)
+
+    async def run():
+        cache = ProgressCache(async_db)
+        await cache.apply(1, 'user1', evaluate=lambda state: {'updates': [(2, 3, 0, 0)], 'set_members': [('mention', 77)]})
+        # The rollover lands while those rows are still unsaved
+        assigned = await async_db.rollover_daily_quests(day, day - 7, lambda: [6, 7, 8, 9, 10])
+        cache.apply_rollover(assigned, day)
+        await cache.flush()
+        return cache
+
+    cache = asyncio.run(run())
+    assert quest_rows(db, 1) == ([], [])
+    assert cache.peek(1)['quests'] == [6, 7, 8, 9, 10]
+    assert cache.window()['dirty_rows'] == 0
@@ -0,0 +1,11 @@
+from quests import count_emojis
+
+
+def test_emojis_with_a_variation_selector_count_once():
+    assert count_emojis('☺️') == 1
+    assert count_emojis('☹️') == 1
+    assert count_emojis('hi ☺️☹️ 😀') == 3
+    # The bare codepoints count too, and a stray selector counts for nothing
+    assert count_emojis('☺☹') == 2
+    assert count_emojis('️') == 0
+    assert count_emojis('plain ascii :)') == 0
@@ -0,0 +1,97 @@
+import random
+
+import pytest
+
+from leaderboard import Leaderboard
+
+GUILD = 7
+
+
+def sql_board(db, guild_id, sort_by):
+    order = 'u.balance DESC, u.user_id' if sort_by == 'balance' else 'u.level DESC, u.xp DESC, u.user_id'
+    where = '' if guild_id is None else 'JOIN guild_members m ON m.user_id = u.user_id AND m.guild_id = ?'
+    params = () if guild_id is None else (guild_id,)
+    return db.get_connection().execute(f'SELECT u.user_id, u.username, u.balance, u.level, u.xp FROM users u {where} ORDER BY {order}', params).fetchall()
+
+
+def board(db, guild_id, sort_by):
+    return db.get_leaderboard(guild_id, limit=10**6, sort_by=sort_by)
+
+
+@pytest.fixture
+def populated(db):
+    rng = random.Random(1)
+    conn = db.get_connection()
+    conn.executemany('INSERT INTO users (user_id, username, balance, level, xp) VALUES (?, ?, ?, ?, ?)',
+                     [(user_id, f'u{user_id}', rng.randint(0, 50), rng.randint(1, 5), rng.randint(0, 99)) for user_id in range(1, 301)])
+    conn.executemany('INSERT INTO guild_members (guild_id, user_id) VALUES (?, ?)', [(GUILD, user_id) for user_id in range(1, 301, 2)])
+    conn.commit()
+    db.RANKINGS_CHUNK = 16
+    return db
+
+
+@pytest.mark.parametrize('guild_id', [None, GUILD])
+@pytest.mark.parametrize('sort_by', ['balance', 'level'])
+def test_chunked_load_matches_sql_order(populated, guild_id, sort_by):
+    assert board(populated, guild_id, sort_by) == sql_board(populated, guild_id, sort_by)
+
+
+def test_load_takes_bounded_steps(populated):
+    steps = 1
+    while not populated.load_rankings_step(GUILD):
+        steps += 1
+    # 150 members: 10 reading steps (the last one short) and 10 merging steps
+    assert steps == 20
+    assert populated.get_rank(GUILD, 1)[1] == 150
+
+
+def test_writes_between_steps_reach_the_finished_boards(populated):
+    db = populated
+    for _ in range(5):
+        assert not db.load_rankings_step(GUILD)
+    # 80 members read so far, up to user 159
+    db.update_balance(3, 1000)
+    db.update_balance(299, 500)
+    db.add_xp(5, 10_000)
+    db.transfer(7, 9, 1)
+    db.remove_guild_member(GUILD, 11)
+    db.remove_guild_member(GUILD, 201)
+    db.add_guild_member(GUILD, 4)
+    db.add_guild_member(GUILD, 250)
+    db.bulk_adjust(3, user_ids=[13, 15, 271])
+    while not db.load_rankings_step(GUILD):
+        pass
+    for sort_by in ('balance', 'level'):
+        assert board(db, GUILD, sort_by) == sql_board(db, GUILD, sort_by)
+    members = {row[0] for row in board(db, GUILD, 'balance')}
+    assert 4 in members and 250 in members and 11 not in members and 201 not in members
+
+
+def test_sync_adds_missing_members_to_loaded_boards(populated):
+    db = populated
+    board(db, GUILD, 'balance')
+    db.sync_guild_members(GUILD, range(1, 101))
+    for sort_by in ('balance', 'level'):
+        assert board(db, GUILD, sort_by) == sql_board(db, GUILD, sort_by)
+    assert db.get_rank(GUILD, 2)[1] == 200
+
+
+def test_blocked_leaderboard_matches_a_sorted_list(monkeypatch):
+    monkeypatch.setattr(Leaderboard, 'BLOCK', 4)
+    rng = random.Random(2)
+    keys = {user_id: (rng.randint(0, 20), user_id) for user_id in range(50)}
+    ranking = Leaderboard(dict(keys))
+    for _ in range(3000):
+        user_id = rng.randrange(80)
+        if rng.random() < 0.2:
+            ranking.remove(user_id)
+            keys.pop(user_id, None)
+        else:
+            keys[user_id] = (rng.randint(0, 20), user_id)
+            ranking.update(user_id, keys[user_id])
+        expected = sorted(keys, key=keys.__getitem__)
+        assert len(ranking) == len(expected)
+        assert ranking.page(7, offset=user_id % 40) == expected[user_id % 40:user_id % 40 + 7]
+        assert ranking.rank(user_id) == (expected.index(user_id) + 1 if user_id in keys else None)
+    assert ranking.page(len(expected) + 5) == expected
+    assert max(len(block) for block in ranking._blocks) <= 8
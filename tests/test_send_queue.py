@@ -0,0 +1,103 @@
+"""SendQueue timing against fake channels, with the windows scaled down 10x"""
+import asyncio
+
+import discord
+import pytest
+
+from fakes import FakeChannel
+from send_queue import SendQueue
+
+LIMIT, PER = 5, 0.5
+
+
+def make_queue():
+    return SendQueue(window=0.05, limit=LIMIT, per=PER)
+
+
+def titles(kwargs):
+    embeds = kwargs['embeds'] or ([kwargs['embed']] if kwargs['embed'] else [])
+    return [embed.title for embed in embeds]
+
+
+def most_in_any_window(channel):
+    times = [sent for sent, _ in channel.sends]
+    return max(sum(1 for other in times if start <= other < start + PER) for start in times)
+
+
+async def drained(queue):
+    while queue.stats()['queued']:
+        await asyncio.sleep(0.02)
+
+
+def test_one_users_notifications_go_out_as_one_message():
+    async def run():
+        queue, channel = make_queue(), FakeChannel(latency=0.005)
+        for title in ('level', 'q1', 'q2', 'q3', 'ip'):
+            queue.notify(channel, 7, discord.Embed(title=title))
+        queue.notify(channel, 8, discord.Embed(title='other user'))
+        await asyncio.sleep(0.2)
+        return queue, channel
+
+    queue, channel = asyncio.run(run())
+    assert [titles(kwargs) for _, kwargs in channel.sends] == [['level', 'q1', 'q2', 'q3', 'ip'], ['other user']]
+    assert queue.stats()['merged'] == 4
+
+
+def test_bursts_are_paced_and_replies_skip_the_queue():
+    async def run():
+        queue, channel = make_queue(), FakeChannel(latency=0.005)
+        for user_id in range(12):
+            for k in range(3):
+                queue.notify(channel, user_id, discord.Embed(title=f'u{user_id}-{k}'))
+        # Arrives once the bucket is spent, with seven batches still waiting
+        await asyncio.sleep(0.1)
+        reply = await queue.reply(channel, content='reply')
+        for user_id in range(12):
+            queue.notify(channel, user_id, discord.Embed(title=f'u{user_id}-late'))
+        await drained(queue)
+        return queue, channel, reply
+
+    queue, channel, reply = asyncio.run(run())
+    assert reply.content == 'reply'
+    assert most_in_any_window(channel) <= LIMIT
+    assert queue.stats()['throttled'] > 0
+
+    contents = [kwargs['content'] for _, kwargs in channel.sends]
+    # Only the first bucket's worth went out before the reply
+    assert contents.index('reply') == LIMIT
+    delivered = [title for _, kwargs in channel.sends for title in titles(kwargs)]
+    for user_id in range(12):
+        assert [title for title in delivered if title.startswith(f'u{user_id}-')] == [f'u{user_id}-0', f'u{user_id}-1', f'u{user_id}-2', f'u{user_id}-late']
+
+
+def test_channels_are_paced_independently():
+    async def run():
+        queue, first, second = make_queue(), FakeChannel(), FakeChannel()
+        for user_id in range(LIMIT + 1):
+            queue.notify(first, user_id, discord.Embed(title='a'))
+            queue.notify(second, user_id, discord.Embed(title='b'))
+        await asyncio.sleep(0.2)
+        early = len(first.sends), len(second.sends)
+        await drained(queue)
+        await asyncio.sleep(0.05)
+        return early, (len(first.sends), len(second.sends))
+
+    early, final = asyncio.run(run())
+    # The sixth message in each channel waits for that channel's bucket only
+    assert early == (LIMIT, LIMIT)
+    assert final == (LIMIT + 1, LIMIT + 1)
+
+
+def test_failed_replies_raise_and_failed_notifications_are_counted():
+    async def run():
+        queue, channel = make_queue(), FakeChannel(fail=RuntimeError('send failed'))
+        with pytest.raises(RuntimeError):
+            await queue.reply(channel, content='x')
+        queue.notify(channel, 1, discord.Embed(title='n'))
+        await asyncio.sleep(0.2)
+        return queue
+
+    queue = asyncio.run(run())
+    assert queue.stats()['failed'] == 1
+    # The channel's worker stops once its queue is empty
+    assert not queue._channels
@@ -0,0 +1,66 @@
+"""StatusMonitor against FakeStatusServer on localhost"""
+import asyncio
+import time
+
+from fake_mc_server import FakeStatusServer
+from server_status import StatusMonitor
+
+
+def test_concurrent_refreshes_share_one_ping():
+    async def run():
+        server = await FakeStatusServer(players=3, delay=0.05).start()
+        try:
+            monitor = StatusMonitor(lambda: [])
+            statuses = await asyncio.gather(*(monitor.refresh(server.host, server.port) for _ in range(20)))
+            return server.requests, monitor.polls, statuses
+        finally:
+            await server.close()
+
+    requests, polls, statuses = asyncio.run(run())
+    assert requests == 1 and polls == 1
+    assert all(status is statuses[0] for status in statuses)
+    assert statuses[0].online and statuses[0].players_online == 3
+
+
+def test_silent_server_is_marked_offline_within_twice_the_timeout():
+    timeout = 0.2
+
+    async def run():
+        server = await FakeStatusServer().start()
+        server.silent = True
+        try:
+            monitor = StatusMonitor(lambda: [], timeout=timeout)
+            started = time.monotonic()
+            status = await monitor.refresh(server.host, server.port)
+            return status, time.monotonic() - started, monitor.get(server.host, server.port)
+        finally:
+            await server.close()
+
+    status, elapsed, cached = asyncio.run(run())
+    assert not status.online and status.error
+    # Scheduling slack on top of the cap
+    assert elapsed < timeout * 2 + 0.1
+    assert cached is status
+
+
+def test_poll_due_drops_addresses_no_guild_uses():
+    async def run():
+        first, second = await FakeStatusServer().start(), await FakeStatusServer().start()
+        try:
+            targets = [(first.host, first.port), (second.host, second.port)]
+            monitor = StatusMonitor(lambda: list(targets))
+            assert await monitor.poll_due() == 2
+            # Both are fresh, so nothing is due
+            assert await monitor.poll_due() == 0
+            targets.pop()
+            assert await monitor.poll_due() == 0
+            return monitor, first, second
+        finally:
+            await first.close()
+            await second.close()
+
+    monitor, first, second = asyncio.run(run())
+    assert monitor.get(first.host, first.port).online
+    assert monitor.get(second.host, second.port) is None
+    assert monitor.history(second.host, second.port) == []
+    assert len(monitor.history(first.host, first.port)) == 1
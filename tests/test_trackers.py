@@ -0,0 +1,46 @@
+from trackers import TokenBuckets, TrackerStore
+
+
+def test_token_bucket_refuses_past_the_burst_and_refills():
+    buckets = TokenBuckets(ttl=3600, max_entries=10)
+    assert [buckets.allow('a', rate=1, burst=3, now=0.0) for _ in range(4)] == [True, True, True, False]
+    assert not buckets.allow('a', rate=1, burst=3, now=0.5)
+    assert buckets.allow('a', rate=1, burst=3, now=1.6)
+    assert buckets.stats()['limited'] == 2
+
+
+def test_token_buckets_evict_the_least_recently_used():
+    buckets = TokenBuckets(ttl=3600, max_entries=3)
+    for key, now in (('a', 0.0), ('b', 1.0), ('c', 2.0)):
+        buckets.allow(key, rate=0, burst=2, now=now)
+    # 'a' is used again, so 'b' is now the stalest
+    buckets.allow('a', rate=0, burst=2, now=3.0)
+    buckets.allow('d', rate=0, burst=2, now=4.0)
+    assert len(buckets) == 3 and buckets.stats()['evicted'] == 1
+    # 'a' kept its bucket (now empty); 'b' comes back with a full one
+    assert not buckets.allow('a', rate=0, burst=2, now=5.0)
+    assert buckets.allow('b', rate=0, burst=2, now=6.0)
+    assert buckets.stats()['evicted'] == 2
+
+
+def test_token_buckets_expire_idle_keys_and_reuse_their_slots():
+    buckets = TokenBuckets(ttl=10, max_entries=100)
+    for i in range(5):
+        buckets.allow(i, rate=1, burst=1, now=float(i))
+    buckets.allow(0, rate=1, burst=1, now=12.0)
+    buckets.expire(now=15.0)
+    # 1-4 were last used before 5.0; 0 was used at 12.0
+    assert len(buckets) == 1 and buckets.stats()['expired'] == 4
+    for i in range(10, 14):
+        buckets.allow(i, rate=1, burst=1, now=15.0)
+    assert len(buckets._tokens) == 5
+
+
+def test_tracker_store_drops_the_stalest_entry_over_the_cap():
+    store = TrackerStore(ttl=3600, max_entries=2)
+    store['a'] = 1
+    store['b'] = 2
+    assert store.get('a') == 1
+    store['c'] = 3
+    assert 'b' not in store and store.get('a') == 1 and store.get('c') == 3
+    assert store.stats()['evicted'] == 1
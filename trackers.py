@@ -0,0 +1,216 @@
+import sys
+import time
+from array import array
+from bisect import bisect_left
+from collections import OrderedDict
+
+
+class IdSet:
+    """A set of Discord ids stored as a sorted array of 64-bit ints
+
+    Roughly 8 bytes per id instead of ~60 for a Python set of ints, with
+    O(log n) membership. Sets here are small (one user's mentions or
+    channels for a day), so the O(n) insert shift doesn't matter.
+    """
+
+    __slots__ = ('_ids',)
+
+    def __init__(self, ids=()):
+        self._ids = array('q', sorted(set(ids)))
+
+    def add(self, item):
+        """Add an id; returns True if it wasn't already present"""
+        i = bisect_left(self._ids, item)
+        if i < len(self._ids) and self._ids[i] == item:
+            return False
+        self._ids.insert(i, item)
+        return True
+
+    def __contains__(self, item):
+        i = bisect_left(self._ids, item)
+        return i < len(self._ids) and self._ids[i] == item
+
+    def __len__(self):
+        return len(self._ids)
+
+    def __iter__(self):
+        return iter(self._ids)
+
+    def nbytes(self):
+        return sys.getsizeof(self._ids)
+
+
+class TrackerStore:
+    """Per-key values that expire `ttl` seconds after last use, at most `max_entries` of them
+
+    Keys are kept in least-recently-used order, so expiry only ever looks
+    at the front and the LRU cap drops the stalest entry first. Expired
+    entries are also dropped lazily when read.
+    """
+
+    def __init__(self, ttl, max_entries, factory=None):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.factory = factory
+        self._entries = OrderedDict()
+        self._last_sweep = time.monotonic()
+        self.expired = 0
+        self.evicted = 0
+
+    def get(self, key, default=None):
+        now = time.monotonic()
+        if now - self._last_sweep > 60:
+            # Reads alone must still clear out idle entries now and then
+            self.expire()
+        entry = self._entries.get(key)
+        if entry is None:
+            return default
+        if now - entry[1] > self.ttl:
+            del self._entries[key]
+            self.expired += 1
+            return default
+        entry[1] = now
+        self._entries.move_to_end(key)
+        return entry[0]
+
+    def setdefault(self, key):
+        """Value for key, creating it with the factory if missing or expired"""
+        value = self.get(key)
+        if value is None:
+            value = self.factory()
+            self[key] = value
+        return value
+
+    def __setitem__(self, key, value):
+        self._entries[key] = [value, time.monotonic()]
+        self._entries.move_to_end(key)
+        self.expire()
+
+    def pop(self, key, default=None):
+        entry = self._entries.pop(key, None)
+        return default if entry is None else entry[0]
+
+    def __contains__(self, key):
+        return self.get(key) is not None
+
+    def __len__(self):
+        return len(self._entries)
+
+    def expire(self):
+        """Drop expired entries and anything over the size cap"""
+        self._last_sweep = time.monotonic()
+        cutoff = self._last_sweep - self.ttl
+        while self._entries:
+            key, (_, touched) = next(iter(self._entries.items()))
+            if touched < cutoff:
+                self.expired += 1
+            elif len(self._entries) > self.max_entries:
+                self.evicted += 1
+            else:
+                break
+            del self._entries[key]
+
+    def stats(self):
+        """Entry counts and an estimate of the memory the values use"""
+        value_bytes = 0
+        for value, _ in self._entries.values():
+            value_bytes += value.nbytes() if hasattr(value, 'nbytes') else sys.getsizeof(value)
+        return {
+            'entries': len(self._entries),
+            'max_entries': self.max_entries,
+            'bytes': value_bytes + sys.getsizeof(self._entries),
+            'expired': self.expired,
+            'evicted': self.evicted
+        }
+
+
+class TokenBuckets:
+    """Per-key token buckets in flat arrays, for rate limiting
+
+    A dict maps each key to a slot; the slot's tokens and last refill time
+    live in two array('d') columns, about 16 bytes a key on top of the
+    dict entry. allow() is O(1). Rates are passed per call, so one store
+    can serve limits that differ per guild. Keys are kept in
+    least-recently-used order, like TrackerStore, so the cap recycles the
+    front bucket and expiry stops at the first one still in use. Buckets
+    idle for `ttl` seconds are recycled (by then they are full again, same
+    as a new one).
+    """
+
+    def __init__(self, ttl, max_entries):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self._slots = OrderedDict()
+        self._tokens = array('d')
+        self._stamps = array('d')
+        self._free = []
+        self._last_sweep = time.monotonic()
+        self.limited = 0
+        self.expired = 0
+        self.evicted = 0
+
+    def allow(self, key, rate, burst, now=None):
+        """Spend one token from key's bucket (refilled at `rate` per second, up to `burst`)
+
+        Returns False, spending nothing, when the bucket is empty.
+        """
+        if now is None:
+            now = time.monotonic()
+        if now - self._last_sweep > 60:
+            self.expire(now)
+        slot = self._slots.get(key)
+        if slot is None:
+            slot = self._claim(key)
+            tokens = burst
+        else:
+            self._slots.move_to_end(key)
+            tokens = min(burst, self._tokens[slot] + (now - self._stamps[slot]) * rate)
+        self._stamps[slot] = now
+        if tokens < 1:
+            self._tokens[slot] = tokens
+            self.limited += 1
+            return False
+        self._tokens[slot] = tokens - 1
+        return True
+
+    def _claim(self, key):
+        if not self._free and len(self._slots) >= self.max_entries:
+            # Over the cap: recycle the bucket that has been idle longest
+            self._release(next(iter(self._slots)))
+            self.evicted += 1
+        if self._free:
+            slot = self._free.pop()
+        else:
+            slot = len(self._tokens)
+            self._tokens.append(0.0)
+            self._stamps.append(0.0)
+        self._slots[key] = slot
+        return slot
+
+    def _release(self, key):
+        self._free.append(self._slots.pop(key))
+
+    def expire(self, now=None):
+        """Recycle buckets idle for longer than ttl"""
+        self._last_sweep = time.monotonic() if now is None else now
+        cutoff = self._last_sweep - self.ttl
+        while self._slots:
+            key, slot = next(iter(self._slots.items()))
+            if self._stamps[slot] >= cutoff:
+                break
+            self._release(key)
+            self.expired += 1
+
+    def __len__(self):
+        return len(self._slots)
+
+    def stats(self):
+        """Same shape as TrackerStore.stats(), plus how many calls were refused"""
+        return {
+            'entries': len(self._slots),
+            'max_entries': self.max_entries,
+            'bytes': self._tokens.buffer_info()[1] * self._tokens.itemsize * 2 + sys.getsizeof(self._slots),
+            'expired': self.expired,
+            'evicted': self.evicted,
+            'limited': self.limited
+        }